@@ -1,15 +1,27 @@
 # app.py
 import os
-import csv
-import json
 import time
+import atexit
 import threading
-from collections import defaultdict
-from flask import Flask, jsonify, send_file, render_template
-import requests
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 import websocket
 from flask_cors import CORS
 
+from persistence import CSV_FIELDS, summary_to_record, summary_to_values
+from streaming import STREAM_KEEPALIVE, CandleBroadcaster, encode_event
+from footprint_engine import FootprintEngine
+from history_cache import FORMATS, HistoryCache, choose_encoding, msgpack
+from imbalance import IMBALANCE_FIELDS, ImbalanceRules
+from imbalance import add_history_fields as add_imbalance_fields
+from volume_profile import VALUE_AREA_FIELDS
+from volume_profile import add_history_fields as add_value_area_fields
+from binning import PRICE_BINS, bin_ticks, usable_bins, with_bin
+from ingest import INGEST_BATCH, INGEST_QUEUE_SIZE, TradeIngest, trade_stream_url
+from metrics import Metrics
+from retention import DEFAULT_RETENTION
+from storage import BACKENDS as STORAGE_BACKENDS, FootprintStorage
+from symbol_workers import ShardError, SymbolRouter, parse_tick_sizes
+
 app = Flask(__name__)
 
 # Enable CORS for the Flask app
@@ -19,299 +31,622 @@ CORS(app)
 # Configurations and Globals
 # ----------------------------
 
-BINANCE_WS_URL = "wss://fstream.binance.com/ws/xmrusdt@trade"
-
 # We want separate timeframes.
 TIMEFRAMES = ["1m", "3m", "5m", "15m", "1h", "4h"]
 SYMBOL = "XMRUSDT"  # For REST API, uppercase; for WS URL we use lowercase.
 
-# Directory for CSV files (one per timeframe)
-DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+# Trade stream of SYMBOL: "trade" (one message per trade) or "aggTrade" (one message per
+# taker order and price, i.e. fewer messages in bursts; volumes are the same and trade
+# counts come from the message's first/last trade ids). Set with FOOTPRINT_STREAM.
+TRADE_STREAM = os.environ.get("FOOTPRINT_STREAM", "trade")
+BINANCE_WS_URL = trade_stream_url(SYMBOL, TRADE_STREAM)
+# Ingest queue between the websocket and the engine (see ingest.py): frames it holds,
+# frames per batch, and what to do when it is full ("block" the websocket or "drop").
+INGEST_QUEUE = int(os.environ.get("FOOTPRINT_INGEST_QUEUE", INGEST_QUEUE_SIZE))
+INGEST_BATCH_SIZE = int(os.environ.get("FOOTPRINT_INGEST_BATCH", INGEST_BATCH))
+INGEST_OVERFLOW = os.environ.get("FOOTPRINT_INGEST_OVERFLOW", "block")
+
+# Further symbols to track, e.g. FOOTPRINT_SYMBOLS=BTCUSDT,ETHUSDT,SOLUSDT. SYMBOL is
+# aggregated in this process (history, stream); every other symbol is aggregated by a
+# worker process (see symbol_workers.py) and stored under DATA_DIR/<SYMBOL>/.
+SYMBOLS = [SYMBOL] + [s for s in dict.fromkeys(
+    s.strip().upper() for s in os.environ.get("FOOTPRINT_SYMBOLS", "").split(",")) if s and s != SYMBOL]
+# Number of worker processes for those symbols; 0 means one per symbol, at most one per core.
+SYMBOL_WORKERS = int(os.environ.get("FOOTPRINT_SYMBOL_WORKERS", "0"))
+# Tick sizes of those symbols, e.g. FOOTPRINT_TICK_SIZES=BTCUSDT=0.1,ETHUSDT=0.01. Others
+# are looked up in Binance's exchangeInfo at startup (see symbol_workers.py).
+SYMBOL_TICK_SIZES = parse_tick_sizes(os.environ.get("FOOTPRINT_TICK_SIZES", ""))
+
+# Directory for CSV files (one per timeframe). FOOTPRINT_DATA_DIR points the service at
+# another directory, e.g. a scratch one for benchmarks.
+DATA_DIR = os.environ.get("FOOTPRINT_DATA_DIR") or os.path.join(os.path.dirname(__file__), 'data')
 if not os.path.exists(DATA_DIR):
     os.mkdir(DATA_DIR)
 
-# Global dictionaries to store data for each timeframe.
-# For each timeframe (key), we store:
-#   - finalized_data: list of finalized (completed) candle summaries.
-#   - current_data: the in-progress candle summary (dictionary) including an extra key 'bucket'
+# FOOTPRINT_BACKGROUND=0 imports the app without starting the ingest, persistence and
+# stream threads (benchmarks and tools drive the engine themselves).
+RUN_BACKGROUND = os.environ.get("FOOTPRINT_BACKGROUND", "1") != "0"
+
+# Prometheus-style metrics served at /metrics (see metrics.py): stage timings, exchange
+# latency, trade rate, persistence, request latency, memory. FOOTPRINT_METRICS=0 turns
+# them off, in which case nothing is instrumented at all.
+METRICS_ENABLED = os.environ.get("FOOTPRINT_METRICS", "1") != "0"
+metrics = Metrics(METRICS_ENABLED)
+
+# Storage backend for finalized candles, set with FOOTPRINT_STORAGE:
+#   "csv"    – footprint_{tf}.csv: header, finalized rows, in-progress row last.
+#   "binary" – columnar footprint_{tf}.fpc/.fpl files read in place through mmap
+#              (see candle_store.py). Existing CSV files are imported on first start.
+STORAGE_BACKEND = os.environ.get("FOOTPRINT_STORAGE", "csv")
+if STORAGE_BACKEND not in STORAGE_BACKENDS:
+    raise ValueError(f"FOOTPRINT_STORAGE must be one of {', '.join(STORAGE_BACKENDS)}")
+
+# Aggregation state for every timeframe lives in the engine (see footprint_engine.py):
+#   - finalized_data: finalized (completed) candle summaries, a list-like view whose older
+#     part is read from disk (see load_existing_data).
+#   - finalized_buckets: bucket start times (int seconds) of finalized_data[tf], kept in the
+#     same order. This is the sorted index the history endpoint binary-searches.
 #   - latest_footprint: the most recent finalized summary (for API use)
-finalized_data = {tf: [] for tf in TIMEFRAMES}
-current_data = {tf: None for tf in TIMEFRAMES}
-latest_footprint = {tf: None for tf in TIMEFRAMES}
-# Global cumulative delta per timeframe
-cumulative_delta = {tf: 0 for tf in TIMEFRAMES}
-
-# CSV headers for each timeframe file.
-CSV_FIELDS = [
-    "bucket", "total_volume", "buy_volume", "sell_volume",
-    "buy_contracts", "sell_contracts",
-    "open", "high", "low", "close",
-    "delta", "max_delta", "min_delta", "CVD", "buy_sell_ratio",
-    "pocs", "price_levels", "imbalances"
-]
+#   - cumulative_delta: global cumulative delta per timeframe
+# The in-progress candle of a timeframe is summarized with engine.live_summary(tf), which
+# gives the row exactly as it will look once finalized.
+# Diagonal imbalances (buy at N vs sell at N - 1, sell at N vs buy at N + 1) need one side
+# to be IMBALANCE_RATIO times the other and at least IMBALANCE_MIN_VOLUME contracts;
+# STACKED_IMBALANCE_LEVELS consecutive ones form a stacked zone (see imbalance.py). They
+# are kept up to date per trade and served as the "diagonal_imbalances" and
+# "stacked_imbalances" history fields. Worker symbols use the same rules.
+IMBALANCE_RATIO = float(os.environ.get("FOOTPRINT_IMBALANCE_RATIO", "3"))
+IMBALANCE_MIN_VOLUME = float(os.environ.get("FOOTPRINT_IMBALANCE_MIN_VOLUME", "0"))
+STACKED_IMBALANCE_LEVELS = int(os.environ.get("FOOTPRINT_STACKED_LEVELS", "3"))
+# Price bins: history and live requests may ask for price_levels in bins of several ticks
+# (bin=0.25). The sizes in FOOTPRINT_PRICE_BINS are precomputed for every candle (see
+# binning.py); TIMEFRAME_BINS sets the default bin of a timeframe, e.g.
+# FOOTPRINT_TIMEFRAME_BINS=1h=0.05,4h=0.25 (other timeframes default to the raw tick).
+PRICE_BIN_SIZES = tuple(float(size) for size in os.environ.get(
+    "FOOTPRINT_PRICE_BINS", ",".join(map(str, PRICE_BINS))).split(",") if size.strip())
+TIMEFRAME_BINS = {
+    tf.strip(): float(size) for tf, _, size in (
+        item.partition("=") for item in os.environ.get("FOOTPRINT_TIMEFRAME_BINS", "").split(",") if item.strip())
+}
+engine = FootprintEngine(TIMEFRAMES, imbalance_rules=ImbalanceRules(
+    IMBALANCE_RATIO, IMBALANCE_MIN_VOLUME, STACKED_IMBALANCE_LEVELS), price_bins=PRICE_BIN_SIZES)
+for tf_bin in TIMEFRAME_BINS.values():
+    bin_ticks(tf_bin, engine.tick_size)  # A bad FOOTPRINT_TIMEFRAME_BINS fails at startup.
+metrics.instrument(engine, "add_trades", "engine_add")
+metrics.instrument(engine, "finalize_candle", "finalize")
+finalized_data = engine.finalized_data
+finalized_buckets = engine.finalized_buckets
+# Serialized (and compressed) history rows, so polls only pay for the live row.
+history_cache = HistoryCache(engine)
+add_imbalance_fields(history_cache, engine)
+add_value_area_fields(history_cache)
+metrics.instrument(history_cache, "body", "history_body")
+latest_footprint = engine.latest_footprint
+cumulative_delta = engine.cumulative_delta
+
+# Live stream: seconds between two pushes of a changed in-progress candle. Trades
+# arriving in between are coalesced into a single "update" event.
+STREAM_INTERVAL = 0.5
+broadcaster = CandleBroadcaster()
+
+# Finalized candles kept in memory per timeframe (see retention.py): the last `candles`
+# candles plus any within the last `hours`. Older ones are read from disk on demand.
+RETENTION = {tf: dict(DEFAULT_RETENTION) for tf in TIMEFRAMES}
 
 # ----------------------------
 # Load Existing CSV Data (if any)
 # ----------------------------
 def load_existing_data():
     """
-    Check each CSV file only once at startup. If the CSV file for a timeframe is not empty,
-    load its content into finalized_data so that new data will be appended starting from the last line.
+    Open the footprint files only once at startup (see storage.FootprintStorage). With a valid
+    checkpoint the engine continues where it stopped (in-progress candles and CVD) and history
+    is only read when requested; otherwise the recent CSV rows are loaded and CVD continues
+    from the last stored candle. New data will be appended starting from the last line.
     """
-    for tf in TIMEFRAMES:
-        filename = os.path.join(DATA_DIR, f"footprint_{tf}.csv")
-        if os.path.exists(filename) and os.path.getsize(filename) > 0:
-            with open(filename, "r") as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    # Convert JSON string fields back to their native Python types.
-                    for key in ["pocs", "price_levels", "imbalances"]:
-                        if key in row and row[key]:
-                            try:
-                                row[key] = json.loads(row[key])
-                            except Exception:
-                                # If conversion fails, leave the value as is.
-                                pass
-                    finalized_data[tf].append(row)
+    return FootprintStorage(engine, DATA_DIR, STORAGE_BACKEND, RETENTION)
 
 # Call the load function once at startup.
-load_existing_data()
+storage = load_existing_data()
+metrics.instrument(storage, "sync", "persist")
+# Per timeframe: the writer that persists new candles (persistence.CandleFileWriter, or the
+# CandleStore for the binary backend) and the RetainedHistory bounding its memory.
+candle_writers = storage.writers
+histories = storage.histories
 
 # ----------------------------
-# Helper Functions
+# Footprint Calculation – Stream finalized candles
 # ----------------------------
-def timeframe_to_seconds(tf):
-    """Convert a timeframe string (e.g. '1m', '3m', '1h') to number of seconds."""
-    unit = tf[-1]
-    value = int(tf[:-1])
-    if unit == "m":
-        return value * 60
-    elif unit == "h":
-        return value * 3600
-    else:
-        return value
+def publish_finalized(tf, summary):
+    """Push a candle closed by engine.finalize_candle to stream subscribers."""
+    if broadcaster.has_subscribers(tf):
+        broadcaster.publish(tf, "finalized", {"tf": tf, "candle": summary_to_record(summary)})
 
-# ----------------------------
-# CSV Helper – Write CSV file for a given timeframe.
-# (DONOT change the saving functionality)
-# ----------------------------
-def write_csv(tf):
-    """Rewrite the CSV file for timeframe tf with finalized data and the current candle (if exists)."""
-    filename = os.path.join(DATA_DIR, f"footprint_{tf}.csv")
-    all_data = finalized_data[tf][:]
-    if current_data[tf]:
-        all_data.append(current_data[tf])
-    # Open file for overwriting.
-    with open(filename, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(CSV_FIELDS)
-        for summary in all_data:
-            writer.writerow([
-                summary.get("bucket", ""),
-                summary.get("total_volume", ""),
-                summary.get("buy_volume", ""),
-                summary.get("sell_volume", ""),
-                summary.get("buy_contracts", ""),
-                summary.get("sell_contracts", ""),
-                summary.get("open", ""),
-                summary.get("high", ""),
-                summary.get("low", ""),
-                summary.get("close", ""),
-                summary.get("delta", ""),
-                summary.get("max_delta", ""),
-                summary.get("min_delta", ""),
-                summary.get("CVD", ""),
-                summary.get("buy_sell_ratio", ""),
-                json.dumps(summary.get("pocs", [])) if not isinstance(summary.get("pocs", []), str) else summary.get("pocs", ""),
-                json.dumps(summary.get("price_levels", {})) if not isinstance(summary.get("price_levels", {}), str) else summary.get("price_levels", ""),
-                json.dumps(summary.get("imbalances", [])) if not isinstance(summary.get("imbalances", []), str) else summary.get("imbalances", "")
-            ])
+engine.on_finalize.append(publish_finalized)
 
 # ----------------------------
-# Footprint Calculation Functions
+# Resting liquidity per candle
 # ----------------------------
-def process_trade(trade):
-    """Process a single trade coming from Binance WS.
-       Update the current candle in each timeframe.
-    """
-    global current_data, cumulative_delta
-    trade_timestamp = trade["T"] // 1000  # seconds
-    price = float(trade["p"])
-    volume = float(trade["q"])
-    is_seller = trade["m"]
-
-    for tf in TIMEFRAMES:
-        seconds = timeframe_to_seconds(tf)
-        bucket = (trade_timestamp // seconds) * seconds  # bucket start time in seconds for this timeframe
-        cd = current_data[tf]
-        if cd is None or cd.get("bucket") != bucket:
-            # New candle for this timeframe
-            if cd is not None:
-                # Finalize the previous candle
-                finalize_candle(tf, cd["bucket"])
-            # Create new current candle
-            current_data[tf] = {
-                "bucket": bucket,
-                "buy_volume": 0,
-                "sell_volume": 0,
-                "buy_contracts": 0,
-                "sell_contracts": 0,
-                "trade_prices": [],
-                "price_levels": defaultdict(lambda: {"buy": 0, "sell": 0, "buy_trades": 0, "sell_trades": 0}),
-                "delta_per_level": {},
-                # For OHLC, we store open, high, low, close later.
-                "open": price,
-                "high": price,
-                "low": price,
-                "close": price
-            }
-            cd = current_data[tf]
-        # Append trade price
-        cd["trade_prices"].append(price)
-        # Update OHLC
-        cd["close"] = price
-        if price > cd["high"]:
-            cd["high"] = price
-        if price < cd["low"]:
-            cd["low"] = price
-        # Update volumes and contracts
-        if is_seller:
-            cd["sell_volume"] += volume
-            cd["sell_contracts"] += 1
-            cd["price_levels"][price]["sell"] += volume
-            cd["price_levels"][price]["sell_trades"] = cd["price_levels"][price].get("sell_trades", 0) + 1
-        else:
-            cd["buy_volume"] += volume
-            cd["buy_contracts"] += 1
-            cd["price_levels"][price]["buy"] += volume
-            cd["price_levels"][price]["buy_trades"] = cd["price_levels"][price].get("buy_trades", 0) + 1
-        # Update delta at this price level
-        buy_vol = cd["price_levels"][price]["buy"]
-        sell_vol = cd["price_levels"][price]["sell"]
-        cd["delta_per_level"][price] = buy_vol - sell_vol
-
-def finalize_candle(tf, bucket):
-    """Compute summary for the candle identified by 'bucket' for timeframe tf,
-       store it in finalized_data[tf], update cumulative delta, and update latest_footprint.
-    """
-    global cumulative_delta
-    cd = current_data[tf]
-    if cd is None:
-        return
-    # Compute OHLC are already in cd.
-    trade_prices = cd.get("trade_prices", [])
-    if not trade_prices:
-        return
-    open_price = cd["open"]
-    high_price = cd["high"]
-    low_price = cd["low"]
-    close_price = cd["close"]
-
-    total_buy_volume = cd["buy_volume"]
-    total_sell_volume = cd["sell_volume"]
-    total_volume = total_buy_volume + total_sell_volume
-    delta = total_buy_volume - total_sell_volume
-    cumulative_delta[tf] += delta
-
-    buy_contracts = cd["buy_contracts"]
-    sell_contracts = cd["sell_contracts"]
-
-    buy_sell_ratio = (total_buy_volume / total_sell_volume) if total_sell_volume > 0 else float('inf')
-
-    # Compute POC: Price level(s) with maximum total volume (buy+sell)
-    pocs = []
-    pl = cd["price_levels"]
-    volume_per_price = {price: data["buy"] + data["sell"] for price, data in pl.items()}
-    if volume_per_price:
-        max_volume = max(volume_per_price.values())
-        for price, total in volume_per_price.items():
-            if total == max_volume:
-                pocs.append({
-                    "price": price,
-                    "total_volume": total,
-                    "buy_volume": pl[price]["buy"],
-                    "sell_volume": pl[price]["sell"]
-                })
-    # Imbalances – for each price level where one side is at least 3x the other.
-    imbalances = []
-    for price, data in pl.items():
-        if data["buy"] >= 3 * data["sell"] and data["sell"] > 0:
-            imbalances.append({"price": price, "type": "Bullish", "buy": data["buy"], "sell": data["sell"]})
-        elif data["sell"] >= 3 * data["buy"] and data["buy"] > 0:
-            imbalances.append({"price": price, "type": "Bearish", "buy": data["buy"], "sell": data["sell"]})
-    max_delta = max(cd["delta_per_level"].values(), default=0)
-    min_delta = min(cd["delta_per_level"].values(), default=0)
-
-    summary = {
-        "bucket": bucket,
-        "total_volume": round(total_volume, 2),
-        "buy_volume": round(total_buy_volume, 2),
-        "sell_volume": round(total_sell_volume, 2),
-        "buy_contracts": buy_contracts,
-        "sell_contracts": sell_contracts,
-        "open": round(open_price, 2),
-        "high": round(high_price, 2),
-        "low": round(low_price, 2),
-        "close": round(close_price, 2),
-        "delta": round(delta, 2),
-        "max_delta": round(max_delta, 2),
-        "min_delta": round(min_delta, 2),
-        "CVD": round(cumulative_delta[tf], 2),
-        "buy_sell_ratio": round(buy_sell_ratio, 2),
-        "pocs": pocs,
-        # Convert price_levels to normal dict with rounded numbers.
-        "price_levels": {price: {
-                "buy_volume": round(data["buy"], 2),
-                "sell_volume": round(data["sell"], 2),
-                "buy_trades": data.get("buy_trades", 0),
-                "sell_trades": data.get("sell_trades", 0)
-            } for price, data in cd["price_levels"].items()},
-        "imbalances": imbalances
-    }
-    finalized_data[tf].append(summary)
-    latest_footprint[tf] = summary
-    # After finalizing, clear the current candle for this timeframe.
-    current_data[tf] = None
+# The order book of SYMBOL runs in this process (orderbook.py) and every finalized candle
+# gets the bid/ask depth of its traded levels: [start, end, min, max] (see depth.py),
+# stored in depth_{tf}.jsonl and served as the "depth" history field.
+# The book is also sampled every second into a depth_history.DepthHistory for liquidity
+# heatmaps (/api/depth/heatmap), spilling older samples to depth_history/ under DATA_DIR;
+# FOOTPRINT_DEPTH_HISTORY=0 turns that off.
+# FOOTPRINT_DEPTH=0 turns it all off, and then neither websockets nor numpy are needed.
+DEPTH_ENABLED = os.environ.get("FOOTPRINT_DEPTH", "1") != "0"
+DEPTH_HISTORY_ENABLED = DEPTH_ENABLED and os.environ.get("FOOTPRINT_DEPTH_HISTORY", "1") != "0"
+HEATMAP_SECONDS = 900   # default range of /api/depth/heatmap
+depth = None
+depth_history = None
+if DEPTH_ENABLED:
+    from depth import DepthService
+    if DEPTH_HISTORY_ENABLED:
+        from depth_history import DepthHistory
+        depth_history = DepthHistory(os.path.join(DATA_DIR, "depth_history"), engine.tick_size)
+    depth = DepthService(engine, SYMBOL, DATA_DIR, history=depth_history)
+    engine.on_finalize.append(depth.on_finalize)
+    history_cache.add_field("depth", depth.depth_text, depth.version)
+    if RUN_BACKGROUND:
+        depth.start()
 
+# candle_writers persist incrementally: finalized candles are appended once and, for the
+# CSV backend, only the in-progress candle is rewritten (see persistence.CandleFileWriter).
 def update_csv_files():
-    """Continuously update CSV files (for all timeframes) every second."""
+    """Continuously update the footprint files (for all timeframes) every second, move
+       candles beyond the retention out of memory and checkpoint the engine.
+    """
     while True:
-        for tf in TIMEFRAMES:
-            write_csv(tf)
+        storage.sync()
+        if depth is not None:
+            depth.flush()
         time.sleep(1)
 
+def close_csv_files():
+    """Flush and fsync every footprint file and save a final checkpoint on interpreter shutdown.
+       The depth files are flushed and the depth history spilled as well.
+    """
+    storage.close()
+    if depth is not None:
+        depth.close()
+
+atexit.register(close_csv_files)
+
 # Start the CSV update thread.
 csv_thread = threading.Thread(target=update_csv_files, daemon=True)
-csv_thread.start()
+if RUN_BACKGROUND:
+    csv_thread.start()
+
+def publish_live_updates():
+    """Push the in-progress candle of every subscribed timeframe when it changed,
+       at most once per STREAM_INTERVAL.
+    """
+    published_versions = {tf: None for tf in TIMEFRAMES}
+    while True:
+        for tf in TIMEFRAMES:
+            if not broadcaster.has_subscribers(tf):
+                published_versions[tf] = None
+                continue
+            version = engine.version
+            if version == published_versions[tf]:
+                continue
+            published_versions[tf] = version
+            live = engine.live_summary(tf)
+            if live is None:
+                continue
+            broadcaster.publish(tf, "update", {"tf": tf, "candle": summary_to_record(live)})
+        time.sleep(STREAM_INTERVAL)
+
+stream_thread = threading.Thread(target=publish_live_updates, daemon=True)
+if RUN_BACKGROUND:
+    stream_thread.start()
 
 # ----------------------------
 # WebSocket & Background Trade Processing
 # ----------------------------
-def on_message(ws, message):
-    trade = json.loads(message)
-    process_trade(trade)
+# The websocket callback only queues raw frames; ingest's own thread decodes them and
+# feeds the engine in batches, so slow processing does not hold up socket reads.
+ingest = TradeIngest(engine, INGEST_QUEUE, INGEST_BATCH_SIZE, INGEST_OVERFLOW)
+metrics.instrument(ingest, "process", "ingest_batch")
+if METRICS_ENABLED:
+    ingest.metrics = metrics
 
 def start_websocket():
-    ws = websocket.WebSocketApp(BINANCE_WS_URL, on_message=on_message)
+    ws = websocket.WebSocketApp(BINANCE_WS_URL, on_message=ingest.on_message)
     ws.run_forever()
 
 ws_thread = threading.Thread(target=start_websocket, daemon=True)
-ws_thread.start()
+if RUN_BACKGROUND:
+    ingest.start()
+    ws_thread.start()
+
+# Worker processes for the other symbols. Without RUN_BACKGROUND they are started on the
+# first request and only serve what is already stored.
+# They are aggregated with the same settings as SYMBOL, so every symbol serves the same fields.
+WORKER_ENGINE_CONFIG = {
+    "stream": TRADE_STREAM,
+    "imbalance_ratio": IMBALANCE_RATIO,
+    "imbalance_min_volume": IMBALANCE_MIN_VOLUME,
+    "stacked_levels": STACKED_IMBALANCE_LEVELS,
+    "price_bins": list(PRICE_BIN_SIZES),
+    "retention": DEFAULT_RETENTION,
+    "ingest_queue": INGEST_QUEUE,
+    "ingest_batch": INGEST_BATCH_SIZE,
+    "ingest_overflow": INGEST_OVERFLOW,
+}
+symbol_router = SymbolRouter(SYMBOLS[1:], DATA_DIR, TIMEFRAMES, STORAGE_BACKEND,
+                             SYMBOL_WORKERS or None, ingest=RUN_BACKGROUND, tick_sizes=SYMBOL_TICK_SIZES,
+                             config=WORKER_ENGINE_CONFIG)
+if RUN_BACKGROUND:
+    symbol_router.start()
+atexit.register(symbol_router.close)
+
+# ----------------------------
+# Metrics
+# ----------------------------
+def by_timeframe(values):
+    """{timeframe: value} as metric labels."""
+    return {(("tf", tf),): value for tf, value in values.items()}
+
+def live_levels():
+    levels = {}
+    for tf in TIMEFRAMES:
+        summary = engine.snapshot(tf).summary
+        levels[tf] = len(summary["price_levels"]) if summary else 0
+    return by_timeframe(levels)
+
+def persisted_bytes():
+    written = {(("file", f"footprint_{tf}"),): writer.bytes_written for tf, writer in candle_writers.items()}
+    written[(("file", "checkpoint"),)] = storage.checkpoint_bytes
+    return written
+
+if METRICS_ENABLED:
+    metrics.gauge("trades_total", "Trades added to the engine.", lambda: metrics.trades, kind="counter")
+    metrics.gauge("trades_per_second", "Trades per second over the last seconds.", metrics.trade_rate.rate)
+    metrics.gauge("live_levels", "Price levels of the in-progress candle.", live_levels)
+    metrics.gauge("finalized_candles", "Finalized candles per timeframe.",
+                  lambda: by_timeframe({tf: len(finalized_data[tf]) for tf in TIMEFRAMES}))
+    metrics.gauge("persist_bytes_total", "Bytes written to footprint files and checkpoints.",
+                  persisted_bytes, kind="counter")
+    metrics.gauge("ingest_queue_depth", "Websocket frames waiting to be processed.", ingest.queue.qsize)
+    metrics.gauge("ingest_dropped_total", "Frames dropped because the ingest queue was full.",
+                  lambda: ingest.dropped, kind="counter")
+    metrics.gauge("ingest_blocked_seconds_total", "Time the websocket waited for room in the ingest queue.",
+                  lambda: ingest.blocked_seconds, kind="counter")
+    metrics.gauge("ingest_decode_errors_total", "Frames that could not be decoded as trades.",
+                  lambda: ingest.decode_errors, kind="counter")
+    metrics.gauge("ingest_batch_errors_total", "Batches whose processing raised (logged and skipped).",
+                  lambda: ingest.batch_errors, kind="counter")
+    metrics.gauge("engine_lock_wait_seconds_total", "Time spent waiting for the engine lock.",
+                  lambda: engine.lock.wait_seconds, kind="counter")
+    metrics.register_process_gauges()
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_latency(response):
+        started = g.pop("request_started", None)
+        if started is not None:
+            endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            metrics.histogram("request_seconds", "Time to build the response, per endpoint.",
+                              endpoint=endpoint, method=request.method).observe(time.perf_counter() - started)
+        return response
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """The metrics above in the Prometheus text format (404 when FOOTPRINT_METRICS=0)."""
+    if not METRICS_ENABLED:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    return Response(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
 
 # ----------------------------
 # Flask API Endpoints
 # ----------------------------
+def select_history(tf, since=None, until=None, limit=None):
+    """History window of timeframe tf, see FootprintEngine.select_history."""
+    return engine.select_history(tf, since, until, limit)
+
+def parse_int_arg(name):
+    """Read an optional integer query parameter, raising ValueError on malformed input."""
+    value = request.args.get(name)
+    if value is None or value == "":
+        return None
+    return int(value)
+
+def parse_history_args():
+    """(since, until, limit) of a history request; ValueError carries the error message."""
+    try:
+        since = parse_int_arg("since")
+        until = parse_int_arg("until")
+        limit = parse_int_arg("limit")
+    except ValueError:
+        raise ValueError("since, until and limit must be integers")
+    if limit is not None and limit < 0:
+        raise ValueError("limit must not be negative")
+    return since, until, limit
+
+def parse_fields_arg(extra_fields=()):
+    """
+    Fields selected by the `fields` query parameter (comma-separated CSV_FIELDS and
+    `extra_fields` such as "depth") as a tuple, or None for every CSV field.
+    """
+    value = request.args.get("fields")
+    if not value:
+        return None
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(",") if field.strip()))
+    unknown = [field for field in fields if field not in CSV_FIELDS and field not in extra_fields]
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(unknown)}")
+    return fields
+
+def parse_bin_arg(tf, tick_size=None):
+    """
+    Ticks per price bin of a request: the `bin` query parameter (a price step such as
+    0.25), else the timeframe's default from TIMEFRAME_BINS, else 1 (the raw tick).
+    tick_size defaults to SYMBOL's; a default that is not a multiple of it means 1.
+    """
+    tick_size = tick_size or engine.tick_size
+    value = request.args.get("bin")
+    if value is None:
+        value = TIMEFRAME_BINS.get(tf)
+        if value is None or not usable_bins((value,), tick_size):
+            return 1
+    try:
+        size = float(value)
+    except ValueError:
+        raise ValueError("bin must be a number")
+    return bin_ticks(size, tick_size)
+
+def parse_format_arg():
+    """
+    Wire format of a history request (see history_cache.FORMATS): the `format` query
+    parameter, else "msgpack" when the Accept header prefers MessagePack, else "rows".
+    """
+    wire_format = request.args.get("format")
+    if wire_format is None:
+        best = request.accept_mimetypes.best_match(
+            ["application/json", "application/msgpack", "application/x-msgpack"])
+        wire_format = "msgpack" if best in ("application/msgpack", "application/x-msgpack") else "rows"
+    if wire_format not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    return wire_format
+
+def history_response(tf, since=None, until=None, limit=None, fields=None, wire_format="rows", price_bin=1):
+    """
+    Response with the history window of tf in wire_format, built from history_cache and
+    compressed with gzip/deflate when the client accepts it. A request whose If-None-Match
+    carries the current ETag (nothing changed since the client's last poll) gets an empty 304.
+    """
+    if wire_format == "msgpack" and msgpack is None:
+        return jsonify({"error": "format=msgpack needs the msgpack package"}), 406
+    snapshot, lo, hi, live = engine.history_window(tf, since, until, limit)
+    etag = history_cache.etag(snapshot, fields, wire_format, price_bin)
+    if request.if_none_match.contains_weak(etag):
+        history_cache.not_modified += 1
+        response = Response(status=304)
+    else:
+        encoding = choose_encoding(request.accept_encodings)
+        body = history_cache.body(tf, (since, until, limit), lo, hi, live, encoding, fields, wire_format, price_bin)
+        response = Response(body, mimetype=FORMATS[wire_format])
+        if encoding is not None:
+            response.headers["Content-Encoding"] = encoding
+    response.set_etag(etag, weak=True)
+    response.headers["Vary"] = "Accept-Encoding, Accept"
+    # Stored by browsers, but revalidated on every request.
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
 @app.route('/api/footprint/history/<tf>', methods=['GET'])
 def get_footprint_history(tf):
+    """
+    History of timeframe tf served from memory.
+    Optional query parameters:
+      - since: only candles with bucket >= since (unix seconds)
+      - until: only candles with bucket <= until (unix seconds)
+      - limit: only the most recent `limit` candles of the window
+      - fields: comma-separated fields of each candle (default: every CSV field), e.g.
+        fields=bucket,open,high,low,close for a candlestick chart, or
+        fields=bucket,price_levels,depth for the traded volume and resting liquidity
+        ({price: {"bid": [start, end, min, max], "ask": [...]}}, see depth.py) per level,
+        or fields=bucket,diagonal_imbalances,stacked_imbalances (see imbalance.py), or
+        fields=bucket,value_area_high,value_area_low (see volume_profile.py)
+      - format: rows (default; values as the CSV strings), json (numbers as numbers,
+        nested fields as JSON), columns ({field: [values]}) or msgpack (the columns as
+        MessagePack, also chosen by "Accept: application/msgpack")
+      - bin: price step of price_levels, a multiple of the tick size (e.g. 0.05, 0.25, 1);
+        levels are summed into bins labelled with their lowest price. Defaults to the
+        timeframe's TIMEFRAME_BINS entry, else the tick
+    Supports ETag/If-None-Match and gzip/deflate (see history_response).
+    """
     if tf not in TIMEFRAMES:
         return jsonify({"error": "Invalid timeframe"}), 400
-    filename = os.path.join(DATA_DIR, f"footprint_{tf}.csv")
-    if not os.path.exists(filename):
-        return jsonify({"error": "Data not found for timeframe"}), 404
-    with open(filename, "r") as f:
-        reader = csv.DictReader(f)
-        data = list(reader)
-    return jsonify(data)
+    try:
+        since, until, limit = parse_history_args()
+        fields = parse_fields_arg(history_cache.extra_fields)
+        wire_format = parse_format_arg()
+        price_bin = parse_bin_arg(tf)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    return history_response(tf, since, until, limit, fields, wire_format, price_bin)
+
+def live_record(summary, price_bin=1):
+    """
+    A live summary with typed values (as format=json), price_levels in bins of price_bin
+    ticks, and the fields kept outside the CSV files.
+    """
+    if summary is None:
+        return None
+    record = dict(zip(CSV_FIELDS, summary_to_values(with_bin(summary, price_bin, engine.tick_size))))
+    for field in VALUE_AREA_FIELDS + IMBALANCE_FIELDS:
+        record[field] = summary[field]
+    return record
+
+@app.route('/api/footprint/live/<tf>', methods=['GET'])
+def get_live_footprint(tf):
+    """
+    The in-progress candle of timeframe tf exactly as finalize_candle would store it now:
+    every CSV field typed as in format=json (CVD is provisional, including this candle's
+    delta so far), plus value_area_high/value_area_low, diagonal_imbalances and
+    stacked_imbalances. "candle" is null while no candle is in progress. Accepts `bin`
+    as /api/footprint/history/<tf> does.
+    The POC, level delta extremes and imbalances are kept up to date per trade by the
+    engine and the summary is built once per engine version (engine.snapshot), so a
+    request costs one pass over the ladder at most. Polls that find nothing new get 304.
+    """
+    if tf not in TIMEFRAMES:
+        return jsonify({"error": "Invalid timeframe"}), 400
+    try:
+        price_bin = parse_bin_arg(tf)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    snapshot = engine.snapshot(tf)
+    etag = f"{history_cache.token}-live-{snapshot.version}-bin{price_bin}"
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify({
+            "tf": tf,
+            "version": snapshot.version,
+            "finalized_count": snapshot.finalized_count,
+            "candle": live_record(snapshot.summary, price_bin),
+        })
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+@app.route('/api/depth/heatmap', methods=['GET'])
+def get_depth_heatmap():
+    """
+    Resting liquidity of SYMBOL over time, from the sampled book (depth_history.DepthHistory):
+    `start`/`end` (ms, inclusive) default to the last HEATMAP_SECONDS. Returns the sample
+    times, the price grid, the best bid/ask per sample and quantities[i][j], the quantity
+    resting at prices[j] at times[i]. Spilled samples come downsampled. 404 when the depth
+    history is disabled.
+    """
+    if depth_history is None:
+        return jsonify({"error": "Depth history is disabled"}), 404
+    try:
+        start = parse_int_arg("start")
+        end = parse_int_arg("end")
+    except ValueError:
+        return jsonify({"error": "start and end must be integers (ms)"}), 400
+    if start is None:
+        start = (end if end is not None else int(time.time() * 1000)) - HEATMAP_SECONDS * 1000
+    times, prices, best, quantities = depth_history.matrix(start, end)
+    return jsonify({
+        "symbol": SYMBOL,
+        "times": times.tolist(),
+        "prices": prices.tolist(),
+        "best_bid": best[:, 0].tolist(),
+        "best_ask": best[:, 1].tolist(),
+        "quantities": quantities.tolist(),
+    })
+
+@app.route('/api/footprint/<symbol>/history/<tf>', methods=['GET'])
+def get_symbol_history(symbol, tf):
+    """
+    History of timeframe tf for any configured symbol (same query parameters as
+    /api/footprint/history/<tf>, without the "depth" field). Symbols other than SYMBOL are
+    answered by their worker.
+    """
+    symbol = symbol.upper()
+    if symbol == SYMBOL:
+        return get_footprint_history(tf)
+    if symbol not in symbol_router:
+        return jsonify({"error": "Unknown symbol"}), 404
+    if tf not in TIMEFRAMES:
+        return jsonify({"error": "Invalid timeframe"}), 400
+    try:
+        since, until, limit = parse_history_args()
+        fields = parse_fields_arg(IMBALANCE_FIELDS + VALUE_AREA_FIELDS)
+        wire_format = parse_format_arg()
+        price_bin = parse_bin_arg(tf, symbol_router.tick_sizes[symbol])
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    if wire_format == "msgpack" and msgpack is None:
+        return jsonify({"error": "format=msgpack needs the msgpack package"}), 406
+    try:
+        body = symbol_router.history(symbol, tf, since, until, limit, fields, wire_format, price_bin)
+    except TimeoutError:
+        return jsonify({"error": "Symbol worker timed out"}), 504
+    except ShardError as exc:
+        return jsonify({"error": str(exc)}), 503
+    response = Response(body, mimetype=FORMATS[wire_format])
+    response.headers["Vary"] = "Accept"
+    return response
+
+@app.route('/api/footprint/stats', methods=['GET'])
+def get_stats():
+    """
+    Contention and throughput counters: the ingest queue (depth, batches, drops and
+    backpressure), the engine lock (how often ingest and readers collided, and how long
+    they waited), snapshot reuse, the history cache, stream fan-out and, for additional
+    symbols, the same engine counters from their workers.
+    """
+    stats = {
+        "symbol": SYMBOL,
+        "engine": engine.stats(),
+        "ingest": ingest.stats(),
+        "history_cache": history_cache.stats(),
+        "depth": depth.stats() if depth is not None else None,
+        "stream": {"subscribers": broadcaster.subscriber_count(), "published": broadcaster.published},
+    }
+    if symbol_router.shards:
+        try:
+            stats["symbols"] = symbol_router.stats()
+        except (ShardError, TimeoutError) as exc:
+            stats["symbols"] = {"error": str(exc)}
+    return jsonify(stats)
+
+@app.route('/api/footprint/symbols', methods=['GET'])
+def get_symbols():
+    """Configured symbols; the first one is aggregated in this process."""
+    return jsonify(SYMBOLS)
+
+def snapshot_event(tf, limit):
+    records = [summary_to_record(summary) for summary in select_history(tf, limit=limit)]
+    return encode_event("snapshot", {"tf": tf, "candles": records})
+
+@app.route('/api/footprint/stream/<tfs>', methods=['GET'])
+def stream_footprint(tfs):
+    """
+    Server-Sent Events stream for one or more comma-separated timeframes (e.g. "1m,5m").
+    A "snapshot" event with the history (optionally only the last `limit` candles) is sent
+    on subscribe; afterwards "update" events carry the in-progress candle (coalesced to
+    STREAM_INTERVAL) and "finalized" events carry each candle closed by finalize_candle.
+    """
+    timeframes = [tf for tf in tfs.split(",") if tf]
+    if not timeframes or any(tf not in TIMEFRAMES for tf in timeframes):
+        return jsonify({"error": "Invalid timeframe"}), 400
+    try:
+        limit = parse_int_arg("limit")
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    # Subscribe before taking the snapshot so that no finalized candle can fall in between.
+    sub = broadcaster.subscribe(timeframes)
+
+    def generate():
+        try:
+            for tf in timeframes:
+                yield snapshot_event(tf, limit)
+            while True:
+                message = sub.get(timeout=STREAM_KEEPALIVE)
+                if sub.lagged:
+                    lagged, sub.lagged = sub.lagged, set()
+                    for tf in timeframes:
+                        if tf in lagged:
+                            yield snapshot_event(tf, limit)
+                    continue
+                if message is None:
+                    continue
+                yield message or ": keepalive\n\n"
+        finally:
+            broadcaster.unsubscribe(sub)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers=headers)
 
 # ----------------------------
 # Run Flask App
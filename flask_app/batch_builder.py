@@ -0,0 +1,336 @@
+# batch_builder.py
+"""
+Vectorized footprint builder for bulk tick data (requires NumPy).
+
+Loads tick_data_{SYMBOL}_{date}.csv files (python_footprint/data.py format, optionally
+gzip/bz2/xz/zstd-compressed) into arrays and builds every timeframe with array operations:
+base candles are the runs of equal buckets, (candle, price tick) groups are summed
+with one sort + reduceat, and higher timeframes are rolled up from the base candles
+and levels the same way FootprintEngine rolls them up. Volumes use the
+same integer units as FootprintEngine, so sums are exact, and the summary fields
+(POCs, imbalances, delta extremes, CVD) are derived with the same rules and the same
+rounding as finalize_candle. The result is identical to replaying the trades one by
+one; use --check to cross-check against the streaming replay.
+
+Usage:
+    python batch_builder.py --out data_rebuilt tick_data_XMRUSDT_2025-04-15.csv [...]
+    python batch_builder.py --check tick_data_XMRUSDT_2025-04-15.csv
+"""
+import gc
+import sys
+import time
+import argparse
+
+import numpy as np
+
+from footprint_engine import VOLUME_SCALE, timeframe_to_seconds
+from ladder import PRICE_TICK, price_decimals
+from persistence import CSV_FIELDS
+from replay import DEFAULT_TIMEFRAMES, open_ticks, replay_files, write_outputs
+
+TICK_DTYPE = np.dtype([("timestamp_ms", "i8"), ("price", "f8"), ("quantity", "f8"),
+                       ("side", "U4"), ("trade_id", "i8")])
+
+
+def load_ticks(paths):
+    """
+    Load tick files into one structured array, in file order. Trades whose id is not newer
+    than every earlier id are dropped, exactly like replay.replay_files does.
+    """
+    parts = []
+    for path in paths:
+        with open_ticks(path) as f:
+            header = f.readline().strip().split(",")
+            columns = [header.index(name) for name in TICK_DTYPE.names]
+            data = np.loadtxt(f, delimiter=",", usecols=columns, dtype=TICK_DTYPE, ndmin=1)
+        parts.append(data)
+    ticks = np.concatenate(parts) if parts else np.zeros(0, dtype=TICK_DTYPE)
+    if len(ticks):
+        ids = ticks["trade_id"]
+        previous_max = np.maximum.accumulate(np.concatenate(([-1], ids[:-1])))
+        ticks = ticks[ids > previous_max]
+    return ticks
+
+
+def _run_starts(keys):
+    """Indices where a new run of equal keys begins."""
+    if not len(keys):
+        return np.zeros(0, dtype=np.int64)
+    return np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+
+
+class BatchFootprint:
+    """
+    Result of a batch build. Has the attributes replay.write_outputs and the history API
+    use from FootprintEngine: timeframes, finalized_data and live_summary(tf).
+    """
+
+    def __init__(self, timeframes):
+        self.timeframes = list(timeframes)
+        self.finalized_data = {tf: [] for tf in self.timeframes}
+        self.live = {tf: None for tf in self.timeframes}
+        self.cumulative_delta = {tf: 0 for tf in self.timeframes}
+
+    def live_summary(self, tf):
+        return self.live[tf]
+
+
+def exact_round(values, ndigits):
+    """
+    Vectorized round(value, ndigits) that is bit-identical to Python's round(): np.round is
+    used everywhere except next to a .5 boundary, where Python's correctly rounded round()
+    decides.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    out = np.round(values, ndigits)
+    scaled = values * 10.0 ** ndigits
+    with np.errstate(invalid="ignore"):
+        distance = np.abs(scaled - np.floor(scaled) - 0.5)
+        near = np.flatnonzero(distance < 1e-6 + np.abs(scaled) * 1e-12)
+    for i in near:
+        out[i] = round(float(values[i]), ndigits)
+    return out
+
+
+def _group_levels(candle_of_row, tick_of_row, columns):
+    """
+    Sum the integer `columns` per (candle, tick), both ascending (the order the engine reports
+    levels in). Returns (level candle, level tick, summed columns).
+    """
+    span = int(tick_of_row.max() - tick_of_row.min()) + 1
+    key = candle_of_row * span + (tick_of_row - tick_of_row.min())
+    order = np.argsort(key, kind="stable")
+    key = key[order]
+    groups = _run_starts(key)
+    sums = [np.add.reduceat(column[order], groups) for column in columns]
+    return candle_of_row[order][groups], tick_of_row[order][groups], sums
+
+
+def _summaries(buckets, opens, highs, lows, closes, candle_sums, level_candle, level_tick, level_sums,
+               tick_size):
+    """
+    Build the summary dicts of one timeframe from per-candle and per-level arrays, with the
+    same rules and rounding as footprint_engine.summarize_candle.
+    """
+    scale = VOLUME_SCALE
+    n_candles = len(buckets)
+    buy_totals, sell_totals, buy_contracts, sell_contracts = candle_sums
+    group_buy, group_sell, group_buy_trades, group_sell_trades = level_sums
+    deltas = buy_totals - sell_totals
+    cvd = np.cumsum(deltas)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratios = np.where(sell_totals > 0, buy_totals / np.where(sell_totals > 0, sell_totals, 1), np.inf)
+
+    group_total = group_buy + group_sell
+    group_delta = group_buy - group_sell
+    level_bounds = np.searchsorted(level_candle, np.arange(n_candles + 1))
+    level_starts = level_bounds[:-1]
+    max_volume = np.maximum.reduceat(group_total, level_starts)
+    max_delta = np.maximum.reduceat(group_delta, level_starts)
+    min_delta = np.minimum.reduceat(group_delta, level_starts)
+    is_poc = group_total == max_volume[level_candle]
+    bullish = (group_buy >= 3 * group_sell) & (group_sell > 0)
+    bearish = ~bullish & (group_sell >= 3 * group_buy) & (group_buy > 0)
+
+    # Python values for the per-level output, converted once for the whole timeframe.
+    level_price = exact_round(level_tick * tick_size, price_decimals(tick_size)).tolist()
+    buy_float = (group_buy / scale).tolist()
+    sell_float = (group_sell / scale).tolist()
+    total_float = (group_total / scale).tolist()
+    buy_rounded = exact_round(group_buy / scale, 2).tolist()
+    sell_rounded = exact_round(group_sell / scale, 2).tolist()
+    buy_trades = group_buy_trades.tolist()
+    sell_trades = group_sell_trades.tolist()
+    poc_levels = np.flatnonzero(is_poc)
+    imbalance_levels = np.flatnonzero(bullish | bearish)
+    poc_bounds = np.searchsorted(poc_levels, level_bounds).tolist()
+    imbalance_bounds = np.searchsorted(imbalance_levels, level_bounds).tolist()
+    poc_levels = poc_levels.tolist()
+    imbalance_levels = imbalance_levels.tolist()
+    bullish = bullish.tolist()
+    level_bounds = level_bounds.tolist()
+    # The price_levels entries of every level in one pass; each candle takes a slice.
+    level_entries = [{
+        "buy_volume": buy,
+        "sell_volume": sell,
+        "buy_trades": buy_count,
+        "sell_trades": sell_count
+    } for buy, sell, buy_count, sell_count in zip(buy_rounded, sell_rounded, buy_trades, sell_trades)]
+
+    columns = {
+        "bucket": buckets.tolist(),
+        "total_volume": exact_round((buy_totals + sell_totals) / scale, 2).tolist(),
+        "buy_volume": exact_round(buy_totals / scale, 2).tolist(),
+        "sell_volume": exact_round(sell_totals / scale, 2).tolist(),
+        "buy_contracts": buy_contracts.tolist(),
+        "sell_contracts": sell_contracts.tolist(),
+        "open": exact_round(opens, 2).tolist(),
+        "high": exact_round(highs, 2).tolist(),
+        "low": exact_round(lows, 2).tolist(),
+        "close": exact_round(closes, 2).tolist(),
+        "delta": exact_round(deltas / scale, 2).tolist(),
+        "max_delta": exact_round(max_delta / scale, 2).tolist(),
+        "min_delta": exact_round(min_delta / scale, 2).tolist(),
+        "CVD": exact_round(cvd / scale, 2).tolist(),
+        "buy_sell_ratio": exact_round(ratios, 2).tolist(),
+    }
+    names = list(columns)
+    summaries = []
+    for i, values in enumerate(zip(*columns.values())):
+        summary = dict(zip(names, values))
+        summary["pocs"] = [{
+            "price": level_price[j],
+            "total_volume": total_float[j],
+            "buy_volume": buy_float[j],
+            "sell_volume": sell_float[j]
+        } for j in poc_levels[poc_bounds[i]:poc_bounds[i + 1]]]
+        first, last = level_bounds[i], level_bounds[i + 1]
+        summary["price_levels"] = dict(zip(level_price[first:last], level_entries[first:last]))
+        summary["imbalances"] = [{
+            "price": level_price[j],
+            "type": "Bullish" if bullish[j] else "Bearish",
+            "buy": buy_float[j],
+            "sell": sell_float[j]
+        } for j in imbalance_levels[imbalance_bounds[i]:imbalance_bounds[i + 1]]]
+        summaries.append(summary)
+    return summaries, (int(cvd[-2]) if n_candles > 1 else 0)
+
+
+def build_footprints(ticks, timeframes=DEFAULT_TIMEFRAMES, tick_size=PRICE_TICK):
+    """
+    Build every timeframe from a tick array. Like the live service, the last candle of each
+    timeframe is left in progress (BatchFootprint.live_summary) rather than finalized.
+
+    As in FootprintEngine, only the base (finest) timeframe is built from the trades: a
+    single sort groups them by (candle, tick). Higher timeframes are rolled up from the
+    base candles and base levels, which are far fewer rows than trades.
+    """
+    result = BatchFootprint(timeframes)
+    if not len(ticks):
+        return result
+    # Summaries are millions of small dicts that are never garbage: without this the
+    # cyclic collector runs over and over while they are built.
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        _build(result, ticks, tick_size)
+    finally:
+        if collecting:
+            gc.enable()
+    return result
+
+
+def _build(result, ticks, tick_size):
+    """Body of build_footprints: fill `result` from a non-empty tick array."""
+    seconds = {tf: timeframe_to_seconds(tf) for tf in result.timeframes}
+    base_tf = min(result.timeframes, key=seconds.get)
+
+    seconds_ts = ticks["timestamp_ms"] // 1000
+    prices = ticks["price"]
+    sellers = ticks["side"] == "sell"
+    volumes = np.rint(ticks["quantity"] * VOLUME_SCALE).astype(np.int64)
+    tick_index = np.rint(prices / tick_size).astype(np.int64)
+    trade_columns = [np.where(sellers, 0, volumes), np.where(sellers, volumes, 0),
+                     (~sellers).astype(np.int64), sellers.astype(np.int64)]
+
+    # Base candles are runs of equal buckets, exactly where the engine closes a candle.
+    base_buckets = (seconds_ts // seconds[base_tf]) * seconds[base_tf]
+    starts = _run_starts(base_buckets)
+    ends = np.concatenate((starts[1:], [len(base_buckets)]))
+    base = {
+        "bucket": base_buckets[starts],
+        "open": prices[starts],
+        "high": np.maximum.reduceat(prices, starts),
+        "low": np.minimum.reduceat(prices, starts),
+        "close": prices[ends - 1],
+        "sums": [np.add.reduceat(column, starts) for column in trade_columns],
+    }
+    candle_of_trade = np.repeat(np.arange(len(starts)), ends - starts)
+    base_level_candle, base_level_tick, base_level_sums = _group_levels(candle_of_trade, tick_index, trade_columns)
+
+    for tf in result.timeframes:
+        if tf == base_tf:
+            buckets, opens, highs, lows, closes = (base["bucket"], base["open"], base["high"],
+                                                   base["low"], base["close"])
+            candle_sums = base["sums"]
+            level_candle, level_tick, level_sums = base_level_candle, base_level_tick, base_level_sums
+        else:
+            # A higher-timeframe candle is a run of base candles with the same bucket.
+            rolled = (base["bucket"] // seconds[tf]) * seconds[tf]
+            htf_starts = _run_starts(rolled)
+            htf_ends = np.concatenate((htf_starts[1:], [len(rolled)]))
+            buckets = rolled[htf_starts]
+            opens = base["open"][htf_starts]
+            highs = np.maximum.reduceat(base["high"], htf_starts)
+            lows = np.minimum.reduceat(base["low"], htf_starts)
+            closes = base["close"][htf_ends - 1]
+            candle_sums = [np.add.reduceat(column, htf_starts) for column in base["sums"]]
+            htf_of_base = np.repeat(np.arange(len(htf_starts)), htf_ends - htf_starts)
+            level_candle, level_tick, level_sums = _group_levels(
+                htf_of_base[base_level_candle], base_level_tick, base_level_sums)
+
+        summaries, cvd = _summaries(buckets, opens, highs, lows, closes, candle_sums,
+                                    level_candle, level_tick, level_sums, tick_size)
+        result.finalized_data[tf] = summaries[:-1]
+        result.live[tf] = summaries[-1]
+        result.cumulative_delta[tf] = cvd
+
+
+def compare_with_replay(paths, result, timeframes, tick_size):
+    """
+    Replay the same files through the streaming engine and count candles whose footprint
+    file fields (CSV_FIELDS) differ. The engine's summaries carry more (imbalances, value
+    area, ...), which are not written to the files and not built here.
+    """
+    engine, stats = replay_files(paths, timeframes, tick_size)
+    mismatches = 0
+    for tf in timeframes:
+        streamed = [_file_fields(s) for s in engine.finalized_data[tf] + [engine.live_summary(tf)]]
+        batched = [_file_fields(s) for s in result.finalized_data[tf] + [result.live_summary(tf)]]
+        if len(streamed) != len(batched):
+            mismatches += abs(len(streamed) - len(batched))
+        mismatches += sum(1 for a, b in zip(streamed, batched) if a != b)
+    return mismatches, stats
+
+
+def _file_fields(summary):
+    return None if summary is None else [summary.get(field) for field in CSV_FIELDS]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build footprint files from tick CSVs with NumPy.")
+    parser.add_argument("files", nargs="+", help="tick CSV files (.csv, optionally .gz/.bz2/.xz/.zst), in order")
+    parser.add_argument("--out", help="output directory for footprint files")
+    parser.add_argument("--timeframes", default=",".join(DEFAULT_TIMEFRAMES))
+    parser.add_argument("--tick-size", type=float, default=PRICE_TICK)
+    parser.add_argument("--backend", choices=["csv", "binary"], default="csv")
+    parser.add_argument("--check", action="store_true",
+                        help="also run the streaming replay and verify both give identical candles")
+    args = parser.parse_args(argv)
+    timeframes = args.timeframes.split(",")
+
+    started = time.perf_counter()
+    ticks = load_ticks(args.files)
+    loaded = time.perf_counter()
+    result = build_footprints(ticks, timeframes, args.tick_size)
+    built = time.perf_counter()
+    print(f"Loaded {len(ticks)} trades in {loaded - started:.2f}s, built footprints in "
+          f"{built - loaded:.2f}s ({len(ticks) / max(built - started, 1e-9):,.0f} trades/sec overall)")
+    print("Candles: " + ", ".join(f"{tf}={len(result.finalized_data[tf])}" for tf in timeframes))
+
+    if args.out:
+        write_outputs(result, args.out, args.backend)
+        print(f"Wrote {args.backend} files to {args.out}")
+
+    if args.check:
+        mismatches, stats = compare_with_replay(args.files, result, timeframes, args.tick_size)
+        print(f"Streaming replay: {stats['seconds']:.2f}s ({stats['trades_per_sec']:,.0f} trades/sec), "
+              f"speedup x{stats['seconds'] / max(built - started, 1e-9):.1f} "
+              f"(x{stats['seconds'] / max(built - loaded, 1e-9):.1f} without loading)")
+        print("Cross-check: " + ("identical" if not mismatches else f"{mismatches} differing candles"))
+        return 1 if mismatches else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,349 @@
+# benchmark.py
+"""
+Benchmarks of the service's hot paths on seeded synthetic trades.
+
+  ingest    json.loads + engine.process_trade per websocket message, and the batched
+            path of the running service (ingest.TradeIngest.process)
+  finalize  engine.finalize_candle as a function of the number of price levels
+  write_csv a full rewrite of a footprint file (what the service did every second
+            before persistence.CandleFileWriter) as a function of history length
+  history   GET /api/footprint/history/<tf> latency under the Flask test client
+
+Every metric is a time (lower is better). Results are written as JSON and can be
+compared against a stored baseline; the exit status is 1 when a metric got slower
+than the baseline by more than the tolerance.
+
+Usage:
+    python benchmark.py --out bench.json
+    python benchmark.py --save-baseline bench_baseline.json
+    python benchmark.py --baseline bench_baseline.json --tolerance 0.25
+"""
+import os
+import csv
+import sys
+import json
+import math
+import time
+import atexit
+import random
+import shutil
+import argparse
+import platform
+import statistics
+import tempfile
+
+from footprint_engine import FootprintEngine
+from ingest import INGEST_BATCH, TradeIngest
+from ladder import PRICE_TICK, price_decimals
+from persistence import CSV_FIELDS, summary_to_row
+from replay import DEFAULT_TIMEFRAMES
+
+DEFAULT_SEED = 42
+# Monday 2025-04-14 00:00:00 UTC, aligned on every default timeframe.
+DEFAULT_START_MS = 1744588800000
+
+
+# ----------------------------
+# Synthetic trades
+# ----------------------------
+def synthetic_trades(count, seed=DEFAULT_SEED, price=215.0, volatility=0.00005, trades_per_sec=50.0,
+                     buy_ratio=0.5, levels=200, start_ms=DEFAULT_START_MS, symbol="XMRUSDT",
+                     tick_size=PRICE_TICK):
+    """
+    Yield `count` Binance @trade messages (JSON strings) from a seeded random walk.
+
+    volatility     standard deviation of the relative price move per trade
+    trades_per_sec mean arrival rate (exponential inter-arrival times)
+    buy_ratio      share of trades where the buyer is the aggressor ("m": false)
+    levels         number of distinct price ticks the walk may visit, centred on `price`
+    """
+    rng = random.Random(seed)
+    decimals = price_decimals(tick_size)
+    centre = round(price / tick_size)
+    lo = centre - levels // 2
+    hi = lo + max(levels, 1) - 1
+    value = centre * tick_size
+    timestamp = float(start_ms)
+    mean_gap_ms = 1000.0 / trades_per_sec
+    for trade_id in range(1, count + 1):
+        value *= math.exp(rng.gauss(0.0, volatility))
+        tick = round(value / tick_size)
+        if tick < lo or tick > hi:
+            # Reflect at the edges of the band so the walk keeps using `levels` ticks.
+            tick = 2 * hi - tick if tick > hi else 2 * lo - tick
+            tick = min(max(tick, lo), hi)
+            value = tick * tick_size
+        timestamp += rng.expovariate(1.0 / mean_gap_ms)
+        quantity = max(0.001, round(rng.lognormvariate(-1.0, 1.0), 3))
+        yield json.dumps({
+            "e": "trade",
+            "E": int(timestamp) + 5,
+            "T": int(timestamp),
+            "s": symbol,
+            "t": trade_id,
+            "p": f"{tick * tick_size:.{decimals}f}",
+            "q": f"{quantity:.3f}",
+            "X": "MARKET",
+            "m": rng.random() >= buy_ratio,
+        })
+
+
+def median_time(fn, repeat):
+    """Median wall time of `repeat` calls of fn(), in seconds."""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+
+# ----------------------------
+# Benchmarks
+# ----------------------------
+def bench_ingest(messages, timeframes, batch_size=INGEST_BATCH):
+    """
+    Microseconds per message for json.loads + process_trade one message at a time, and
+    for TradeIngest.process on batches of batch_size frames (the app's processing thread).
+    """
+    engine = FootprintEngine(timeframes)
+    process_trade = engine.process_trade
+    loads = json.loads
+    started = time.perf_counter()
+    for message in messages:
+        process_trade(loads(message))
+    elapsed = time.perf_counter() - started
+
+    process = TradeIngest(FootprintEngine(timeframes)).process
+    started = time.perf_counter()
+    for i in range(0, len(messages), batch_size):
+        process(messages[i:i + batch_size])
+    batched = time.perf_counter() - started
+    return {
+        "ingest.us_per_trade": elapsed / len(messages) * 1e6,
+        "ingest.batched_us_per_trade": batched / len(messages) * 1e6,
+    }
+
+
+def bench_finalize(level_counts, timeframes, repeat, seed):
+    """Milliseconds per finalize_candle of a base candle with n distinct price levels."""
+    results = {}
+    rng = random.Random(seed)
+    for n in level_counts:
+        engine = FootprintEngine(timeframes)
+        for i in range(n * 4):
+            tick = i % n
+            engine.add_trade(DEFAULT_START_MS + i, 100.0 + tick * PRICE_TICK,
+                             round(rng.uniform(0.001, 5.0), 3), rng.random() < 0.5)
+        base_tf = engine.base_tf
+        template = engine.current_data[base_tf]
+
+        def finalize():
+            engine.current_data[base_tf] = template.copy()
+            engine.finalize_candle(base_tf, template.bucket)
+
+        # The copy is part of each call; time it alone and subtract it.
+        copy_time = median_time(template.copy, repeat)
+        results[f"finalize.levels_{n}.ms"] = max(median_time(finalize, repeat) - copy_time, 0.0) * 1000
+    return results
+
+
+def build_history(messages, timeframes):
+    """A FootprintEngine that has processed `messages`."""
+    engine = FootprintEngine(timeframes)
+    for message in messages:
+        engine.process_trade(json.loads(message))
+    return engine
+
+
+def repeat_history(summaries, length, seconds):
+    """`length` summaries cycling through `summaries`, with consecutive buckets."""
+    rows = []
+    first_bucket = DEFAULT_START_MS // 1000
+    for i in range(length):
+        summary = dict(summaries[i % len(summaries)])
+        summary["bucket"] = first_bucket + i * seconds
+        rows.append(summary)
+    return rows
+
+
+def load_app(data_dir):
+    """Import app.py against a scratch data directory, without its background threads."""
+    os.environ["FOOTPRINT_DATA_DIR"] = data_dir
+    os.environ["FOOTPRINT_BACKGROUND"] = "0"
+    os.environ["FOOTPRINT_DEPTH"] = "0"
+    import app
+    return app
+
+
+def unload_app(app):
+    """Close app's storage and symbol workers now, before its data directory is removed."""
+    for close in (app.close_csv_files, app.symbol_router.close):
+        atexit.unregister(close)
+        close()
+
+
+def install_history(app, tf, rows):
+    app.finalized_data[tf] = rows
+    app.finalized_buckets[tf] = [int(row["bucket"]) for row in rows]
+    touch(app.engine)
+
+
+def touch(engine):
+    """Advance the engine version as a trade would, so snapshots and ETags are renewed."""
+    with engine.lock:
+        engine.version += 1
+
+
+def write_csv(app, tf):
+    """Rewrite app's footprint file of tf with the finalized candles and the in-progress one."""
+    filename = os.path.join(app.DATA_DIR, f"footprint_{tf}.csv")
+    all_data = app.finalized_data[tf][:]
+    live = app.engine.live_summary(tf)
+    if live:
+        all_data.append(live)
+    with open(filename, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_FIELDS)
+        for summary in all_data:
+            writer.writerow(summary_to_row(summary))
+
+
+def bench_write_csv(app, tf, template, history_lengths, repeat):
+    """Milliseconds per full write_csv(app, tf) rewrite for each history length."""
+    results = {}
+    seconds = app.engine.seconds[tf]
+    for length in history_lengths:
+        install_history(app, tf, repeat_history(template, length, seconds))
+        results[f"write_csv.history_{length}.ms"] = median_time(lambda: write_csv(app, tf), repeat) * 1000
+    return results
+
+
+def bench_history(app, tf, template, history_lengths, repeat, limit=100):
+    """
+    Milliseconds per history request, full and with ?limit=, for each history length.
+    The engine version advances before every request, as between two polls of a live
+    chart, so only the finalized rows can come from app.history_cache. The gzip variant
+    asks for a compressed body, the ohlc variant for the columns a candlestick chart needs.
+    """
+    results = {}
+    client = app.app.test_client()
+    seconds = app.engine.seconds[tf]
+    for length in history_lengths:
+        install_history(app, tf, repeat_history(template, length, seconds))
+        for name, url, headers in (
+                ("full", f"/api/footprint/history/{tf}", {}),
+                ("full_gzip", f"/api/footprint/history/{tf}", {"Accept-Encoding": "gzip"}),
+                (f"limit_{limit}", f"/api/footprint/history/{tf}?limit={limit}", {}),
+                ("ohlc_columns", f"/api/footprint/history/{tf}?fields=bucket,open,high,low,close&format=columns", {})):
+            def request():
+                touch(app.engine)
+                response = client.get(url, headers=headers)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{url} returned {response.status_code}")
+                response.get_data()
+            results[f"history.history_{length}.{name}.ms"] = median_time(request, repeat) * 1000
+    return results
+
+
+def run(args):
+    timeframes = args.timeframes.split(",")
+    generator = dict(seed=args.seed, volatility=args.volatility, trades_per_sec=args.trades_per_sec,
+                     buy_ratio=args.buy_ratio, levels=args.levels)
+    messages = list(synthetic_trades(args.trades, **generator))
+
+    results = {}
+    results.update(bench_ingest(messages, timeframes))
+    results.update(bench_finalize(args.finalize_levels, timeframes, args.repeat, args.seed))
+
+    # Candle summaries with realistic level counts, used to build histories of any length.
+    engine = build_history(messages, timeframes)
+    tf = engine.base_tf
+    template = engine.finalized_data[tf] or [engine.live_summary(tf)]
+    data_dir = tempfile.mkdtemp(prefix="footprint_bench_")
+    try:
+        app = load_app(data_dir)
+        try:
+            results.update(bench_write_csv(app, tf, template, args.history_lengths, args.repeat))
+            results.update(bench_history(app, tf, template, args.history_lengths, args.repeat))
+        finally:
+            unload_app(app)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.node(),
+            "trades": args.trades,
+            "generator": generator,
+            "timeframes": timeframes,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare metric by metric. Returns a list of (name, baseline, current, ratio, regressed)
+    for every metric present in both.
+    """
+    rows = []
+    for name, base_value in baseline["results"].items():
+        value = results["results"].get(name)
+        if value is None:
+            continue
+        ratio = value / base_value if base_value > 0 else float("inf")
+        rows.append((name, base_value, value, ratio, ratio > 1.0 + tolerance))
+    return rows
+
+
+def int_list(text):
+    return [int(value) for value in text.split(",") if value]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ingest, finalize, persist and serve.")
+    parser.add_argument("--out", help="write the results JSON to this file")
+    parser.add_argument("--baseline", help="compare against this results JSON")
+    parser.add_argument("--save-baseline", help="write the results JSON as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown versus the baseline (0.25 = 25%%)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--trades", type=int, default=200000)
+    parser.add_argument("--trades-per-sec", type=float, default=50.0)
+    parser.add_argument("--volatility", type=float, default=0.00005)
+    parser.add_argument("--buy-ratio", type=float, default=0.5)
+    parser.add_argument("--levels", type=int, default=200)
+    parser.add_argument("--timeframes", default=",".join(DEFAULT_TIMEFRAMES))
+    parser.add_argument("--finalize-levels", type=int_list, default=[10, 100, 1000, 5000])
+    parser.add_argument("--history-lengths", type=int_list, default=[100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    for name, value in results["results"].items():
+        print(f"{name:45s} {value:12.3f}")
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2)
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = 0
+    print(f"\nAgainst {args.baseline} (tolerance {args.tolerance:.0%}):")
+    for name, base_value, value, ratio, regressed in compare(results, baseline, args.tolerance):
+        regressions += regressed
+        flag = "REGRESSION" if regressed else ""
+        print(f"{name:45s} {base_value:12.3f} -> {value:12.3f}  x{ratio:5.2f} {flag}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+# binning.py
+"""
+Price bins coarser than the tick.
+
+Ladders are accumulated per tick at ingest (see ladder.PriceLadder). A bin of `ticks`
+ticks groups levels by floor(tick / ticks), and is labelled with its lowest price, so a
+0.25 bin of a 0.01 tick instrument holds the levels 215.00 .. 215.24 under 215.0.
+
+summarize_candle precomputes the binned price_levels of every bin in the engine's
+price_bins from the exact integer volumes of the ladder ("binned_levels" of the summary,
+{ticks: price_levels}); it is kept in memory only. Other bins, and candles read back from
+disk, are derived from price_levels (volumes as stored, rounded to 2 decimals). The
+history cache keeps encoded rows per bin, so neither is redone per request.
+"""
+import json
+import math
+
+from ladder import VOLUME_SCALE, price_decimals
+
+# Bin sizes precomputed for every candle.
+PRICE_BINS = (0.05, 0.25, 1.0)
+
+
+def bin_ticks(bin_size, tick_size):
+    """Ticks per bin of `bin_size`; ValueError unless it is a positive multiple of tick_size."""
+    message = f"bin must be a positive multiple of the tick size {tick_size}"
+    # round() raises OverflowError for inf and ValueError (with its own text) for nan.
+    if not math.isfinite(bin_size) or bin_size <= 0:
+        raise ValueError(message)
+    ticks = round(bin_size / tick_size)
+    if ticks < 1 or abs(ticks * tick_size - bin_size) > tick_size * 1e-6:
+        raise ValueError(message)
+    return ticks
+
+
+def usable_bins(bin_sizes, tick_size):
+    """The sizes of `bin_sizes` that are positive multiples of tick_size."""
+    sizes = []
+    for size in bin_sizes:
+        try:
+            bin_ticks(size, tick_size)
+        except ValueError:
+            continue
+        sizes.append(size)
+    return tuple(sizes)
+
+
+def ladder_bins(ladder, bins, tick_size):
+    """{ticks: price_levels} of `ladder` for every ticks per bin in `bins`, in one pass."""
+    sums = {ticks: {} for ticks in bins}
+    for tick, buy, sell, buy_trades, sell_trades in ladder.levels():
+        for ticks, levels in sums.items():
+            level = levels.get(tick // ticks)
+            if level is None:
+                levels[tick // ticks] = [buy, sell, buy_trades, sell_trades]
+            else:
+                level[0] += buy
+                level[1] += sell
+                level[2] += buy_trades
+                level[3] += sell_trades
+    decimals = price_decimals(tick_size)
+    scale = VOLUME_SCALE
+    return {
+        ticks: {
+            round(index * ticks * tick_size, decimals): {
+                "buy_volume": round(buy / scale, 2),
+                "sell_volume": round(sell / scale, 2),
+                "buy_trades": buy_trades,
+                "sell_trades": sell_trades
+            }
+            for index, (buy, sell, buy_trades, sell_trades) in sorted(levels.items())
+        }
+        for ticks, levels in sums.items()
+    }
+
+
+def binned_levels(summary, ticks, tick_size):
+    """price_levels of a summary in bins of `ticks` ticks (precomputed when available)."""
+    precomputed = summary.get("binned_levels")
+    if precomputed is not None and ticks in precomputed:
+        return precomputed[ticks]
+    levels = summary.get("price_levels") or {}
+    if isinstance(levels, str):
+        levels = json.loads(levels)
+    sums = {}
+    for price, level in levels.items():
+        index = round(float(price) / tick_size) // ticks
+        # Rows written by older versions use "buy"/"sell" keys.
+        values = (float(level.get("buy_volume", level.get("buy", 0))),
+                  float(level.get("sell_volume", level.get("sell", 0))),
+                  int(level.get("buy_trades", 0)), int(level.get("sell_trades", 0)))
+        total = sums.get(index)
+        sums[index] = values if total is None else tuple(a + b for a, b in zip(total, values))
+    decimals = price_decimals(tick_size)
+    return {
+        round(index * ticks * tick_size, decimals): {
+            "buy_volume": round(buy, 2),
+            "sell_volume": round(sell, 2),
+            "buy_trades": buy_trades,
+            "sell_trades": sell_trades
+        }
+        for index, (buy, sell, buy_trades, sell_trades) in sorted(sums.items())
+    }
+
+
+def with_bin(summary, ticks, tick_size):
+    """Shallow copy of a summary whose price_levels are binned by `ticks` (summary itself for 1)."""
+    if ticks == 1:
+        return summary
+    binned = dict(summary)
+    binned["price_levels"] = binned_levels(summary, ticks, tick_size)
+    return binned
@@ -0,0 +1,415 @@
+# candle_store.py
+"""
+Columnar binary storage for finalized footprint candles.
+
+A store is a pair of append-only files sharing a prefix (e.g. data/footprint_1m):
+  - <prefix>.fpc  fixed-width candle records (bucket, volumes, OHLC, deltas, CVD, ...)
+  - <prefix>.fpl  fixed-width price-level records; each candle record points at its
+                  [level_start, level_start + level_count) slice of this file.
+Both start with a 16 byte header (magic, version, record size) followed by packed
+little-endian records, so they can be memory-mapped and read in place, with the
+struct module or as NumPy structured arrays (see load_columns), without parsing.
+
+POCs and imbalances are stored as flags on the price levels. Flagged levels keep
+their unrounded volumes so the pocs/imbalances entries read back unchanged.
+
+Usage:
+    python candle_store.py import data/footprint_1m.csv data/footprint_1m
+    python candle_store.py export data/footprint_1m data/footprint_1m.csv
+"""
+import os
+import csv
+import sys
+import json
+import mmap
+import time
+import struct
+import threading
+
+from footprint_engine import VOLUME_SCALE
+from persistence import CSV_FIELDS, FSYNC_INTERVAL, encode_rows, summary_to_row
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; only load_columns needs it.
+    np = None
+
+STORE_VERSION = 1
+HEADER = struct.Struct("<8sII")
+CANDLE_MAGIC = b"FPCANDLE"
+LEVEL_MAGIC = b"FPLEVELS"
+
+# bucket | total/buy/sell volume | buy/sell contracts | open high low close delta
+# max_delta min_delta CVD buy_sell_ratio | level_start level_count
+CANDLE_RECORD = struct.Struct("<q3d2q9d2q")
+CANDLE_COLUMNS = [
+    "bucket", "total_volume", "buy_volume", "sell_volume",
+    "buy_contracts", "sell_contracts",
+    "open", "high", "low", "close",
+    "delta", "max_delta", "min_delta", "CVD", "buy_sell_ratio",
+    "level_start", "level_count"
+]
+# price | buy/sell volume | buy/sell trades | flags
+LEVEL_RECORD = struct.Struct("<3d3q")
+LEVEL_COLUMNS = ["price", "buy_volume", "sell_volume", "buy_trades", "sell_trades", "flags"]
+
+FLAG_POC = 1
+FLAG_BULLISH = 2
+FLAG_BEARISH = 4
+
+if np is not None:
+    CANDLE_DTYPE = np.dtype([(name, "<i8" if name in ("bucket", "buy_contracts", "sell_contracts", "level_start", "level_count") else "<f8")
+                             for name in CANDLE_COLUMNS])
+    LEVEL_DTYPE = np.dtype([(name, "<f8" if name in ("price", "buy_volume", "sell_volume") else "<i8")
+                            for name in LEVEL_COLUMNS])
+
+
+def _number(value, cast=float):
+    """Numbers may come from a live summary or as strings from a CSV row."""
+    if value is None or value == "":
+        return cast(0)
+    return cast(float(value)) if cast is int else cast(value)
+
+
+def _nested(value, default):
+    if isinstance(value, str):
+        return json.loads(value) if value else default
+    return default if value is None else value
+
+
+def encode_candle(summary, level_start):
+    """Pack one summary into (candle record bytes, level records bytes, level count)."""
+    pocs = {float(p["price"]): p for p in _nested(summary.get("pocs"), [])}
+    imbalances = {float(i["price"]): i for i in _nested(summary.get("imbalances"), [])}
+    levels = []
+    for price, data in _nested(summary.get("price_levels"), {}).items():
+        price = float(price)
+        # In-progress rows written by older versions used "buy"/"sell" keys.
+        buy = float(data.get("buy_volume", data.get("buy", 0)))
+        sell = float(data.get("sell_volume", data.get("sell", 0)))
+        flags = 0
+        if price in pocs:
+            flags |= FLAG_POC
+            buy = float(pocs[price]["buy_volume"])
+            sell = float(pocs[price]["sell_volume"])
+        if price in imbalances:
+            flags |= FLAG_BULLISH if imbalances[price]["type"] == "Bullish" else FLAG_BEARISH
+            buy = float(imbalances[price]["buy"])
+            sell = float(imbalances[price]["sell"])
+        levels.append(LEVEL_RECORD.pack(price, buy, sell,
+                                        int(data.get("buy_trades", 0)), int(data.get("sell_trades", 0)), flags))
+    record = CANDLE_RECORD.pack(
+        _number(summary.get("bucket"), int),
+        _number(summary.get("total_volume")),
+        _number(summary.get("buy_volume")),
+        _number(summary.get("sell_volume")),
+        _number(summary.get("buy_contracts"), int),
+        _number(summary.get("sell_contracts"), int),
+        _number(summary.get("open")),
+        _number(summary.get("high")),
+        _number(summary.get("low")),
+        _number(summary.get("close")),
+        _number(summary.get("delta")),
+        _number(summary.get("max_delta")),
+        _number(summary.get("min_delta")),
+        _number(summary.get("CVD")),
+        _number(summary.get("buy_sell_ratio")),
+        level_start,
+        len(levels)
+    )
+    return record, b"".join(levels), len(levels)
+
+
+def decode_candle(values, level_values):
+    """Rebuild a summary dict from an unpacked candle record and its unpacked levels."""
+    summary = dict(zip(CANDLE_COLUMNS[:15], values[:15]))
+    pocs = []
+    imbalances = []
+    price_levels = {}
+    for price, buy, sell, buy_trades, sell_trades, flags in level_values:
+        if flags & FLAG_POC:
+            # Summed in volume units, like summarize_candle, so the float matches exactly.
+            total = (round(buy * VOLUME_SCALE) + round(sell * VOLUME_SCALE)) / VOLUME_SCALE
+            pocs.append({"price": price, "total_volume": total, "buy_volume": buy, "sell_volume": sell})
+        if flags & FLAG_BULLISH:
+            imbalances.append({"price": price, "type": "Bullish", "buy": buy, "sell": sell})
+        elif flags & FLAG_BEARISH:
+            imbalances.append({"price": price, "type": "Bearish", "buy": buy, "sell": sell})
+        price_levels[price] = {
+            "buy_volume": round(buy, 2),
+            "sell_volume": round(sell, 2),
+            "buy_trades": buy_trades,
+            "sell_trades": sell_trades
+        }
+    summary["pocs"] = pocs
+    summary["price_levels"] = price_levels
+    summary["imbalances"] = imbalances
+    return summary
+
+
+def _open_table(filename, magic, record):
+    """Open (creating if needed) one table file and return (file, record count)."""
+    exists = os.path.exists(filename) and os.path.getsize(filename) >= HEADER.size
+    f = open(filename, "r+b" if exists else "w+b")
+    if not exists:
+        f.write(HEADER.pack(magic, STORE_VERSION, record.size))
+        return f, 0
+    found, version, size = HEADER.unpack(f.read(HEADER.size))
+    if found != magic or version != STORE_VERSION or size != record.size:
+        f.close()
+        raise ValueError(f"{filename} is not a version {STORE_VERSION} candle store file")
+    # A torn trailing record from a crash is ignored and overwritten by the next append.
+    return f, (os.path.getsize(filename) - HEADER.size) // record.size
+
+
+class CandleStore:
+    """
+    Append-only columnar store of finalized candles for one timeframe.
+    Appends go through regular file writes; reads go through a read-only mmap that is
+    re-mapped when the files grew, so readers never parse or copy more than they return.
+    """
+
+    def __init__(self, prefix, fsync_interval=FSYNC_INTERVAL):
+        self.prefix = prefix
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._candles, count = _open_table(prefix + ".fpc", CANDLE_MAGIC, CANDLE_RECORD)
+        self._levels, level_count = _open_table(prefix + ".fpl", LEVEL_MAGIC, LEVEL_RECORD)
+        self._count = count
+        self._level_count = 0
+        self._maps = None
+        self._last_fsync = time.monotonic()
+        self._dirty = False
+        self.bytes_written = 0
+        if count:
+            last = self._record(count - 1)
+            self._level_count = last[-2] + last[-1]
+        # Drop level records that no candle references (torn append).
+        self._candles.truncate(HEADER.size + count * CANDLE_RECORD.size)
+        self._levels.truncate(HEADER.size + self._level_count * LEVEL_RECORD.size)
+
+    def __len__(self):
+        return self._count
+
+    # -- appending -------------------------------------------------------
+
+    @property
+    def rows_written(self):
+        return self._count
+
+    def append(self, summaries):
+        """Append finalized summaries (dicts, or CSV rows as read by csv.DictReader)."""
+        with self._lock:
+            self._append(summaries)
+            self._flush()
+
+    def _append(self, summaries):
+        records = []
+        levels = []
+        level_start = self._level_count
+        for summary in summaries:
+            record, level_bytes, n = encode_candle(summary, level_start)
+            records.append(record)
+            levels.append(level_bytes)
+            level_start += n
+        if not records:
+            return
+        # Levels first: a candle record only becomes visible once its levels are on disk.
+        self._levels.seek(HEADER.size + self._level_count * LEVEL_RECORD.size)
+        data = b"".join(levels)
+        self._levels.write(data)
+        self._levels.flush()
+        self._candles.seek(HEADER.size + self._count * CANDLE_RECORD.size)
+        self._candles.write(b"".join(records))
+        self._candles.flush()
+        self.bytes_written += len(data) + len(records) * CANDLE_RECORD.size
+        self._level_count = level_start
+        self._count += len(records)
+        self._dirty = True
+
+    def _flush(self):
+        now = time.monotonic()
+        if self._dirty and now - self._last_fsync >= self.fsync_interval:
+            os.fsync(self._levels.fileno())
+            os.fsync(self._candles.fileno())
+            self._last_fsync = now
+            self._dirty = False
+
+    def sync(self, finalized, current=None, count=None):
+        """
+        Same interface as persistence.CandleFileWriter.sync: append the finalized candles
+        not stored yet. The in-progress candle is not part of the columnar store.
+        """
+        with self._lock:
+            if self._candles.closed:
+                return
+            self._append(finalized[self._count:count])
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            if self._candles.closed:
+                return
+            self._maps = None
+            for f in (self._levels, self._candles):
+                f.flush()
+                os.fsync(f.fileno())
+                f.close()
+
+    # -- reading ---------------------------------------------------------
+
+    def _mapped(self):
+        """Return (candle view, level view) covering at least every appended record."""
+        maps = self._maps
+        if maps is None or maps[2] < self._count:
+            count = self._count
+            candle_map = mmap.mmap(self._candles.fileno(), 0, access=mmap.ACCESS_READ)
+            level_map = (mmap.mmap(self._levels.fileno(), 0, access=mmap.ACCESS_READ)
+                         if self._level_count else b"")
+            maps = self._maps = (candle_map, level_map, count)
+        return maps
+
+    def _record(self, i):
+        self._candles.seek(HEADER.size + i * CANDLE_RECORD.size)
+        return CANDLE_RECORD.unpack(self._candles.read(CANDLE_RECORD.size))
+
+    def bucket(self, i):
+        """Bucket of record i, read in place."""
+        candle_map = self._mapped()[0]
+        return struct.unpack_from("<q", candle_map, HEADER.size + i * CANDLE_RECORD.size)[0]
+
+    def read(self, start, stop):
+        """Return the summaries of records [start, stop) as dicts."""
+        candle_map, level_map, count = self._mapped()
+        stop = min(stop, count)
+        out = []
+        for i in range(start, stop):
+            values = CANDLE_RECORD.unpack_from(candle_map, HEADER.size + i * CANDLE_RECORD.size)
+            level_start, level_count = values[-2], values[-1]
+            offset = HEADER.size + level_start * LEVEL_RECORD.size
+            level_values = LEVEL_RECORD.iter_unpack(level_map[offset:offset + level_count * LEVEL_RECORD.size])
+            out.append(decode_candle(values, level_values))
+        return out
+
+
+class StoredBuckets:
+    """
+    Read-only sequence over the bucket column of a CandleStore followed by in-memory
+    appended buckets. Supports len(), indexing and append(), which is all bisect and
+    the engine need.
+    """
+
+    def __init__(self, store, tail=None):
+        self.store = store
+        # (number of items read from the store, in-memory tail), replaced as a whole by
+        # release() so that readers never combine a new boundary with an old tail.
+        self._split = (len(store), list(tail or []))
+
+    @property
+    def stored(self):
+        return self._split[0]
+
+    @property
+    def tail(self):
+        return self._split[1]
+
+    def __len__(self):
+        stored, tail = self._split
+        return stored + len(tail)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        stored, tail = self._split
+        if i < 0:
+            i += stored + len(tail)
+        if i < stored:
+            return self.store.bucket(i)
+        return tail[i - stored]
+
+    def append(self, bucket):
+        self._split[1].append(bucket)
+
+    def release(self, count):
+        """Serve the first `count` tail items from the store from now on (it must hold them)."""
+        stored, tail = self._split
+        self._split = (stored + count, tail[count:])
+
+
+class StoredCandles(StoredBuckets):
+    """
+    Sequence of finalized summaries: records already in the store when it was opened are
+    decoded from the memory map on access, candles finalized since then stay in memory
+    until they are released to the store.
+    """
+
+    def __getitem__(self, i):
+        stored, tail = self._split
+        if isinstance(i, slice):
+            start, stop, step = i.indices(stored + len(tail))
+            if step != 1:
+                return [self[j] for j in range(start, stop, step)]
+            rows = self.store.read(start, min(stop, stored)) if start < stored else []
+            return rows + tail[max(start - stored, 0):max(stop - stored, 0)]
+        if i < 0:
+            i += stored + len(tail)
+        if i < stored:
+            return self.store.read(i, i + 1)[0]
+        return tail[i - stored]
+
+    def __iter__(self):
+        return iter(self[:])
+
+
+def load_columns(prefix):
+    """
+    Memory-map a store as NumPy structured arrays: (candles, levels). Columns are read
+    in place, e.g. candles["close"] or levels["price"][start:start + count].
+    """
+    if np is None:
+        raise ImportError("numpy is required for load_columns")
+    candles = np.memmap(prefix + ".fpc", dtype=CANDLE_DTYPE, mode="r", offset=HEADER.size)
+    levels = (np.memmap(prefix + ".fpl", dtype=LEVEL_DTYPE, mode="r", offset=HEADER.size)
+              if os.path.getsize(prefix + ".fpl") > HEADER.size else np.zeros(0, dtype=LEVEL_DTYPE))
+    return candles, levels
+
+
+def open_store(prefix, csv_path=None):
+    """
+    Open the store at prefix. When it is still empty and csv_path is a non-empty
+    footprint CSV, the CSV history is imported first (first start on this backend).
+    """
+    store = CandleStore(prefix)
+    if not len(store) and csv_path and os.path.exists(csv_path) and os.path.getsize(csv_path) > 0:
+        with open(csv_path, "r", newline="") as f:
+            store.append(sorted(csv.DictReader(f), key=lambda r: int(r["bucket"])))
+    return store
+
+
+def import_csv(csv_path, prefix):
+    """Append every row of a footprint_{tf}.csv file to the store at prefix."""
+    store = CandleStore(prefix)
+    with open(csv_path, "r", newline="") as f:
+        rows = list(csv.DictReader(f))
+    store.append(rows)
+    store.close()
+    return len(rows)
+
+
+def export_csv(prefix, csv_path):
+    """Write the store at prefix as a footprint_{tf}.csv file."""
+    store = CandleStore(prefix)
+    rows = store.read(0, len(store))
+    store.close()
+    with open(csv_path, "wb") as f:
+        f.write(encode_rows([CSV_FIELDS] + [summary_to_row(summary) for summary in rows]))
+    return len(rows)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] not in ("import", "export"):
+        print(__doc__)
+        sys.exit(1)
+    command, source, target = sys.argv[1:]
+    count = import_csv(source, target) if command == "import" else export_csv(source, target)
+    print(f"{command}ed {count} candles")
@@ -0,0 +1,272 @@
+# depth.py
+"""
+Resting liquidity joined to footprint candles.
+
+The order book of the service's symbol is kept in this process by orderbook.py's
+OrderBookManager, whose asyncio loop runs on a background thread. DepthTracker listens
+to every level change the manager applies and records, per timeframe and candle bucket,
+the quantity each changed level had before its first change in the candle and the lowest
+and highest quantity it reached. When a candle is finalized, the depth of the levels
+traded in it is read from there. Nothing scans the book, and the cost only depends on the
+number of traded levels:
+  - start: the quantity before the level's first change in the candle, or, for a level
+    that did not change, its quantity now (see end);
+  - end: the quantity before the level's first change in a later candle, or, if it has
+    not changed since, its quantity in the book now;
+  - min/max: over start and every change in the candle.
+
+Per candle the result is JSON text {price: {"bid": [start, end, min, max], "ask": [...]}},
+with the price keys of price_levels. It is kept per timeframe by a DepthStore and served
+as the "depth" field of the history API.
+"""
+import os
+import json
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+
+from footprint_engine import timeframe_to_seconds
+from orderbook import QUANTITY_SCALE, OrderBookManager
+
+# Depth texts of the most recent candles kept in memory per timeframe; older ones are
+# read back from depth_{tf}.jsonl.
+DEPTH_MEMORY = 1000
+
+
+class _Window:
+    """Levels changed during one candle: tick -> [quantity before first change, min, max]."""
+
+    __slots__ = ("bids", "asks")
+
+    def __init__(self):
+        self.bids = {}
+        self.asks = {}
+
+
+class DepthTracker:
+    """Per-candle depth statistics of an OrderBookManager's levels (see module docstring)."""
+
+    def __init__(self, manager, timeframes):
+        self.manager = manager
+        self.seconds = {tf: timeframe_to_seconds(tf) for tf in timeframes}
+        # Open windows per timeframe, by bucket (ascending).
+        self.windows = {tf: OrderedDict() for tf in timeframes}
+        # Last finalized bucket per timeframe: later changes to it are not tracked.
+        self.finalized = {tf: None for tf in timeframes}
+        manager.listener = self
+
+    def book_changed(self, is_bid, tick, old, new, time_ms):
+        """OrderBookManager listener, called with manager.lock held before the change."""
+        if time_ms is None:
+            time_ms = int(time.time() * 1000)
+        timestamp = time_ms // 1000
+        for tf, seconds in self.seconds.items():
+            bucket = timestamp // seconds * seconds
+            finalized = self.finalized[tf]
+            if finalized is not None and bucket <= finalized:
+                continue
+            windows = self.windows[tf]
+            window = windows.get(bucket)
+            if window is None:
+                window = windows[bucket] = _Window()
+            levels = window.bids if is_bid else window.asks
+            entry = levels.get(tick)
+            if entry is None:
+                levels[tick] = [old, min(old, new), max(old, new)]
+            else:
+                if new < entry[1]:
+                    entry[1] = new
+                elif new > entry[2]:
+                    entry[2] = new
+
+    def _level(self, levels_of, window, later, side_levels, tick):
+        """[start, end, min, max] (quantities) of one side of a tick."""
+        end = None
+        for other in later:
+            entry = levels_of(other).get(tick)
+            if entry is not None:
+                end = entry[0]
+                break
+        if end is None:
+            end = side_levels.get(tick, 0)
+        entry = levels_of(window).get(tick) if window is not None else None
+        if entry is None:
+            values = (end, end, end, end)
+        else:
+            values = (entry[0], end, min(entry[1], end), max(entry[2], end))
+        return [value / QUANTITY_SCALE for value in values]
+
+    def candle_depth(self, tf, bucket, prices, final=False):
+        """
+        {price: {"bid": [...], "ask": [...]}} for the candle `bucket` of tf and the given
+        prices (price_levels keys). With final=True the candle's windows are released and
+        later changes to it are ignored. None while the book has never been synced.
+        """
+        manager = self.manager
+        with manager.lock:
+            if manager.last_update_id is None:
+                return None
+            windows = self.windows[tf]
+            window = windows.get(bucket)
+            later = [w for b, w in windows.items() if b > bucket]
+            bids, asks = manager.bids, manager.asks
+            depth = {}
+            for price in prices:
+                tick = bids.to_tick(float(price))
+                depth[price] = {
+                    "bid": self._level(_bid_levels, window, later, bids.levels, tick),
+                    "ask": self._level(_ask_levels, window, later, asks.levels, tick),
+                }
+            if final:
+                for b in [b for b in windows if b <= bucket]:
+                    del windows[b]
+                self.finalized[tf] = bucket
+        return depth
+
+    def stats(self):
+        return {tf: len(windows) for tf, windows in self.windows.items()}
+
+
+def _bid_levels(window):
+    return window.bids
+
+
+def _ask_levels(window):
+    return window.asks
+
+
+class DepthStore:
+    """
+    Depth texts of one timeframe's finalized candles: the most recent `memory` in memory,
+    all of them in depth_{tf}.jsonl as "<bucket>\\t<json>" lines in bucket order, found by
+    binary search over the file.
+    """
+
+    def __init__(self, directory, tf, memory=DEPTH_MEMORY):
+        self.filename = os.path.join(directory, f"depth_{tf}.jsonl")
+        self.memory = memory
+        self.recent = OrderedDict()
+        self.pending = []
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        if os.path.exists(self.filename):
+            # Drop a line cut short by a crash, so the next append starts on a fresh line.
+            with open(self.filename, "rb+") as f:
+                size = f.seek(0, os.SEEK_END)
+                if size:
+                    f.seek(max(size - 65536, 0))
+                    tail = f.read()
+                    if not tail.endswith(b"\n"):
+                        cut = tail.rfind(b"\n")
+                        f.truncate(size - len(tail) + cut + 1 if cut >= 0 else 0)
+
+    def add(self, bucket, text):
+        with self._lock:
+            self.recent[bucket] = text
+            if len(self.recent) > self.memory:
+                self.recent.popitem(last=False)
+            self.pending.append(f"{bucket}\t{text}\n")
+
+    def get(self, bucket):
+        with self._lock:
+            text = self.recent.get(bucket)
+        if text is None:
+            text = self._read(bucket)
+        return text
+
+    def _read(self, bucket):
+        """Binary search depth_{tf}.jsonl for the line of `bucket`."""
+        with self._file_lock:
+            if not os.path.exists(self.filename):
+                return None
+            with open(self.filename, "rb") as f:
+                # Smallest position whose next line has a bucket >= the wanted one.
+                lo, hi = 0, f.seek(0, os.SEEK_END)
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    start, line = _line_from(f, mid)
+                    if line and int(line.split(b"\t", 1)[0]) < bucket:
+                        lo = start + 1
+                    else:
+                        hi = mid
+                line = _line_from(f, lo)[1]
+        if line.endswith(b"\n"):
+            line_bucket, text = line.split(b"\t", 1)
+            if int(line_bucket) == bucket:
+                return text.decode().rstrip("\n")
+        return None
+
+    def flush(self):
+        with self._lock:
+            lines, self.pending = self.pending, []
+        if lines:
+            with self._file_lock:
+                with open(self.filename, "a") as f:
+                    f.writelines(lines)
+
+
+def _line_from(f, pos):
+    """(offset, text) of the first line starting at or after byte pos."""
+    if pos == 0:
+        f.seek(0)
+    else:
+        f.seek(pos - 1)
+        f.readline()
+    return f.tell(), f.readline()
+
+
+class DepthService:
+    """
+    Order book of `symbol` run inside the service, with per-candle depth for `engine` and,
+    with a depth_history.DepthHistory, the sampled book for heatmaps. Register on_finalize
+    with engine.on_finalize; call flush() from the persistence loop and close() on shutdown.
+    """
+
+    def __init__(self, engine, symbol, directory, memory=DEPTH_MEMORY, manager=None, history=None):
+        self.engine = engine
+        self.history = history
+        self.manager = manager or OrderBookManager(symbol, engine.tick_size, history=history)
+        self.tracker = DepthTracker(self.manager, engine.timeframes)
+        self.stores = {tf: DepthStore(directory, tf, memory) for tf in engine.timeframes}
+        self.thread = None
+
+    def start(self):
+        """Run the order book (stream, snapshots, resyncs) on a daemon thread."""
+        self.thread = threading.Thread(
+            target=lambda: asyncio.run(self.manager.initialize(display_interval=0)), daemon=True)
+        self.thread.start()
+
+    def on_finalize(self, tf, summary):
+        """engine.on_finalize callback: store the depth of the candle's traded levels."""
+        depth = self.tracker.candle_depth(tf, summary["bucket"], summary["price_levels"], final=True)
+        if depth is not None:
+            self.stores[tf].add(summary["bucket"], json.dumps(depth))
+
+    def depth_text(self, tf, summary, live=False):
+        """JSON text of a candle's depth (computed now for the live candle), or None."""
+        if live:
+            depth = self.tracker.candle_depth(tf, summary["bucket"], summary["price_levels"])
+            return json.dumps(depth) if depth is not None else None
+        return self.stores[tf].get(int(summary["bucket"]))
+
+    def version(self):
+        """Changes whenever the book does (used in ETags of responses carrying depth)."""
+        return self.manager.previous_final_update_id or self.manager.last_update_id or 0
+
+    def flush(self):
+        for store in self.stores.values():
+            store.flush()
+
+    def close(self):
+        """Flush the depth files and spill the in-memory depth history."""
+        self.flush()
+        if self.history is not None:
+            self.history.close()
+
+    def stats(self):
+        stats = self.manager.stats()
+        stats["open_windows"] = self.tracker.stats()
+        if self.history is not None:
+            stats["history"] = self.history.stats()
+        return stats
@@ -0,0 +1,215 @@
+"""
+Depth history of an order book for liquidity heatmaps.
+
+DepthHistory samples the book (OrderBookManager) every `interval` seconds into a ring
+buffer of preallocated NumPy arrays: per sample the time, the best bid/ask ticks and the
+resting quantity at every tick of a band of `band` ticks on each side of the mid price.
+Memory is fixed by `capacity`. When the ring is full, its oldest `spill_chunk` samples
+are averaged `downsample` at a time and written to depth_<first ms>.npz under
+`directory` (or simply overwritten when there is no directory), so the history can run
+for days.
+
+matrix(start_ms, end_ms) returns the time x price liquidity matrix of a range, from the
+spilled files and the ring. close() spills the samples still in memory, at full
+resolution, so a restart finds the whole history on disk. Recording and queries may run
+on different threads.
+"""
+import os
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_INTERVAL = 1.0     # seconds between samples
+DEFAULT_BAND = 250         # ticks on each side of the mid price
+DEFAULT_CAPACITY = 3600    # samples kept in memory (1 hour at 1s)
+DEFAULT_DOWNSAMPLE = 10    # samples averaged into one when spilled to disk
+
+
+class DepthHistory:
+    def __init__(self, directory: Optional[str] = None, tick_size: float = 0.01,
+                 interval: float = DEFAULT_INTERVAL, band: int = DEFAULT_BAND,
+                 capacity: int = DEFAULT_CAPACITY, downsample: int = DEFAULT_DOWNSAMPLE,
+                 spill_chunk: Optional[int] = None):
+        self.directory = directory
+        self.tick_size = tick_size
+        self.interval = interval
+        self.band = band
+        self.width = 2 * band + 1
+        self.capacity = capacity
+        self.downsample = max(downsample, 1)
+        # Spill whole downsampling groups, a quarter of the ring at a time by default.
+        chunk = spill_chunk or max(capacity // 4, 1)
+        self.spill_chunk = min(max(chunk - chunk % self.downsample, self.downsample), capacity)
+
+        self.times = np.zeros(capacity, np.int64)            # sample time, ms
+        self.bases = np.zeros(capacity, np.int64)            # tick of column 0
+        self.best = np.zeros((capacity, 2), np.int64)        # best bid tick, best ask tick
+        self.quantities = np.zeros((capacity, self.width), np.float32)
+        self.start = 0     # ring index of the oldest sample
+        self.count = 0
+        self.samples = 0
+        self.spilled = 0
+        self._lock = threading.Lock()
+
+        # (first ms, last ms, path) of the spilled files, oldest first
+        self.segments: List[Tuple[int, int, str]] = []
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            for name in sorted(os.listdir(directory)):
+                if name.startswith("depth_") and name.endswith(".npz"):
+                    path = os.path.join(directory, name)
+                    with np.load(path) as data:
+                        times = data["times"]
+                        if len(times):
+                            self.segments.append((int(times[0]), int(times[-1]), path))
+            self.segments.sort()
+
+    def __len__(self):
+        return self.count
+
+    # --- Recording ---
+    def add(self, time_ms: int, best_bid: int, best_ask: int, ticks, quantities):
+        """Append one sample: quantities resting at ticks (anywhere; outside the band is ignored)."""
+        with self._lock:
+            if self.count == self.capacity:
+                self._make_room()
+            i = (self.start + self.count) % self.capacity
+            base = (best_bid + best_ask) // 2 - self.band
+            row = self.quantities[i]
+            row.fill(0)
+            for tick, quantity in zip(ticks, quantities):
+                column = tick - base
+                if 0 <= column < self.width:
+                    row[column] = quantity
+            self.times[i] = time_ms
+            self.bases[i] = base
+            self.best[i] = (best_bid, best_ask)
+            self.count += 1
+            self.samples += 1
+
+    def sample(self, manager, time_ms: int) -> bool:
+        """Sample the band around the mid price of an OrderBookManager. False if a side is empty."""
+        bids, asks = manager.bids, manager.asks
+        if not bids.ticks or not asks.ticks:
+            return False
+        best_bid, best_ask = bids.ticks[-1], asks.ticks[0]
+        base = (best_bid + best_ask) // 2 - self.band
+        bid_ticks, bid_quantities = bids.band(base, base + self.width)
+        ask_ticks, ask_quantities = asks.band(base, base + self.width)
+        self.add(time_ms, best_bid, best_ask, bid_ticks + ask_ticks, bid_quantities + ask_quantities)
+        return True
+
+    def _ordered(self, first: int, count: int) -> np.ndarray:
+        """Ring indexes of `count` samples starting `first` samples after the oldest."""
+        return (self.start + first + np.arange(count)) % self.capacity
+
+    def _make_room(self):
+        """Free spill_chunk slots: spill (downsampled) to disk, or drop without a directory."""
+        n = self.spill_chunk
+        if self.directory:
+            index = self._ordered(0, n)
+            self._write_segment(*downsample_samples(
+                self.times[index], self.bases[index], self.best[index], self.quantities[index],
+                self.downsample, self.width))
+        self.start = (self.start + n) % self.capacity
+        self.count -= n
+        self.spilled += n
+
+    def _write_segment(self, times, bases, best, quantities):
+        path = os.path.join(self.directory, f"depth_{int(times[0]):013d}.npz")
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, times=times, bases=bases, best=best, quantities=quantities)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        self.segments.append((int(times[0]), int(times[-1]), path))
+
+    def close(self):
+        """Spill every sample still in memory (undownsampled). Without a directory, keep them."""
+        with self._lock:
+            if not self.directory or not self.count:
+                return
+            index = self._ordered(0, self.count)
+            self._write_segment(self.times[index], self.bases[index], self.best[index],
+                                self.quantities[index])
+            self.spilled += self.count
+            self.start = self.count = 0
+
+    # --- Queries ---
+    def _rows(self, start_ms: Optional[int], end_ms: Optional[int]):
+        """Yield (times, bases, best, quantities) blocks of the range, oldest first."""
+        lo_ms = start_ms if start_ms is not None else -1
+        hi_ms = end_ms if end_ms is not None else 2**62
+        for first, last, path in self.segments:
+            if last < lo_ms or first > hi_ms:
+                continue
+            with np.load(path) as data:
+                times = data["times"]
+                keep = (times >= lo_ms) & (times <= hi_ms)
+                yield times[keep], data["bases"][keep], data["best"][keep], data["quantities"][keep]
+        if self.count:
+            index = self._ordered(0, self.count)
+            times = self.times[index]
+            keep = (times >= lo_ms) & (times <= hi_ms)
+            index = index[keep]
+            yield self.times[index], self.bases[index], self.best[index], self.quantities[index]
+
+    def matrix(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None):
+        """
+        Liquidity between start_ms and end_ms (inclusive) as (times, prices, best, matrix):
+        matrix[i, j] is the quantity resting at prices[j] at times[i] (bids below the mid,
+        asks above; best[i] holds the best bid and ask prices). Spilled samples come at
+        their downsampled resolution.
+        """
+        with self._lock:
+            blocks = [block for block in self._rows(start_ms, end_ms) if len(block[0])]
+        if not blocks:
+            empty = np.zeros(0)
+            return empty.astype(np.int64), empty, np.zeros((0, 2)), np.zeros((0, 0), np.float32)
+        times = np.concatenate([b[0] for b in blocks])
+        bases = np.concatenate([b[1] for b in blocks])
+        best = np.concatenate([b[2] for b in blocks])
+        rows = np.concatenate([b[3] for b in blocks])
+        lo = int(bases.min())
+        columns = int(bases.max()) - lo + self.width
+        matrix = np.zeros((len(times), columns), np.float32)
+        offsets = bases - lo
+        for i in range(len(times)):
+            matrix[i, offsets[i]:offsets[i] + self.width] = rows[i]
+        prices = np.round((lo + np.arange(columns)) * self.tick_size, 10)
+        return times, prices, np.round(best * self.tick_size, 10), matrix
+
+    def stats(self) -> dict:
+        return {
+            "samples": self.samples,
+            "in_memory": self.count,
+            "capacity": self.capacity,
+            "spilled": self.spilled,
+            "files": len(self.segments),
+            "memory_bytes": int(self.times.nbytes + self.bases.nbytes + self.best.nbytes
+                                + self.quantities.nbytes),
+        }
+
+
+def downsample_samples(times, bases, best, quantities, factor, width):
+    """
+    Average every `factor` consecutive samples into one. Rows are aligned on their price
+    ticks first; the result is centred on the base of each group's last sample.
+    """
+    groups = len(times) // factor
+    out_times = times[factor - 1::factor][:groups].copy()
+    out_bases = bases[factor - 1::factor][:groups].copy()
+    out_best = best[factor - 1::factor][:groups].copy()
+    out = np.zeros((groups, width), np.float32)
+    for g in range(groups):
+        base = out_bases[g]
+        for i in range(g * factor, (g + 1) * factor):
+            shift = int(bases[i] - base)
+            if shift >= 0:
+                out[g, shift:] += quantities[i, :width - shift]
+            else:
+                out[g, :width + shift] += quantities[i, -shift:]
+    out /= factor
+    return out_times, out_bases, out_best, out
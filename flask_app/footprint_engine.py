@@ -0,0 +1,617 @@
+# footprint_engine.py
+import time
+import bisect
+import threading
+
+from ladder import PRICE_TICK, VOLUME_SCALE, PriceLadder, price_decimals
+from imbalance import ImbalanceRules, ImbalanceTracker, ladder_imbalances
+from volume_profile import LevelStats, value_area
+from binning import bin_ticks, ladder_bins
+
+
+def timeframe_to_seconds(tf):
+    """Convert a timeframe string (e.g. '1m', '3m', '1h') to number of seconds."""
+    unit = tf[-1]
+    value = int(tf[:-1])
+    if unit == "m":
+        return value * 60
+    elif unit == "h":
+        return value * 3600
+    else:
+        return value
+
+
+class MeteredLock:
+    """
+    threading.Lock that counts how often it was contended and how long callers waited.
+    The uncontended path is a single non-blocking acquire of `raw`; hot paths may do that
+    themselves and call wait() only when it fails.
+    """
+
+    def __init__(self):
+        self.raw = threading.Lock()
+        self.contended = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def acquire(self):
+        if not self.raw.acquire(False):
+            self.wait()
+        return True
+
+    def wait(self):
+        """Blocking acquire after a failed non-blocking one, recording the wait."""
+        started = time.perf_counter()
+        self.raw.acquire()
+        waited = time.perf_counter() - started
+        # Updated while holding the lock, so the counters are not torn.
+        self.contended += 1
+        self.wait_seconds += waited
+        if waited > self.max_wait_seconds:
+            self.max_wait_seconds = waited
+
+    def release(self):
+        self.raw.release()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc_info):
+        self.raw.release()
+
+    def stats(self):
+        return {
+            "contended": self.contended,
+            "wait_seconds": self.wait_seconds,
+            "max_wait_seconds": self.max_wait_seconds,
+        }
+
+
+class LiveSnapshot:
+    """
+    Immutable view of a timeframe at one engine version: the number of finalized candles
+    and the summary of the in-progress candle (None if there is none). Readers must not
+    modify `summary`; the same object is handed to every reader of that version.
+    """
+
+    __slots__ = ("version", "finalized_count", "summary")
+
+    def __init__(self, version, finalized_count, summary):
+        self.version = version
+        self.finalized_count = finalized_count
+        self.summary = summary
+
+
+class EngineState:
+    """
+    Copy of the aggregation state of a FootprintEngine at one version, taken by
+    FootprintEngine.capture(): the live base candle, the roll-ups, the cumulative delta
+    and the number (and last bucket) of finalized candles per timeframe. Nothing in it is
+    shared with the engine.
+    """
+
+    def __init__(self, engine, version, base, rollups, cumulative_delta, finalized_counts, last_buckets):
+        self.engine = engine
+        self.version = version
+        self.base = base
+        self.rollups = rollups
+        self.cumulative_delta = cumulative_delta
+        self.finalized_counts = finalized_counts
+        self.last_buckets = last_buckets
+
+    def live_summary(self, tf):
+        """Summary of the in-progress candle of tf at this state, or None."""
+        engine = self.engine
+        rollup = self.rollups.get(tf)
+        cd = engine._combine(tf, self.base, rollup.copy() if rollup is not None else None)
+        if cd is None or cd.is_empty():
+            return None
+        return summarize_candle(cd, engine.bucket_of(tf, cd.bucket), self.cumulative_delta[tf], engine.tick_size,
+                                engine.imbalance_rules, engine.price_bins)
+
+    def to_state(self):
+        """Plain-data form (for checkpoints)."""
+        return {
+            "version": self.version,
+            "base": self.base.to_state() if self.base is not None else None,
+            "rollups": {tf: cd.to_state() for tf, cd in self.rollups.items() if cd is not None},
+            "cumulative_delta": self.cumulative_delta,
+            "finalized_counts": self.finalized_counts,
+            "last_buckets": self.last_buckets,
+        }
+
+
+class Candle:
+    """
+    An in-progress candle: OHLC, side totals and a tick-indexed PriceLadder.
+    Volumes are in units of 1 / VOLUME_SCALE. The live base candle also has an
+    ImbalanceTracker and LevelStats kept up to date with its ladder; merged candles have
+    neither.
+    """
+
+    __slots__ = ("bucket", "open", "high", "low", "close",
+                 "buy_volume", "sell_volume", "buy_contracts", "sell_contracts", "ladder", "imbalance_tracker",
+                 "level_stats")
+    # Derived from the ladder, so not part of checkpoints.
+    _UNSAVED = ("ladder", "imbalance_tracker", "level_stats")
+
+    def __init__(self, bucket, price, tick=0, imbalance_tracker=None, level_stats=None):
+        self.bucket = bucket
+        # For OHLC, we store open, high, low, close later.
+        self.open = price
+        self.high = price
+        self.low = price
+        self.close = price
+        self.buy_volume = 0
+        self.sell_volume = 0
+        self.buy_contracts = 0
+        self.sell_contracts = 0
+        self.ladder = PriceLadder(tick)
+        self.imbalance_tracker = imbalance_tracker
+        self.level_stats = level_stats
+
+    def is_empty(self):
+        return not self.buy_contracts and not self.sell_contracts
+
+    def merge(self, other):
+        """
+        Merge the candle `other` (a later period) into this one in place. Totals are exact
+        integers, so a merged candle is indistinguishable from one that was accumulated
+        trade by trade.
+        """
+        self.close = other.close
+        if other.high > self.high:
+            self.high = other.high
+        if other.low < self.low:
+            self.low = other.low
+        self.buy_volume += other.buy_volume
+        self.sell_volume += other.sell_volume
+        self.buy_contracts += other.buy_contracts
+        self.sell_contracts += other.sell_contracts
+        self.ladder.merge(other.ladder)
+        self.imbalance_tracker = None
+        self.level_stats = None
+        return self
+
+    def to_state(self):
+        """Plain-data form of the candle (for checkpoints)."""
+        state = {name: getattr(self, name) for name in self.__slots__ if name not in self._UNSAVED}
+        state["ladder"] = self.ladder.to_state()
+        return state
+
+    @classmethod
+    def from_state(cls, state):
+        candle = cls(state["bucket"], state["open"])
+        for name in cls.__slots__:
+            if name not in cls._UNSAVED:
+                setattr(candle, name, state[name])
+        candle.ladder = PriceLadder.from_state(state["ladder"])
+        return candle
+
+    def copy(self, bucket=None):
+        """Return a copy that shares no mutable state with this candle."""
+        candle = Candle(self.bucket if bucket is None else bucket, self.open)
+        candle.high = self.high
+        candle.low = self.low
+        candle.close = self.close
+        candle.buy_volume = self.buy_volume
+        candle.sell_volume = self.sell_volume
+        candle.buy_contracts = self.buy_contracts
+        candle.sell_contracts = self.sell_contracts
+        candle.ladder = self.ladder.copy()
+        if self.imbalance_tracker is not None:
+            candle.imbalance_tracker = self.imbalance_tracker.copy()
+        if self.level_stats is not None:
+            candle.level_stats = self.level_stats.copy()
+        return candle
+
+
+def trade_count(trade):
+    """Trades in a Binance trade message: 1 for @trade, first..last trade id for @aggTrade."""
+    last = trade.get("l")
+    return 1 if last is None else last - trade["f"] + 1
+
+
+def summarize_candle(cd, bucket, cvd_before, tick_size=PRICE_TICK, imbalance_rules=None, price_bins=()):
+    """
+    Compute the summary of candle `cd` for the candle identified by 'bucket'. cvd_before is
+    the cumulative delta (in volume units) of all earlier candles of the timeframe.
+    Price levels are reported in ascending price order. The POC and level delta extremes
+    come from the candle's LevelStats and diagonal and stacked imbalances from its
+    ImbalanceTracker; merged candles evaluate them here (imbalances with imbalance_rules,
+    default ImbalanceRules()). With price_bins (ticks per bin), the summary also carries
+    the binned price levels as "binned_levels" (see binning.py).
+    """
+    scale = VOLUME_SCALE
+    decimals = price_decimals(tick_size)
+    total_buy_volume = cd.buy_volume
+    total_sell_volume = cd.sell_volume
+    total_volume = total_buy_volume + total_sell_volume
+    delta = total_buy_volume - total_sell_volume
+
+    buy_sell_ratio = (total_buy_volume / total_sell_volume) if total_sell_volume > 0 else float('inf')
+
+    # One pass over the ladder collects the per-level output (and, without LevelStats, the
+    # POC / delta extremes).
+    levels = []
+    stats = cd.level_stats
+    if stats is not None:
+        max_volume, max_delta, min_delta = stats.extremes(cd.ladder)
+        for tick, buy, sell, buy_trades, sell_trades in cd.ladder.levels():
+            levels.append((round(tick * tick_size, decimals), buy, sell, buy_trades, sell_trades))
+    else:
+        max_volume = max_delta = min_delta = None
+        for tick, buy, sell, buy_trades, sell_trades in cd.ladder.levels():
+            price = round(tick * tick_size, decimals)
+            levels.append((price, buy, sell, buy_trades, sell_trades))
+            total = buy + sell
+            if max_volume is None or total > max_volume:
+                max_volume = total
+            level_delta = buy - sell
+            if max_delta is None or level_delta > max_delta:
+                max_delta = level_delta
+            if min_delta is None or level_delta < min_delta:
+                min_delta = level_delta
+
+    # Value area around the (lowest) POC.
+    value_area_low = value_area_high = None
+    if levels:
+        volumes = [buy + sell for _, buy, sell, _, _ in levels]
+        lo, hi = value_area(volumes, volumes.index(max_volume))
+        value_area_low, value_area_high = levels[lo][0], levels[hi][0]
+
+    # Compute POC: Price level(s) with maximum total volume (buy+sell)
+    pocs = []
+    # Imbalances – for each price level where one side is at least 3x the other.
+    imbalances = []
+    price_levels = {}
+    for price, buy, sell, buy_trades, sell_trades in levels:
+        if buy + sell == max_volume:
+            pocs.append({
+                "price": price,
+                "total_volume": (buy + sell) / scale,
+                "buy_volume": buy / scale,
+                "sell_volume": sell / scale
+            })
+        if buy >= 3 * sell and sell > 0:
+            imbalances.append({"price": price, "type": "Bullish", "buy": buy / scale, "sell": sell / scale})
+        elif sell >= 3 * buy and buy > 0:
+            imbalances.append({"price": price, "type": "Bearish", "buy": buy / scale, "sell": sell / scale})
+        price_levels[price] = {
+            "buy_volume": round(buy / scale, 2),
+            "sell_volume": round(sell / scale, 2),
+            "buy_trades": buy_trades,
+            "sell_trades": sell_trades
+        }
+
+    if cd.imbalance_tracker is not None:
+        diagonal = cd.imbalance_tracker.fields(cd.ladder, tick_size)
+    else:
+        diagonal = ladder_imbalances(cd.ladder, imbalance_rules or ImbalanceRules(), tick_size)
+
+    summary = {
+        "bucket": bucket,
+        "total_volume": round(total_volume / scale, 2),
+        "buy_volume": round(total_buy_volume / scale, 2),
+        "sell_volume": round(total_sell_volume / scale, 2),
+        "buy_contracts": cd.buy_contracts,
+        "sell_contracts": cd.sell_contracts,
+        "open": round(cd.open, 2),
+        "high": round(cd.high, 2),
+        "low": round(cd.low, 2),
+        "close": round(cd.close, 2),
+        "delta": round(delta / scale, 2),
+        "max_delta": round((max_delta or 0) / scale, 2),
+        "min_delta": round((min_delta or 0) / scale, 2),
+        "CVD": round((cvd_before + delta) / scale, 2),
+        "buy_sell_ratio": round(buy_sell_ratio, 2),
+        "pocs": pocs,
+        "value_area_high": value_area_high,
+        "value_area_low": value_area_low,
+        "price_levels": price_levels,
+        "imbalances": imbalances,
+        "diagonal_imbalances": diagonal["diagonal_imbalances"],
+        "stacked_imbalances": diagonal["stacked_imbalances"]
+    }
+    if price_bins:
+        summary["binned_levels"] = ladder_bins(cd.ladder, price_bins, tick_size)
+    return summary
+
+
+class FootprintEngine:
+    """
+    Footprint aggregation for a set of timeframes.
+
+    Only the finest timeframe (the base, e.g. 1m) is updated per trade. Every higher
+    timeframe keeps a running merge of the base candles that already closed inside
+    its bucket (rollup_data); each base candle is merged exactly once when it closes.
+    The live higher-timeframe candle is that running merge plus the live base candle,
+    built on demand by live_candle(). Per-trade cost therefore does not depend on the
+    number of timeframes.
+    """
+
+    def __init__(self, timeframes, tick_size=PRICE_TICK, imbalance_rules=None, price_bins=()):
+        self.timeframes = list(timeframes)
+        self.tick_size = tick_size
+        # Diagonal/stacked imbalance rules (see imbalance.py).
+        self.imbalance_rules = imbalance_rules or ImbalanceRules()
+        # Coarser price bins (sizes) whose levels are precomputed per candle, as ticks per bin.
+        self.price_bins = tuple(ticks for ticks in dict.fromkeys(bin_ticks(size, tick_size) for size in price_bins)
+                                if ticks > 1)
+        self.seconds = {tf: timeframe_to_seconds(tf) for tf in self.timeframes}
+        self.base_tf = min(self.timeframes, key=self.seconds.get)
+        self.base_seconds = self.seconds[self.base_tf]
+        for tf in self.timeframes:
+            if self.seconds[tf] % self.base_seconds:
+                raise ValueError(f"Timeframe {tf} is not a multiple of the base timeframe {self.base_tf}")
+        self.rollup_tfs = [tf for tf in self.timeframes if tf != self.base_tf]
+
+        # For each timeframe (key), we store:
+        #   - finalized_data: list of finalized (completed) candle summaries.
+        #   - finalized_buckets: their bucket start times, the sorted index used by range queries.
+        #   - current_data: the in-progress candle of the base timeframe (None for roll-ups).
+        #   - rollup_data: for roll-ups, the merge of the closed base candles of the current bucket.
+        #   - latest_footprint: the most recent finalized summary (for API use)
+        #   - cumulative_delta: CVD per timeframe, in volume units (see VOLUME_SCALE)
+        self.finalized_data = {tf: [] for tf in self.timeframes}
+        self.finalized_buckets = {tf: [] for tf in self.timeframes}
+        self.current_data = {tf: None for tf in self.timeframes}
+        self.rollup_data = {tf: None for tf in self.rollup_tfs}
+        self.latest_footprint = {tf: None for tf in self.timeframes}
+        self.cumulative_delta = {tf: 0 for tf in self.timeframes}
+        # Incremented on every trade and every finalization, so readers can tell cheaply
+        # whether any live candle changed since they last looked.
+        self.version = 0
+        # Callables invoked as callback(tf, summary) after a candle was finalized. They run
+        # on the ingest thread with the lock held.
+        self.on_finalize = []
+        self.lock = MeteredLock()
+        self._snapshots = {}
+        self.snapshots_built = 0
+        self.snapshots_reused = 0
+
+    def process_trade(self, trade):
+        """Process a single trade message coming from Binance WS (@trade or @aggTrade)."""
+        self.add_trade(trade["T"], float(trade["p"]), float(trade["q"]), trade["m"], trade_count(trade))
+
+    def add_trade(self, timestamp_ms, price, quantity, is_seller, trades=1):
+        """
+        Update the live base candle with one trade (or `trades` aggregated trades at one
+        price), closing candles on bucket changes.
+        """
+        raw = self.lock.raw
+        if not raw.acquire(False):
+            self.lock.wait()
+        try:
+            self._add(timestamp_ms, price, quantity, is_seller, trades)
+        finally:
+            raw.release()
+
+    def add_trades(self, trades):
+        """add_trade for (timestamp_ms, price, quantity, is_seller, trades) tuples, in order."""
+        raw = self.lock.raw
+        if not raw.acquire(False):
+            self.lock.wait()
+        try:
+            add = self._add
+            for timestamp_ms, price, quantity, is_seller, count in trades:
+                add(timestamp_ms, price, quantity, is_seller, count)
+        finally:
+            raw.release()
+
+    def _add(self, timestamp_ms, price, quantity, is_seller, trades):
+        """Body of add_trade. Called with the lock held."""
+        volume = round(quantity * VOLUME_SCALE)
+        tick = round(price / self.tick_size)
+        trade_timestamp = timestamp_ms // 1000  # seconds
+        bucket = (trade_timestamp // self.base_seconds) * self.base_seconds
+        cd = self.current_data[self.base_tf]
+        if cd is None or cd.bucket != bucket:
+            self._roll(cd, trade_timestamp)
+            cd = self.current_data[self.base_tf] = Candle(bucket, price, tick, ImbalanceTracker(self.imbalance_rules),
+                                                          LevelStats())
+        # Update OHLC
+        cd.close = price
+        if price > cd.high:
+            cd.high = price
+        if price < cd.low:
+            cd.low = price
+        # Update volumes and contracts
+        if is_seller:
+            cd.sell_volume += volume
+            cd.sell_contracts += trades
+        else:
+            cd.buy_volume += volume
+            cd.buy_contracts += trades
+        i = cd.ladder.add(tick, volume, is_seller, trades)
+        cd.level_stats.update(cd.ladder, i, tick)
+        cd.imbalance_tracker.update(cd.ladder, tick, is_seller)
+        self.version += 1
+
+    def _roll(self, cd, trade_timestamp):
+        """Close the base candle `cd` (if any) and every roll-up whose bucket ends before the trade."""
+        if cd is not None:
+            for tf in self.rollup_tfs:
+                rollup = self.rollup_data[tf]
+                if rollup is None:
+                    self.rollup_data[tf] = cd.copy(self.bucket_of(tf, cd.bucket))
+                else:
+                    rollup.merge(cd)
+            self.finalize_candle(self.base_tf, cd.bucket)
+        for tf in self.rollup_tfs:
+            rollup = self.rollup_data[tf]
+            if rollup is not None and rollup.bucket != self.bucket_of(tf, trade_timestamp):
+                self.finalize_candle(tf, rollup.bucket)
+
+    def bucket_of(self, tf, timestamp):
+        """Bucket start time (seconds) of `timestamp` in timeframe tf."""
+        seconds = self.seconds[tf]
+        return (timestamp // seconds) * seconds
+
+    def live_candle(self, tf):
+        """
+        Return the in-progress candle of timeframe tf, or None. For the base timeframe this is
+        the candle being updated by ingest; for roll-ups it is a freshly merged copy. Only
+        safe on the ingest thread; other threads use snapshot(tf).
+        """
+        rollup = self.rollup_data.get(tf)
+        return self._combine(tf, self.current_data[self.base_tf], rollup.copy() if rollup is not None else None)
+
+    def _combine(self, tf, base, rollup):
+        """Live candle of tf from the live base candle and the roll-up, both may be None.
+           `rollup` is merged into in place, so it must be a copy.
+        """
+        if tf == self.base_tf:
+            return base
+        if base is None:
+            return rollup
+        bucket = self.bucket_of(tf, base.bucket)
+        if rollup is None or rollup.bucket != bucket:
+            return base.copy(bucket)
+        return rollup.merge(base)
+
+    def snapshot(self, tf):
+        """
+        Consistent LiveSnapshot of timeframe tf, reused for as long as no trade arrived.
+        Safe to call from any thread.
+        """
+        snapshot = self._snapshots.get(tf)
+        if snapshot is not None and snapshot.version == self.version:
+            self.snapshots_reused += 1
+            return snapshot
+        with self.lock:
+            version = self.version
+            base = self.current_data[self.base_tf]
+            rollup = self.rollup_data.get(tf)
+            base = base.copy() if base is not None else None
+            rollup = rollup.copy() if rollup is not None else None
+            cvd_before = self.cumulative_delta[tf]
+            finalized_count = len(self.finalized_buckets[tf])
+        cd = self._combine(tf, base, rollup)
+        summary = None
+        if cd is not None and not cd.is_empty():
+            summary = summarize_candle(cd, self.bucket_of(tf, cd.bucket), cvd_before, self.tick_size,
+                                       self.imbalance_rules, self.price_bins)
+        snapshot = LiveSnapshot(version, finalized_count, summary)
+        self._snapshots[tf] = snapshot
+        self.snapshots_built += 1
+        return snapshot
+
+    def _pop_candle(self, tf):
+        if tf == self.base_tf:
+            cd, self.current_data[tf] = self.current_data[tf], None
+        else:
+            cd, self.rollup_data[tf] = self.rollup_data[tf], None
+        return cd
+
+    def live_summary(self, tf):
+        """
+        Summary of the in-progress candle of timeframe tf exactly as finalize_candle would
+        produce it right now (CVD included), or None. Taken from snapshot(tf); the returned
+        dict is shared and must not be modified.
+        """
+        return self.snapshot(tf).summary
+
+    def history_window(self, tf, since=None, until=None, limit=None):
+        """
+        (snapshot, lo, hi, live) of a select_history window: finalized_data[tf][lo:hi]
+        followed by `live` (the in-progress summary, or None when it falls outside the
+        window), all as of `snapshot`.
+        The window is located with a binary search over finalized_buckets, so the cost only
+        depends on the number of candles returned.
+        """
+        buckets = self.finalized_buckets[tf]
+        # The finalized count of the snapshot bounds the search: candles finalized after the
+        # snapshot was taken are still part of its live candle.
+        snapshot = self.snapshot(tf)
+        count = snapshot.finalized_count
+        lo = 0 if since is None else bisect.bisect_left(buckets, since, 0, count)
+        hi = count if until is None else bisect.bisect_right(buckets, until, lo, count)
+
+        live = snapshot.summary
+        if live is not None:
+            live_bucket = live["bucket"]
+            if (since is not None and live_bucket < since) or (until is not None and live_bucket > until):
+                live = None
+
+        if limit is not None:
+            lo = min(max(lo, hi - (limit - (1 if live is not None else 0))), hi)
+            if limit <= 0:
+                live = None
+        return snapshot, lo, hi, live
+
+    def select_history(self, tf, since=None, until=None, limit=None):
+        """
+        Return the candle summaries of timeframe tf whose bucket lies in [since, until],
+        finalized candles first and the in-progress candle last. If limit is given only the
+        most recent `limit` candles of that window are returned.
+        """
+        snapshot, lo, hi, live = self.history_window(tf, since, until, limit)
+        rows = self.finalized_data[tf][lo:hi]
+        if live is not None:
+            rows.append(live)
+        return rows
+
+    def capture(self):
+        """
+        EngineState of every timeframe at one version (one lock acquisition, array copies
+        only). Used to persist and checkpoint all timeframes consistently.
+        """
+        with self.lock:
+            base = self.current_data[self.base_tf]
+            return EngineState(
+                self,
+                self.version,
+                base.copy() if base is not None else None,
+                {tf: cd.copy() for tf, cd in self.rollup_data.items() if cd is not None},
+                dict(self.cumulative_delta),
+                {tf: len(self.finalized_buckets[tf]) for tf in self.timeframes},
+                {tf: (self.finalized_buckets[tf][-1] if len(self.finalized_buckets[tf]) else None)
+                 for tf in self.timeframes},
+            )
+
+    def restore(self, state):
+        """
+        Continue from a checkpoint (EngineState.to_state() data): live candles and cumulative
+        delta. Finalized candles are not part of it; they are attached from storage.
+        """
+        with self.lock:
+            base = state.get("base")
+            cd = self.current_data[self.base_tf] = Candle.from_state(base) if base else None
+            if cd is not None:
+                cd.imbalance_tracker = ImbalanceTracker.from_ladder(cd.ladder, self.imbalance_rules)
+                cd.level_stats = LevelStats.from_ladder(cd.ladder)
+            for tf in self.rollup_tfs:
+                rollup = state["rollups"].get(tf)
+                self.rollup_data[tf] = Candle.from_state(rollup) if rollup else None
+            for tf in self.timeframes:
+                self.cumulative_delta[tf] = state["cumulative_delta"].get(tf, 0)
+            self.version += 1
+
+    def stats(self):
+        """Lock contention and snapshot reuse counters."""
+        return {
+            "version": self.version,
+            "lock": self.lock.stats(),
+            "snapshots_built": self.snapshots_built,
+            "snapshots_reused": self.snapshots_reused,
+        }
+
+    def finalize_candle(self, tf, bucket):
+        """Compute summary for the candle identified by 'bucket' for timeframe tf,
+           store it in finalized_data[tf], update cumulative delta, and update latest_footprint.
+           Called by ingest with the lock held.
+        """
+        cd = self._pop_candle(tf)
+        if cd is None:
+            return
+        if cd.is_empty():
+            return
+        summary = summarize_candle(cd, bucket, self.cumulative_delta[tf], self.tick_size, self.imbalance_rules,
+                                   self.price_bins)
+        self.cumulative_delta[tf] += cd.buy_volume - cd.sell_volume
+        self.finalized_data[tf].append(summary)
+        self.finalized_buckets[tf].append(bucket)
+        self.latest_footprint[tf] = summary
+        self.version += 1
+        for callback in self.on_finalize:
+            callback(tf, summary)
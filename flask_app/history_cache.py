@@ -0,0 +1,281 @@
+# history_cache.py
+"""
+Pre-serialized, compressed history responses.
+
+Between two finalizations only the live row of a history response changes, so
+HistoryCache keeps per timeframe:
+  - the JSON text of the most recent finalized candles (at most CACHE_RECORDS), extended
+    when candles are finalized and otherwise never rebuilt;
+  - per requested window and content encoding, the compressed finalized part of the body
+    together with the compressor state after it. The live row is compressed on top of a
+    copy of that state (zlib compressobj.copy()), so the prefix is compressed only once.
+A body is therefore prefix + live row + "]". Responses carry a weak ETag derived from
+the engine version, so a poll that finds nothing new is answered with 304.
+
+Requests may select fields (a subset of CSV_FIELDS plus registered extra fields such as
+"depth", see add_field) and a wire format (FORMATS): rows of CSV strings as in the
+footprint files (the default), rows with typed values, or one array per field as JSON or
+MessagePack. Requests may also ask for price_levels in coarser price bins (see
+binning.py). Rows are cached per selection, format and bin.
+"""
+import os
+import json
+import zlib
+import threading
+from collections import OrderedDict
+
+try:
+    import msgpack
+except ImportError:  # Only needed for format=msgpack.
+    msgpack = None
+
+from persistence import CSV_FIELDS, summary_to_record, summary_to_values
+from binning import with_bin
+
+# Finalized candles per timeframe whose JSON text is kept (older ones are encoded per request).
+CACHE_RECORDS = 20000
+# Row caches kept (one per timeframe, field selection and row format), least recently used
+# dropped first.
+CACHE_RECORD_SETS = 24
+# Compressed windows kept, over all timeframes, query parameters and encodings.
+CACHE_WINDOWS = 32
+COMPRESS_LEVEL = 6
+# Supported Content-Encodings and the zlib wbits producing them, in order of preference.
+ENCODINGS = (("gzip", 16 + zlib.MAX_WBITS), ("deflate", zlib.MAX_WBITS))
+# Wire formats and their mimetypes:
+#   rows    – [{field: string}], every value as the CSV text csv.DictReader returns
+#   json    – [{field: value}], numbers as numbers and nested fields as JSON
+#   columns – {field: [value, ...]}, one array per field (typed as in "json")
+#   msgpack – the columns as MessagePack (needs the msgpack package)
+FORMATS = {
+    "rows": "application/json",
+    "json": "application/json",
+    "columns": "application/json",
+    "msgpack": "application/msgpack",
+}
+
+
+def encode_summary(summary, fields=None, extras=None):
+    """
+    JSON text of one history record, exactly as jsonify writes it: only `fields` when
+    given, plus the `extras` dict.
+    """
+    record = summary_to_record(summary)
+    if fields is not None:
+        record = {field: record[field] for field in fields if field in record}
+    if extras:
+        record.update(extras)
+    return json.dumps(record, separators=(",", ":"), sort_keys=True).encode()
+
+
+def choose_encoding(accept_encodings):
+    """The preferred encoding the client accepts (werkzeug Accept header), or None."""
+    for name, _ in ENCODINGS:
+        if accept_encodings[name]:
+            return name
+    return None
+
+
+class _Records:
+    """JSON text of finalized candles [start, start + len(chunks)) of one data object."""
+
+    def __init__(self, data, start):
+        self.data = data
+        self.start = start
+        self.chunks = []
+
+    @property
+    def end(self):
+        return self.start + len(self.chunks)
+
+
+class _Window:
+    """Compressed "[" + rows lo..hi of one window, and the compressor to continue from."""
+
+    def __init__(self, data, lo, wbits):
+        self.data = data
+        self.lo = lo
+        self.hi = lo
+        self.compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, wbits)
+        self.prefix = self.compressor.compress(b"[")
+
+    def extend(self, hi, chunks):
+        parts = [self.prefix]
+        for chunk in chunks:
+            parts.append(self.compressor.compress(chunk if self.hi == self.lo else b"," + chunk))
+            self.hi += 1
+        self.prefix = b"".join(parts)
+        self.hi = hi
+
+    def body(self, tail):
+        compressor = self.compressor.copy()
+        return self.prefix + compressor.compress(tail) + compressor.flush()
+
+
+class HistoryCache:
+    """Builds history response bodies of `engine` from cached serialized rows."""
+
+    def __init__(self, engine, records=CACHE_RECORDS, windows=CACHE_WINDOWS):
+        self.engine = engine
+        self.max_records = records
+        self.max_windows = windows
+        # Part of every ETag, so tags handed out before a restart never match.
+        self.token = os.urandom(4).hex()
+        # name -> (encode(tf, summary, live) -> text or None, version() -> int)
+        self.extra_fields = {}
+        self._records = OrderedDict()
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def add_field(self, name, encode, version):
+        """
+        Register an extra history field: encode(tf, summary, live) gives its value as JSON
+        text (or None), served as a string in rows and decoded in the typed formats, and
+        version() a number that changes with the values of live rows, so that it can be
+        part of the ETag.
+        """
+        self.extra_fields[name] = (encode, version)
+
+    def etag(self, snapshot, fields=None, wire_format="rows", price_bin=1):
+        """Weak ETag of every response built from `snapshot` (see FootprintEngine.snapshot)."""
+        tag = f"{self.token}-{snapshot.version}"
+        for field in fields or ():
+            if field in self.extra_fields:
+                tag += f"-{self.extra_fields[field][1]()}"
+        if wire_format != "rows":
+            tag += f"-{wire_format}"
+        if price_bin != 1:
+            tag += f"-bin{price_bin}"
+        return tag
+
+    def _values(self, tf, summary, fields, live, binned):
+        """
+        Typed values of `fields` (a tuple) of one summary, see summary_to_values. CSV fields
+        are taken from `binned` (the summary with binned price_levels).
+        """
+        columns = [field for field in fields if field not in self.extra_fields]
+        values = dict(zip(columns, summary_to_values(binned, columns)))
+        for field in fields:
+            if field in self.extra_fields:
+                text = self.extra_fields[field][0](tf, summary, live)
+                values[field] = json.loads(text) if text else None
+        return tuple(values[field] for field in fields)
+
+    def _encode(self, tf, summary, fields, row_format, live=False, price_bin=1):
+        """
+        One row: JSON text for "rows" and "json", a tuple of typed values for "values".
+        price_levels are binned by price_bin ticks; extra fields see the summary as it is.
+        """
+        binned = with_bin(summary, price_bin, self.engine.tick_size)
+        if row_format == "rows":
+            if fields is None:
+                return encode_summary(binned)
+            extras = {}
+            for field in fields:
+                if field in self.extra_fields:
+                    value = self.extra_fields[field][0](tf, summary, live)
+                    extras[field] = "" if value is None else value
+            return encode_summary(binned, fields, extras)
+        values = self._values(tf, summary, fields or tuple(CSV_FIELDS), live, binned)
+        if row_format == "values":
+            return values
+        record = dict(zip(fields or CSV_FIELDS, values))
+        return json.dumps(record, separators=(",", ":"), sort_keys=True).encode()
+
+    def _chunks(self, tf, lo, hi, fields=None, row_format="rows", price_bin=1):
+        """Encoded finalized rows lo..hi of tf (see _encode). Called with the lock held."""
+        data = self.engine.finalized_data[tf]
+        records_key = (tf, fields, row_format, price_bin)
+        records = self._records.get(records_key)
+        if records is None or records.data is not data or hi < records.end:
+            # First use, or the history was replaced (e.g. reloaded from disk).
+            records = self._records[records_key] = _Records(data, max(hi - self.max_records, 0))
+            if len(self._records) > CACHE_RECORD_SETS:
+                self._records.popitem(last=False)
+        self._records.move_to_end(records_key)
+        if hi > records.end:
+            start = max(records.end, hi - self.max_records)
+            if start > records.end:
+                records.start, records.chunks = start, []
+            records.chunks.extend(self._encode(tf, summary, fields, row_format, price_bin=price_bin)
+                                  for summary in data[start:hi])
+            excess = len(records.chunks) - self.max_records
+            # Drop the oldest text in batches rather than one row per finalization.
+            if excess > self.max_records // 4:
+                del records.chunks[:excess]
+                records.start += excess
+        start = records.start
+        if lo >= start:
+            return records.chunks[lo - start:hi - start]
+        older = [self._encode(tf, summary, fields, row_format, price_bin=price_bin)
+                 for summary in data[lo:min(hi, start)]]
+        return older + records.chunks[:max(hi - start, 0)]
+
+    def body(self, tf, key, lo, hi, live, encoding=None, fields=None, wire_format="rows", price_bin=1):
+        """
+        Response body for finalized rows lo..hi of tf followed by the `live` summary (or
+        nothing when None) in `wire_format` (see FORMATS), compressed with `encoding`
+        ("gzip", "deflate" or None), with only `fields` (a tuple) or every CSV field when
+        None, and price_levels in bins of `price_bin` ticks. `key` identifies the request
+        window (e.g. its query parameters); compressed prefixes of row formats are kept per
+        key, fields, format, bin and encoding.
+        """
+        if fields is not None and "price_levels" not in fields:
+            price_bin = 1
+        if wire_format in ("columns", "msgpack"):
+            return self._columns_body(tf, lo, hi, live, encoding, fields, wire_format, price_bin)
+        tail = b"]\n"
+        if live is not None:
+            tail = ((b"," if hi > lo else b"")
+                    + self._encode(tf, live, fields, wire_format, live=True, price_bin=price_bin) + tail)
+        with self._lock:
+            if encoding is None:
+                chunks = self._chunks(tf, lo, hi, fields, wire_format, price_bin)
+            else:
+                data = self.engine.finalized_data[tf]
+                window_key = (tf, key, fields, wire_format, price_bin, encoding)
+                window = self._windows.get(window_key)
+                if window is None or window.data is not data or window.lo != lo or window.hi > hi:
+                    self.misses += 1
+                    window = self._windows[window_key] = _Window(data, lo, dict(ENCODINGS)[encoding])
+                    if len(self._windows) > self.max_windows:
+                        self._windows.popitem(last=False)
+                else:
+                    self.hits += 1
+                    self._windows.move_to_end(window_key)
+                if hi > window.hi:
+                    window.extend(hi, self._chunks(tf, window.hi, hi, fields, wire_format, price_bin))
+                return window.body(tail)
+        return b"[" + b",".join(chunks) + tail
+
+    def _columns_body(self, tf, lo, hi, live, encoding, fields, wire_format, price_bin=1):
+        """{field: [values]} of rows lo..hi and the live summary, as JSON or MessagePack."""
+        with self._lock:
+            rows = self._chunks(tf, lo, hi, fields, "values", price_bin)
+        if live is not None:
+            rows = rows + [self._encode(tf, live, fields, "values", live=True, price_bin=price_bin)]
+        names = fields or CSV_FIELDS
+        columns = {name: [row[i] for row in rows] for i, name in enumerate(names)}
+        if wire_format == "msgpack":
+            body = msgpack.packb(columns)
+        else:
+            body = json.dumps(columns, separators=(",", ":"), sort_keys=True).encode() + b"\n"
+        if encoding is None:
+            return body
+        compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, dict(ENCODINGS)[encoding])
+        return compressor.compress(body) + compressor.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "windows": len(self._windows),
+                "records": {":".join([tf, row_format] + ([",".join(fields)] if fields else [])
+                                     + ([f"bin{price_bin}"] if price_bin != 1 else [])): len(records.chunks)
+                            for (tf, fields, row_format, price_bin), records in self._records.items()},
+            }
@@ -0,0 +1,269 @@
+# imbalance.py
+"""
+Diagonal and stacked imbalances of footprint candles.
+
+Diagonal imbalances compare the aggressive volume at one level with the opposite side one
+tick away, as footprint charts draw them:
+  - buy ("Bullish") imbalance at tick N:  buy[N]  >= ratio * sell[N - 1]
+  - sell ("Bearish") imbalance at tick N: sell[N] >= ratio * buy[N + 1]
+As for the same-level "imbalances", the opposite side must have traded, and the dominant
+side needs at least `min_volume`. At least `stack` consecutive ticks with an imbalance on
+the same side form a stacked-imbalance zone.
+
+ImbalanceTracker keeps both up to date for the live base candle. A trade at tick N only
+changes buy[N] or sell[N], which can only change the imbalances of N and of one
+neighbour, so those two levels are re-evaluated and the runs of consecutive imbalances
+around them adjusted: runs are kept as start -> end and end -> start maps per side, so
+creating, extending or joining them is O(1), and only an imbalance disappearing inside a
+run (the opposite side catching up) walks that run to split it. Merged (higher
+timeframe) candles and summaries read back from disk are evaluated in one pass with
+find_imbalances.
+
+Summaries carry both as "diagonal_imbalances" ([{price, type, buy, sell}], where buy and
+sell are the two volumes compared) and "stacked_imbalances" ([{type, low, high, levels}]).
+They are not part of the footprint files; the history API serves them as extra fields and
+evaluates them from price_levels for candles read back from disk.
+"""
+import json
+
+from ladder import VOLUME_SCALE, price_decimals
+
+IMBALANCE_RATIO = 3.0
+IMBALANCE_MIN_VOLUME = 0.0
+STACKED_LEVELS = 3
+# Summary fields (and extra history fields) holding them.
+IMBALANCE_FIELDS = ("diagonal_imbalances", "stacked_imbalances")
+
+
+class ImbalanceRules:
+    """Ratio, minimum dominant volume (in contracts) and minimum stacked run length."""
+
+    __slots__ = ("ratio", "min_volume", "min_units", "stack")
+
+    def __init__(self, ratio=IMBALANCE_RATIO, min_volume=IMBALANCE_MIN_VOLUME, stack=STACKED_LEVELS):
+        self.ratio = ratio
+        self.min_volume = min_volume
+        self.min_units = round(min_volume * VOLUME_SCALE)
+        self.stack = stack
+
+    def holds(self, volume, opposite):
+        return opposite > 0 and volume > 0 and volume >= self.min_units and volume >= self.ratio * opposite
+
+
+class _Runs:
+    """Ticks with an imbalance on one side, and their runs of consecutive ticks."""
+
+    __slots__ = ("ticks", "starts", "ends")
+
+    def __init__(self):
+        self.ticks = set()
+        self.starts = {}   # first tick of a run -> last tick
+        self.ends = {}     # last tick of a run -> first tick
+
+    def copy(self):
+        runs = _Runs()
+        runs.ticks = set(self.ticks)
+        runs.starts = dict(self.starts)
+        runs.ends = dict(self.ends)
+        return runs
+
+    def set(self, tick, flag):
+        """Flag or unflag `tick`, joining or splitting the runs around it."""
+        ticks = self.ticks
+        if flag == (tick in ticks):
+            return
+        if flag:
+            ticks.add(tick)
+            start = self.ends.pop(tick - 1) if tick - 1 in ticks else tick
+            end = self.starts.pop(tick + 1) if tick + 1 in ticks else tick
+            self.starts[start] = end
+            self.ends[end] = start
+            return
+        ticks.discard(tick)
+        start = tick
+        while start - 1 in ticks:
+            start -= 1
+        end = tick
+        while end + 1 in ticks:
+            end += 1
+        del self.starts[start]
+        del self.ends[end]
+        if start < tick:
+            self.starts[start] = tick - 1
+            self.ends[tick - 1] = start
+        if tick < end:
+            self.starts[tick + 1] = end
+            self.ends[end] = tick + 1
+
+    def stacked(self, stack):
+        """(first tick, last tick) of every run of at least `stack` ticks, ascending."""
+        return sorted((start, end) for start, end in self.starts.items() if end - start + 1 >= stack)
+
+
+class ImbalanceTracker:
+    """Diagonal imbalances and their runs for one PriceLadder, updated per trade."""
+
+    __slots__ = ("rules", "buy", "sell")
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.buy = _Runs()
+        self.sell = _Runs()
+
+    def copy(self):
+        tracker = ImbalanceTracker(self.rules)
+        tracker.buy = self.buy.copy()
+        tracker.sell = self.sell.copy()
+        return tracker
+
+    @classmethod
+    def from_ladder(cls, ladder, rules):
+        """Tracker of an existing ladder (e.g. a candle restored from a checkpoint)."""
+        tracker = cls(rules)
+        buy_ticks, sell_ticks = find_imbalances(
+            ((tick, buy, sell) for tick, buy, sell, _, _ in ladder.levels()), rules)
+        for tick in buy_ticks:
+            tracker.buy.set(tick, True)
+        for tick in sell_ticks:
+            tracker.sell.set(tick, True)
+        return tracker
+
+    def update(self, ladder, tick, is_seller):
+        """Re-evaluate the two levels whose imbalance a trade at `tick` can change."""
+        # ImbalanceRules.holds inlined: this runs for every trade.
+        ratio, min_units = self.rules.ratio, self.rules.min_units
+        buy, sell = ladder.buy, ladder.sell
+        i = tick - ladder.base_tick
+        if is_seller:
+            # sell[tick] grew: the sell imbalance at tick and the buy imbalance at tick + 1.
+            volume = sell[i]
+            above = buy[i + 1] if i + 1 < len(buy) else 0
+            runs = self.sell
+            flag = above > 0 and volume > 0 and volume >= min_units and volume >= ratio * above
+            if flag != (tick in runs.ticks):
+                runs.set(tick, flag)
+            runs = self.buy
+            flag = volume > 0 and above > 0 and above >= min_units and above >= ratio * volume
+            if flag != (tick + 1 in runs.ticks):
+                runs.set(tick + 1, flag)
+        else:
+            # buy[tick] grew: the buy imbalance at tick and the sell imbalance at tick - 1.
+            volume = buy[i]
+            below = sell[i - 1] if i > 0 else 0
+            runs = self.buy
+            flag = below > 0 and volume > 0 and volume >= min_units and volume >= ratio * below
+            if flag != (tick in runs.ticks):
+                runs.set(tick, flag)
+            runs = self.sell
+            flag = volume > 0 and below > 0 and below >= min_units and below >= ratio * volume
+            if flag != (tick - 1 in runs.ticks):
+                runs.set(tick - 1, flag)
+
+    def fields(self, ladder, tick_size):
+        """The "diagonal_imbalances" and "stacked_imbalances" fields of the tracked ladder."""
+        stack = self.rules.stack
+        return _fields(self.buy.ticks, self.sell.ticks, self.buy.stacked(stack), self.sell.stacked(stack),
+                       _ladder_volumes(ladder), tick_size)
+
+
+def find_imbalances(levels, rules):
+    """
+    (buy imbalance ticks, sell imbalance ticks), ascending, of (tick, buy, sell) levels in
+    ascending tick order, in one pass.
+    """
+    buy_ticks, sell_ticks = [], []
+    previous_tick = previous_sell = None
+    holds = rules.holds
+    for tick, buy, sell in levels:
+        if previous_tick == tick - 1:
+            if holds(buy, previous_sell):
+                buy_ticks.append(tick)
+            if holds(previous_sell, buy):
+                sell_ticks.append(previous_tick)
+        previous_tick, previous_sell = tick, sell
+    return buy_ticks, sell_ticks
+
+
+def ladder_imbalances(ladder, rules, tick_size):
+    """Imbalance fields of a ladder without a tracker (merged roll-up candles), in one pass."""
+    buy_ticks, sell_ticks = find_imbalances(
+        ((tick, buy, sell) for tick, buy, sell, _, _ in ladder.levels()), rules)
+    return _fields(buy_ticks, sell_ticks, _stacked(buy_ticks, rules.stack), _stacked(sell_ticks, rules.stack),
+                   _ladder_volumes(ladder), tick_size)
+
+
+def summary_imbalances(summary, tick_size, rules):
+    """
+    Imbalance fields of a summary: its own when it has them, else evaluated from its
+    price_levels (rows read back from disk, whose volumes are rounded as stored).
+    """
+    if "diagonal_imbalances" in summary:
+        return {name: summary[name] for name in IMBALANCE_FIELDS}
+    levels = {}
+    for price, level in (summary.get("price_levels") or {}).items():
+        # Rows written by older versions use "buy"/"sell" keys.
+        buy = float(level.get("buy_volume", level.get("buy", 0)))
+        sell = float(level.get("sell_volume", level.get("sell", 0)))
+        levels[round(float(price) / tick_size)] = (round(buy * VOLUME_SCALE), round(sell * VOLUME_SCALE))
+    buy_ticks, sell_ticks = find_imbalances(
+        ((tick, buy, sell) for tick, (buy, sell) in sorted(levels.items())), rules)
+    return _fields(buy_ticks, sell_ticks, _stacked(buy_ticks, rules.stack), _stacked(sell_ticks, rules.stack),
+                   lambda tick: levels.get(tick, (0, 0)), tick_size)
+
+
+def add_history_fields(history_cache, engine):
+    """Serve the imbalance fields of engine's candles as extra history fields."""
+    for name in IMBALANCE_FIELDS:
+        def encode(tf, summary, live=False, name=name):
+            return json.dumps(summary_imbalances(summary, engine.tick_size, engine.imbalance_rules)[name])
+        # Live rows carry their own fields, so the snapshot version in the ETag covers them.
+        history_cache.add_field(name, encode, lambda: 0)
+
+
+def _ladder_volumes(ladder):
+    base, buy, sell = ladder.base_tick, ladder.buy, ladder.sell
+    return lambda tick: (buy[tick - base], sell[tick - base])
+
+
+def _stacked(ticks, stack):
+    """(first tick, last tick) of every run of at least `stack` consecutive ticks in an ascending list."""
+    runs = []
+    start = previous = None
+    for tick in ticks:
+        if previous is None or tick != previous + 1:
+            if previous is not None and previous - start + 1 >= stack:
+                runs.append((start, previous))
+            start = tick
+        previous = tick
+    if previous is not None and previous - start + 1 >= stack:
+        runs.append((start, previous))
+    return runs
+
+
+def _fields(buy_ticks, sell_ticks, buy_runs, sell_runs, volumes, tick_size):
+    """
+    Summary fields from the imbalance ticks and stacked runs of both sides. volumes(tick)
+    returns the (buy, sell) volume units of a level.
+    """
+    decimals = price_decimals(tick_size)
+    scale = VOLUME_SCALE
+    diagonal = []
+    for tick in buy_ticks:
+        diagonal.append((tick, "Bullish", volumes(tick)[0], volumes(tick - 1)[1]))
+    for tick in sell_ticks:
+        diagonal.append((tick, "Bearish", volumes(tick + 1)[0], volumes(tick)[1]))
+    diagonal.sort()
+    stacked = [(start, end, kind) for kind, runs in (("Bullish", buy_runs), ("Bearish", sell_runs))
+               for start, end in runs]
+    stacked.sort()
+    return {
+        "diagonal_imbalances": [
+            {"price": round(tick * tick_size, decimals), "type": kind, "buy": buy / scale, "sell": sell / scale}
+            for tick, kind, buy, sell in diagonal
+        ],
+        "stacked_imbalances": [
+            {"type": kind, "low": round(start * tick_size, decimals), "high": round(end * tick_size, decimals),
+             "levels": end - start + 1}
+            for start, end, kind in stacked
+        ],
+    }
@@ -0,0 +1,153 @@
+# ingest.py
+"""
+Trade ingest decoupled from the websocket.
+
+The websocket-client callback (TradeIngest.on_message) only puts the raw frame into a
+bounded queue. A processing thread drains the queue in batches of up to `batch_size`
+frames, decodes them (orjson when it is installed, json otherwise) and hands them to
+FootprintEngine.add_trades, which takes the engine lock once per batch. A stall in
+processing (a reader holding the engine lock, a long finalization, a GC pause) therefore
+no longer delays socket reads until the queue is full. What happens then depends on
+`overflow`:
+  - "block": the callback waits for room, which pushes back on the socket; no trade is lost
+  - "drop":  the frame is dropped and counted in `dropped`
+A batch that fails in the engine is logged and counted in `batch_errors` (its trades
+up to the failing one are applied), and processing goes on with the next batch, so the
+queue keeps draining.
+"""
+import json
+import time
+import queue
+import logging
+import threading
+
+try:
+    import orjson
+except ImportError:  # Optional, only makes decoding faster.
+    orjson = None
+
+from footprint_engine import trade_count
+
+loads = orjson.loads if orjson is not None else json.loads
+
+log = logging.getLogger(__name__)
+
+BINANCE_FUTURES_WS = "wss://fstream.binance.com/ws"
+# Frames waiting for the processing thread (a few seconds of a heavy burst).
+INGEST_QUEUE_SIZE = 100000
+# Frames processed per engine lock acquisition.
+INGEST_BATCH = 500
+OVERFLOW_POLICIES = ("block", "drop")
+
+
+def trade_stream_url(symbol, stream="trade", base=BINANCE_FUTURES_WS):
+    """URL of the @trade or @aggTrade stream of `symbol`."""
+    if stream not in ("trade", "aggTrade"):
+        raise ValueError(f"Unsupported trade stream {stream!r}")
+    return f"{base}/{symbol.lower()}@{stream}"
+
+
+class TradeIngest:
+    """Bounded queue between the websocket and `engine` (see module docstring)."""
+
+    def __init__(self, engine, maxsize=INGEST_QUEUE_SIZE, batch_size=INGEST_BATCH, overflow="block"):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {', '.join(OVERFLOW_POLICIES)}")
+        self.engine = engine
+        self.batch_size = batch_size
+        self.overflow = overflow
+        self.queue = queue.Queue(maxsize)
+        self.thread = None
+        # metrics.Metrics told about every batch (exchange latency, trade rate), if set.
+        self.metrics = None
+        # Counters, written by the websocket thread (received..max_depth) and the
+        # processing thread (the rest).
+        self.received = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.blocked_seconds = 0.0
+        self.max_depth = 0
+        self.processed = 0
+        self.decode_errors = 0
+        self.batch_errors = 0
+        self.batches = 0
+        self.last_batch = 0
+        self.max_batch = 0
+
+    def on_message(self, ws, message):
+        """websocket-client callback: queue the raw frame."""
+        self.received += 1
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            if self.overflow == "drop":
+                self.dropped += 1
+                return
+            self.blocked += 1
+            started = time.perf_counter()
+            self.queue.put(message)
+            self.blocked_seconds += time.perf_counter() - started
+        depth = self.queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def process(self, frames):
+        """Decode raw frames and add their trades to the engine in one batch."""
+        trades = []
+        for frame in frames:
+            try:
+                payload = loads(frame)
+                trade = payload.get("data", payload)
+                trades.append((trade["T"], float(trade["p"]), float(trade["q"]), trade["m"], trade_count(trade)))
+            except (ValueError, KeyError, TypeError, AttributeError):
+                self.decode_errors += 1
+        if trades:
+            self.engine.add_trades(trades)
+            if self.metrics is not None:
+                self.metrics.trades_ingested([trade[0] for trade in trades])
+        self.processed += len(trades)
+
+    def run(self):
+        """Processing loop: wait for a frame, then take whatever else is queued (up to batch_size)."""
+        get, get_nowait = self.queue.get, self.queue.get_nowait
+        while True:
+            frames = [get()]
+            try:
+                while len(frames) < self.batch_size:
+                    frames.append(get_nowait())
+            except queue.Empty:
+                pass
+            try:
+                self.process(frames)
+            except Exception:
+                # Keep consuming: a dead thread would leave the websocket blocked on a full queue.
+                self.batch_errors += 1
+                log.exception("Ingest batch of %d frames failed", len(frames))
+            self.batches += 1
+            self.last_batch = len(frames)
+            if len(frames) > self.max_batch:
+                self.max_batch = len(frames)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stats(self):
+        return {
+            "decoder": "orjson" if orjson is not None else "json",
+            "overflow": self.overflow,
+            "queue_depth": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "max_queue_depth": self.max_depth,
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "decode_errors": self.decode_errors,
+            "batch_errors": self.batch_errors,
+            "blocked": self.blocked,
+            "blocked_seconds": self.blocked_seconds,
+            "batches": self.batches,
+            "last_batch": self.last_batch,
+            "max_batch": self.max_batch,
+            "mean_batch": self.processed / self.batches if self.batches else 0.0,
+        }
@@ -0,0 +1,148 @@
+# ladder.py
+from array import array
+
+# Price increment of the traded instrument (XMRUSDT perpetual: 0.01).
+PRICE_TICK = 0.01
+
+# Volumes are accumulated as integers in units of 1 / VOLUME_SCALE (Binance quantities have
+# at most 8 decimals). Integer sums are exact, so a candle merged from base candles has the
+# very same totals as one accumulated trade by trade, whatever the order of additions.
+VOLUME_SCALE = 10 ** 8
+
+
+def price_decimals(tick_size):
+    """Number of decimals needed to print prices on a grid of tick_size."""
+    text = f"{tick_size:.10f}".rstrip("0")
+    return len(text.split(".")[1]) if "." in text else 0
+
+
+def _zeros(typecode, n):
+    return array(typecode, bytes(array(typecode).itemsize * n))
+
+
+class PriceLadder:
+    """
+    Per-level buy/sell volume and trade counts of one candle, keyed by integer tick.
+
+    Levels live in four parallel typed arrays indexed by `tick - base_tick`, so the
+    ladder is a few contiguous buffers instead of one dict per price. Prices are
+    snapped to the tick grid, which also stops 215.0 and 215.00000001 from ending up
+    as two levels. The arrays grow in both directions with headroom, so extending the
+    range is amortized O(1) per new level.
+    """
+
+    __slots__ = ("base_tick", "buy", "sell", "buy_trades", "sell_trades")
+
+    def __init__(self, base_tick=0):
+        self.base_tick = base_tick
+        self.buy = array("q")
+        self.sell = array("q")
+        self.buy_trades = array("l")
+        self.sell_trades = array("l")
+
+    def __len__(self):
+        return len(self.buy)
+
+    def copy(self):
+        ladder = PriceLadder(self.base_tick)
+        ladder.buy = self.buy[:]
+        ladder.sell = self.sell[:]
+        ladder.buy_trades = self.buy_trades[:]
+        ladder.sell_trades = self.sell_trades[:]
+        return ladder
+
+    def to_state(self):
+        """Plain-data form of the ladder (for checkpoints)."""
+        return {"base_tick": self.base_tick, "buy": self.buy.tolist(), "sell": self.sell.tolist(),
+                "buy_trades": self.buy_trades.tolist(), "sell_trades": self.sell_trades.tolist()}
+
+    @classmethod
+    def from_state(cls, state):
+        ladder = cls(state["base_tick"])
+        ladder.buy = array("q", state["buy"])
+        ladder.sell = array("q", state["sell"])
+        ladder.buy_trades = array("l", state["buy_trades"])
+        ladder.sell_trades = array("l", state["sell_trades"])
+        return ladder
+
+    def index(self, tick):
+        """Array index of `tick`, growing the arrays when the tick is outside the range."""
+        i = tick - self.base_tick
+        n = len(self.buy)
+        if 0 <= i < n:
+            return i
+        if n == 0:
+            self._grow_right(1)
+            self.base_tick = tick
+            return 0
+        if i >= n:
+            self._grow_right(max(i + 1 - n, n // 2, 8))
+            return i
+        extra = max(-i, n // 2, 8)
+        self._grow_left(extra)
+        self.base_tick -= extra
+        return i + extra
+
+    def _grow_right(self, n):
+        self.buy.extend(_zeros("q", n))
+        self.sell.extend(_zeros("q", n))
+        self.buy_trades.extend(_zeros("l", n))
+        self.sell_trades.extend(_zeros("l", n))
+
+    def _grow_left(self, n):
+        self.buy = _zeros("q", n) + self.buy
+        self.sell = _zeros("q", n) + self.sell
+        self.buy_trades = _zeros("l", n) + self.buy_trades
+        self.sell_trades = _zeros("l", n) + self.sell_trades
+
+    def add(self, tick, volume, is_seller, trades=1):
+        """Record one trade (or `trades` aggregated ones) of `volume` units at `tick`."""
+        i = self.index(tick)
+        if is_seller:
+            self.sell[i] += volume
+            self.sell_trades[i] += trades
+        else:
+            self.buy[i] += volume
+            self.buy_trades[i] += trades
+        return i
+
+    def merge(self, other):
+        """Add every level of `other` into this ladder."""
+        if not len(other):
+            return
+        lo = other.first_traded()
+        if lo is None:
+            return
+        hi = other.last_traded()
+        self.index(other.base_tick + lo)
+        self.index(other.base_tick + hi)
+        offset = other.base_tick - self.base_tick
+        buy, sell, buy_trades, sell_trades = self.buy, self.sell, self.buy_trades, self.sell_trades
+        for i in range(lo, hi + 1):
+            j = i + offset
+            buy[j] += other.buy[i]
+            sell[j] += other.sell[i]
+            buy_trades[j] += other.buy_trades[i]
+            sell_trades[j] += other.sell_trades[i]
+
+    def first_traded(self):
+        for i in range(len(self.buy)):
+            if self.buy_trades[i] or self.sell_trades[i]:
+                return i
+        return None
+
+    def last_traded(self):
+        for i in range(len(self.buy) - 1, -1, -1):
+            if self.buy_trades[i] or self.sell_trades[i]:
+                return i
+        return None
+
+    def levels(self):
+        """Yield (tick, buy, sell, buy_trades, sell_trades) for every traded level, ascending."""
+        base = self.base_tick
+        buy, sell, buy_trades, sell_trades = self.buy, self.sell, self.buy_trades, self.sell_trades
+        for i in range(len(buy)):
+            bt = buy_trades[i]
+            st = sell_trades[i]
+            if bt or st:
+                yield base + i, buy[i], sell[i], bt, st
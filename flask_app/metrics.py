@@ -0,0 +1,221 @@
+# metrics.py
+"""
+Low-overhead instrumentation of the service, exposed in the Prometheus text format.
+
+Metrics holds histograms and counters updated on the hot paths, and gauges that are
+only evaluated when /metrics is scraped. Instrumentation is attached from outside:
+instrument() replaces a method of an object by a timed wrapper, and TradeIngest reports
+its batches through trades_ingested(). A Metrics created with enabled=False attaches
+nothing, so a disabled service runs exactly the code it ran without metrics.
+"""
+import gc
+import os
+import sys
+import time
+import bisect
+import threading
+from collections import deque
+
+# Histogram bucket upper bounds, in seconds.
+STAGE_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+                 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Seconds over which the trades/sec gauge is averaged.
+RATE_WINDOW = 10
+
+
+class Histogram:
+    """Cumulative-bucket histogram (counts per upper bound, sum and count)."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def observe_all(self, values):
+        with self._lock:
+            counts, bounds = self.counts, self.bounds
+            for value in values:
+                counts[bisect.bisect_left(bounds, value)] += 1
+                self.sum += value
+            self.count += len(values)
+
+
+class RateMeter:
+    """Events per second over the last `window` whole seconds."""
+
+    def __init__(self, window=RATE_WINDOW):
+        self.window = window
+        self._seconds = deque()   # [second, events], oldest first
+        self._lock = threading.Lock()
+
+    def mark(self, events):
+        second = int(time.monotonic())
+        with self._lock:
+            seconds = self._seconds
+            if seconds and seconds[-1][0] == second:
+                seconds[-1][1] += events
+            else:
+                seconds.append([second, events])
+                while seconds[0][0] < second - self.window:
+                    seconds.popleft()
+
+    def rate(self):
+        now = int(time.monotonic())
+        with self._lock:
+            events = sum(n for second, n in self._seconds if now - self.window <= second < now)
+        return events / self.window
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in items) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def rss_bytes():
+    """Resident set size of this process (current on Linux, peak elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Metrics:
+    """Registry of the service's metrics; see the module docstring."""
+
+    def __init__(self, enabled=True, prefix="footprint"):
+        self.enabled = enabled
+        self.prefix = prefix
+        self.trade_rate = RateMeter()
+        self.trades = 0
+        # name -> [type, help, {labels: Histogram or value}] and name -> (type, help, fn)
+        self._families = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    # --- Recording ---
+    def histogram(self, name, help_text, bounds=STAGE_BUCKETS, **labels):
+        """The histogram of `name` with `labels`, created on first use."""
+        family = self._family(name, "histogram", help_text)
+        key = _labels(labels)
+        histogram = family[2].get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = family[2].setdefault(key, Histogram(bounds))
+        return histogram
+
+    def _family(self, name, kind, help_text):
+        family = self._families.get(name)
+        if family is None:
+            with self._lock:
+                family = self._families.setdefault(name, [kind, help_text, {}])
+        return family
+
+    def timed(self, stage, fn):
+        """fn wrapped to record its duration in the stage histogram (fn itself when disabled)."""
+        if not self.enabled:
+            return fn
+        histogram = self.histogram("stage_seconds", "Duration of processing stages.", stage=stage)
+        perf_counter = time.perf_counter
+
+        def timed_fn(*args, **kwargs):
+            started = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram.observe(perf_counter() - started)
+
+        timed_fn.__wrapped__ = fn
+        return timed_fn
+
+    def instrument(self, obj, method, stage):
+        """Time every call of obj.<method> as `stage` (nothing when disabled)."""
+        if self.enabled:
+            setattr(obj, method, self.timed(stage, getattr(obj, method)))
+
+    def trades_ingested(self, times_ms):
+        """A batch of trades was added to the engine; times_ms are their exchange times."""
+        now_ms = time.time() * 1000
+        self.histogram("exchange_latency_seconds",
+                       "Delay between a trade's exchange time (T) and its ingestion.",
+                       LATENCY_BUCKETS).observe_all([(now_ms - t) / 1000 for t in times_ms])
+        self.trades += len(times_ms)
+        self.trade_rate.mark(len(times_ms))
+
+    def gauge(self, name, help_text, fn, kind="gauge"):
+        """
+        Register a value computed at scrape time: fn() returns a number, or a dict of
+        {label dict as tuple of (key, value) pairs: number}. kind is "gauge" or "counter".
+        """
+        self._gauges[name] = (kind, help_text, fn)
+
+    # --- Exposition ---
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        prefix = self.prefix
+        for name, (kind, help_text, fn) in sorted(self._gauges.items()):
+            full = f"{prefix}_{name}"
+            lines.append(f"# HELP {full} {help_text}")
+            lines.append(f"# TYPE {full} {kind}")
+            values = fn()
+            if not isinstance(values, dict):
+                values = {(): values}
+            for labels, value in values.items():
+                lines.append(f"{full}{_format_labels(labels)} {_format_value(value)}")
+        with self._lock:
+            families = [(name, family[0], family[1], list(family[2].items()))
+                        for name, family in sorted(self._families.items())]
+        for name, kind, help_text, members in families:
+            full = f"{prefix}_{name}"
+            lines.append(f"# HELP {full} {help_text}")
+            lines.append(f"# TYPE {full} {kind}")
+            for labels, histogram in sorted(members):
+                with histogram._lock:
+                    counts, total, count = list(histogram.counts), histogram.sum, histogram.count
+                cumulative = 0
+                for bound, n in zip(histogram.bounds + (float("inf"),), counts):
+                    cumulative += n
+                    le = (("le", _format_value(float(bound))),)
+                    lines.append(f"{full}_bucket{_format_labels(labels, le)} {cumulative}")
+                lines.append(f"{full}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{full}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def register_process_gauges(self):
+        """RSS, allocated memory blocks, tracked objects per GC generation and GC runs."""
+        self.gauge("process_resident_memory_bytes", "Resident set size of the process.", rss_bytes)
+        self.gauge("process_allocated_blocks", "Memory blocks currently allocated by the interpreter.",
+                   sys.getallocatedblocks)
+        self.gauge("process_gc_objects", "Objects tracked per GC generation since its last collection.",
+                   lambda: {(("generation", str(i)),): n for i, n in enumerate(gc.get_count())})
+        self.gauge("process_gc_collections_total", "Garbage collections per generation.",
+                   lambda: {(("generation", str(i)),): stats["collections"]
+                            for i, stats in enumerate(gc.get_stats())}, kind="counter")
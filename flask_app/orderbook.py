@@ -0,0 +1,505 @@
+import websockets
+import json
+import requests
+import asyncio
+import bisect
+import argparse
+import threading
+from collections import defaultdict
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+import time
+
+if TYPE_CHECKING:
+    from depth_history import DepthHistory
+
+PRICE_TICK = 0.01        # XMRUSDT futures tick size
+QUANTITY_SCALE = 10**8   # quantities are kept as integer units so depth sums stay exact
+
+BINANCE_WS_URL = "wss://fstream.binance.com/stream?streams={stream}@depth"
+BINANCE_SNAPSHOT_URL = "https://fapi.binance.com/fapi/v1/depth?symbol={symbol}&limit=1000"
+MAX_BUFFERED_EVENTS = 10000   # depth events kept while a snapshot is being fetched
+SNAPSHOT_TIMEOUT = 10.0
+RESYNC_RETRY_DELAY = 0.25     # pause before fetching another snapshot after a failed replay
+
+
+class BookSide:
+    """
+    One side of the book as sorted price levels.
+
+    Levels are stored by integer price tick: a dict tick -> quantity (in QUANTITY_SCALE
+    units), a sorted list of the occupied ticks, and a Fenwick tree over a tick-indexed
+    array holding the quantity at every tick of the covered range. An update costs one
+    dict write, one bisect (plus a list insert/delete when a level appears or vanishes)
+    and one O(log n) tree update; the best level is O(1), the top N levels O(N) and the
+    quantity between two prices O(log n).
+    """
+
+    def __init__(self, is_bid: bool, tick_size: float = PRICE_TICK):
+        self.is_bid = is_bid
+        self.tick_size = tick_size
+        self.levels: Dict[int, int] = {}
+        self.ticks: List[int] = []      # ascending
+        self._base = 0                  # tick of tree index 0
+        self._tree: List[int] = [0]     # 1-based Fenwick tree, len = size + 1
+
+    def __len__(self):
+        return len(self.ticks)
+
+    def to_tick(self, price: float) -> int:
+        return round(price / self.tick_size)
+
+    def to_price(self, tick: int) -> float:
+        return round(tick * self.tick_size, 10)
+
+    def clear(self):
+        self.levels = {}
+        self.ticks = []
+        self._base = 0
+        self._tree = [0]
+
+    # --- Fenwick tree over ticks [_base, _base + size) ---
+    def _add(self, tick: int, delta: int):
+        i = tick - self._base + 1
+        size = len(self._tree) - 1
+        if i < 1 or i > size:
+            self._rebuild(tick)
+            i = tick - self._base + 1
+            size = len(self._tree) - 1
+        tree = self._tree
+        while i <= size:
+            tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, tick: int) -> int:
+        """Total quantity at ticks < tick."""
+        i = min(max(tick - self._base, 0), len(self._tree) - 1)
+        tree = self._tree
+        total = 0
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def _rebuild(self, tick: int):
+        """Grow the covered range (to at least twice its size) so that it includes tick."""
+        ticks = self.ticks
+        lo = min(tick, ticks[0]) if ticks else tick
+        hi = max(tick, ticks[-1]) if ticks else tick
+        size = max(2 * (len(self._tree) - 1), 2 * (hi - lo + 1), 64)
+        self._base = lo - (size - (hi - lo + 1)) // 2
+        tree = [0] * (size + 1)
+        for t in ticks:
+            tree[t - self._base + 1] += self.levels[t]
+        for i in range(1, size + 1):       # O(size) Fenwick construction
+            j = i + (i & -i)
+            if j <= size:
+                tree[j] += tree[i]
+        self._tree = tree
+
+    # --- updates ---
+    def set(self, price: float, quantity: float):
+        """Set the quantity at a price level; 0 removes the level."""
+        tick = self.to_tick(price)
+        units = round(quantity * QUANTITY_SCALE)
+        old = self.levels.get(tick)
+        if units == 0:
+            if old is None:
+                return
+            self._add(tick, -old)
+            del self.levels[tick]
+            del self.ticks[bisect.bisect_left(self.ticks, tick)]
+            return
+        # The tree is updated before the level: when the tick is outside its range,
+        # _add rebuilds it from self.levels, which must not hold the new units yet.
+        if units != (old or 0):
+            self._add(tick, units - (old or 0))
+        if old is None:
+            bisect.insort(self.ticks, tick)
+        self.levels[tick] = units
+
+    def load(self, levels: List[List[str]]):
+        """Replace the side with snapshot levels [[price, quantity], ...]."""
+        self.clear()
+        for price, quantity in levels:
+            units = round(float(quantity) * QUANTITY_SCALE)
+            if units:
+                self.levels[self.to_tick(float(price))] = units
+        self.ticks = sorted(self.levels)
+        if self.ticks:
+            self._rebuild(self.ticks[0])
+
+    # --- queries ---
+    def best(self) -> Optional[Tuple[float, float]]:
+        """(price, quantity) of the best level, or None."""
+        if not self.ticks:
+            return None
+        tick = self.ticks[-1] if self.is_bid else self.ticks[0]
+        return self.to_price(tick), self.levels[tick] / QUANTITY_SCALE
+
+    def top(self, n: Optional[int] = None) -> List[Tuple[float, float]]:
+        """The best n levels (all if n is None), best first, as (price, quantity)."""
+        ticks = self.ticks
+        if self.is_bid:
+            selected = ticks[::-1] if n is None else ticks[:-n - 1:-1] if n > 0 else []
+        else:
+            selected = ticks if n is None else ticks[:max(n, 0)]
+        levels = self.levels
+        return [(self.to_price(t), levels[t] / QUANTITY_SCALE) for t in selected]
+
+    def depth_between(self, low: float, high: float) -> float:
+        """Total quantity resting at prices in [low, high]."""
+        lo = self.to_tick(low)
+        hi = self.to_tick(high)
+        if hi < lo:
+            return 0.0
+        return (self._prefix(hi + 1) - self._prefix(lo)) / QUANTITY_SCALE
+
+    def band(self, low_tick: int, high_tick: int) -> Tuple[List[int], List[float]]:
+        """(ticks, quantities) of the levels at ticks in [low_tick, high_tick), ascending."""
+        ticks = self.ticks[bisect.bisect_left(self.ticks, low_tick):bisect.bisect_left(self.ticks, high_tick)]
+        levels = self.levels
+        return ticks, [levels[t] / QUANTITY_SCALE for t in ticks]
+
+    def items(self):
+        """(price, quantity) of every level, best first."""
+        return self.top()
+
+
+class OrderBookManager:
+    """
+    Local copy of a Binance futures order book, kept in sync with the @depth stream.
+
+    Sync follows Binance's rules: depth events are buffered while a REST snapshot is
+    fetched (in a worker thread, so the event loop keeps reading the stream), then the
+    buffer is replayed on top of the snapshot: events with u < lastUpdateId are dropped,
+    the first applied event must have U <= lastUpdateId <= u, and every later event must
+    have pu equal to the previous event's u. A gap starts a new resync, again buffering.
+    """
+
+    def __init__(self, symbol: str, tick_size: float = PRICE_TICK, ws_url: Optional[str] = None,
+                 snapshot_url: Optional[str] = None, max_buffered: int = MAX_BUFFERED_EVENTS,
+                 history: Optional["DepthHistory"] = None):
+        self.symbol = symbol
+        self.bids = BookSide(is_bid=True, tick_size=tick_size)
+        self.asks = BookSide(is_bid=False, tick_size=tick_size)
+        self.last_update_id: Optional[int] = None
+        self.previous_final_update_id: Optional[int] = None
+        self.ws_url = ws_url or BINANCE_WS_URL.format(stream=symbol.lower())
+        self.snapshot_url = snapshot_url or BINANCE_SNAPSHOT_URL.format(symbol=symbol)
+        self.max_buffered = max_buffered
+        self.events_applied = 0
+        self.last_event_time: Optional[int] = None   # "E" of the last applied event, ms
+        self.history = history
+        # Optional object whose book_changed(is_bid, tick, old_units, new_units, time_ms) is
+        # called before every level change (except those of the first snapshot, which sets
+        # the starting state). Changes and listener calls happen under `lock`,
+        # so other threads can read the book consistently while holding it.
+        self.listener = None
+        self.lock = threading.Lock()
+
+        # Sync state: events are buffered until a snapshot has been applied.
+        self.synced = False
+        self.buffer: List[dict] = []
+        self._resync_task: Optional[asyncio.Task] = None
+        self._resync_started: Optional[float] = None
+        self.on_synced = None     # optional callback, called after every (re)sync
+
+        # Counters
+        self.resyncs = 0
+        self.resync_seconds = 0.0
+        self.last_resync_seconds = 0.0
+        self.max_resync_seconds = 0.0
+        self.snapshot_failures = 0
+        self.events_buffered = 0
+        self.events_dropped = 0        # older than the snapshot
+        self.buffer_overflows = 0
+
+    async def initialize(self, display_interval: float = 1.0, display_levels: Optional[int] = 10):
+        """
+        Process the depth stream (the first events trigger the snapshot) while a separate
+        task prints the book every display_interval seconds (0 disables the display).
+        """
+        if display_interval:
+            asyncio.create_task(self.display_loop(display_interval, display_levels))
+        if self.history is not None:
+            asyncio.create_task(self.sample_loop())
+        await self.process_stream()
+
+    async def get_snapshot(self) -> dict:
+        """Fetch a REST snapshot without blocking the event loop."""
+        response = await asyncio.to_thread(requests.get, self.snapshot_url, timeout=SNAPSHOT_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    def load_snapshot(self, snapshot: dict):
+        with self.lock:
+            # The first snapshot is the book's starting state, not a change to it: only a
+            # resync reports the levels it changed.
+            resync = self.listener is not None and self.last_update_id is not None
+            old = (dict(self.bids.levels), dict(self.asks.levels)) if resync else None
+            self.last_update_id = snapshot['lastUpdateId']
+            self.previous_final_update_id = None
+            self.bids.load(snapshot['bids'])
+            self.asks.load(snapshot['asks'])
+            if old is not None:
+                # Report every level the snapshot changed, as if it were one big diff.
+                time_ms = snapshot.get('T') or snapshot.get('E') or int(time.time() * 1000)
+                for is_bid, side, levels in ((True, self.bids, old[0]), (False, self.asks, old[1])):
+                    for tick in set(levels) | set(side.levels):
+                        before, after = levels.get(tick, 0), side.levels.get(tick, 0)
+                        if before != after:
+                            self.listener.book_changed(is_bid, tick, before, after, time_ms)
+
+    def update_order_book(self, bids: List[List[str]], asks: List[List[str]], time_ms: Optional[int] = None):
+        """Update the order book with new bids and asks (quantity 0 removes a level)."""
+        listener = self.listener
+        with self.lock:
+            for is_bid, side, levels in ((True, self.bids, bids), (False, self.asks, asks)):
+                for price, quantity in levels:
+                    price, quantity = float(price), float(quantity)
+                    if listener is not None:
+                        tick = side.to_tick(price)
+                        listener.book_changed(is_bid, tick, side.levels.get(tick, 0),
+                                              round(quantity * QUANTITY_SCALE), time_ms)
+                    side.set(price, quantity)
+
+    # --- Sync ---
+    def apply_event(self, event: dict) -> bool:
+        """Apply one depth event on top of the snapshot. False means a gap: resync."""
+        if self.previous_final_update_id is None:
+            # First event after the snapshot
+            if event['u'] < self.last_update_id:
+                self.events_dropped += 1
+                return True
+            if event['U'] > self.last_update_id:
+                return False
+        elif event['pu'] != self.previous_final_update_id:
+            return False
+        self.update_order_book(event['b'], event['a'], event.get('T') or event.get('E'))
+        self.previous_final_update_id = event['u']
+        self.last_event_time = event.get('E')
+        self.events_applied += 1
+        return True
+
+    def handle_event(self, event: dict):
+        """Apply a stream event, or buffer it while the book is (re)syncing."""
+        if self.synced:
+            if self.apply_event(event):
+                return
+            print(f"Out of sync (pu={event['pu']}, expected {self.previous_final_update_id}), resyncing...")
+            self.synced = False
+        self.buffer.append(event)
+        self.events_buffered += 1
+        if len(self.buffer) > self.max_buffered:
+            # Replaying without the oldest events will find a gap and fetch a new snapshot.
+            del self.buffer[0]
+            self.buffer_overflows += 1
+        self.start_resync()
+
+    def start_resync(self):
+        if self._resync_task is None or self._resync_task.done():
+            if self._resync_started is None:
+                self._resync_started = time.monotonic()
+            self._resync_task = asyncio.create_task(self.resync())
+
+    async def resync(self):
+        """Fetch snapshots until the buffered events can be replayed on top of one."""
+        while not self.synced:
+            try:
+                snapshot = await self.get_snapshot()
+            except (requests.RequestException, ValueError, KeyError) as e:
+                self.snapshot_failures += 1
+                print(f"Snapshot failed ({e}), retrying...")
+                await asyncio.sleep(1)
+                continue
+            # From here until the end of the loop body nothing awaits, so no event can
+            # arrive between applying the snapshot and replaying the buffer.
+            self.load_snapshot(snapshot)
+            buffered, self.buffer = self.buffer, []
+            for i, event in enumerate(buffered):
+                if not self.apply_event(event):
+                    # The snapshot is older than the buffer, or the buffer has a hole:
+                    # keep the rest and try again with a newer snapshot.
+                    self.buffer = buffered[i:]
+                    break
+            else:
+                self.synced = True
+            if not self.synced:
+                await asyncio.sleep(RESYNC_RETRY_DELAY)
+        duration = time.monotonic() - self._resync_started
+        self._resync_started = None
+        self.resyncs += 1
+        self.resync_seconds += duration
+        self.last_resync_seconds = duration
+        self.max_resync_seconds = max(self.max_resync_seconds, duration)
+        print(f"Order book synced at update {self.previous_final_update_id or self.last_update_id} "
+              f"in {duration:.3f}s")
+        if self.on_synced is not None:
+            self.on_synced(self)
+
+    def reset(self):
+        """Forget the sync state (e.g. after a reconnect); the next event resyncs."""
+        if self._resync_task is not None:
+            self._resync_task.cancel()
+            self._resync_task = None
+        self._resync_started = None
+        self.synced = False
+        self.buffer = []
+        self.previous_final_update_id = None
+
+    def stats(self) -> dict:
+        return {
+            "synced": self.synced,
+            "last_update_id": self.previous_final_update_id or self.last_update_id,
+            "events_applied": self.events_applied,
+            "events_buffered": self.events_buffered,
+            "events_dropped": self.events_dropped,
+            "buffer_overflows": self.buffer_overflows,
+            "buffered": len(self.buffer),
+            "resyncs": self.resyncs,
+            "resync_seconds": self.resync_seconds,
+            "last_resync_seconds": self.last_resync_seconds,
+            "max_resync_seconds": self.max_resync_seconds,
+            "snapshot_failures": self.snapshot_failures,
+        }
+
+    # --- Queries ---
+    def best_bid(self) -> Optional[Tuple[float, float]]:
+        return self.bids.best()
+
+    def best_ask(self) -> Optional[Tuple[float, float]]:
+        return self.asks.best()
+
+    def mid_price(self) -> Optional[float]:
+        bid, ask = self.bids.best(), self.asks.best()
+        if bid is None or ask is None:
+            return None
+        return (bid[0] + ask[0]) / 2
+
+    def spread(self) -> Optional[float]:
+        bid, ask = self.bids.best(), self.asks.best()
+        if bid is None or ask is None:
+            return None
+        return round(ask[0] - bid[0], 10)
+
+    def top_levels(self, n: int) -> Tuple[List[Tuple[float, float]], List[Tuple[float, float]]]:
+        """(bids, asks): the best n levels of each side, best first."""
+        return self.bids.top(n), self.asks.top(n)
+
+    def depth_within(self, percent: float) -> Tuple[float, float]:
+        """(bid quantity, ask quantity) resting within `percent` % of the mid price."""
+        mid = self.mid_price()
+        if mid is None:
+            return 0.0, 0.0
+        band = mid * percent / 100
+        return self.bids.depth_between(mid - band, mid), self.asks.depth_between(mid, mid + band)
+
+    # --- Display ---
+    def print_order_book(self, levels: Optional[int] = None):
+        """Print the book (the best `levels` of each side, or all of it)."""
+        print("\n" + "="*50)
+        print(f"Order Book for {self.symbol}")
+        print("="*50)
+
+        asks = self.asks.top(levels)
+        print(f"\nAsks ({len(self.asks)} levels):")
+        for price, qty in asks[::-1]:  # Print in descending order
+            print(f"Price: {price:.2f}\tQuantity: {qty:.6f}")
+
+        bids = self.bids.top(levels)
+        print(f"\nBids ({len(self.bids)} levels):")
+        for price, qty in bids:
+            print(f"Price: {price:.2f}\tQuantity: {qty:.6f}")
+
+        spread = self.spread()
+        print("\nSpread:", f"{spread:.2f}" if spread is not None else "N/A")
+        bid_depth, ask_depth = self.depth_within(1.0)
+        print(f"Depth within 1%: bids {bid_depth:.3f} / asks {ask_depth:.3f}")
+        print(f"Total Levels: {len(self.asks) + len(self.bids)}")
+        print("="*50)
+
+    async def display_loop(self, interval: float = 1.0, levels: Optional[int] = 10):
+        """Print the book every `interval` seconds, independently of the update stream."""
+        last_count = self.events_applied
+        last_time = time.monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            self.print_order_book(levels)
+            now = time.monotonic()
+            rate = (self.events_applied - last_count) / (now - last_time)
+            last_count, last_time = self.events_applied, now
+            print(f"Applied {rate:.1f} depth events/s ({self.events_applied} total), "
+                  f"{self.resyncs} resyncs (last {self.last_resync_seconds:.3f}s)")
+
+    async def sample_loop(self):
+        """Sample the synced book into self.history every history.interval seconds."""
+        while True:
+            await asyncio.sleep(self.history.interval)
+            if self.synced:
+                # Exchange time of the book state when known, so samples line up with trades.
+                now = int(time.time() * 1000)
+                self.history.sample(self, self.last_event_time or now)
+
+    async def process_stream(self):
+        """Read the websocket stream; events are applied or buffered by handle_event."""
+        while True:
+            try:
+                async with websockets.connect(
+                    self.ws_url,
+                    ping_interval=20,  # Send ping every 20 seconds
+                    ping_timeout=10,   # Wait 10 seconds for pong response
+                    close_timeout=10   # Wait 10 seconds for close response
+                ) as websocket:
+                    print("Connected to websocket stream")
+                    while True:
+                        msg = await websocket.recv()
+                        data = json.loads(msg)
+                        self.handle_event(data.get('data', data))
+
+            except websockets.exceptions.ConnectionClosed as e:
+                print(f"Connection closed ({e}). Reconnecting...")
+                self.reset()
+                await asyncio.sleep(1)
+            except Exception as e:
+                print(f"Error: {e}")
+                print("Reconnecting...")
+                self.reset()
+                await asyncio.sleep(1)
+            # Add a small delay before reconnecting
+            await asyncio.sleep(0.1)
+
+async def main():
+    # Depth history needs NumPy; the book alone (and depth.py) does not.
+    from depth_history import DEFAULT_BAND, DEFAULT_CAPACITY, DEFAULT_INTERVAL, DepthHistory
+
+    parser = argparse.ArgumentParser(description="Maintain a local Binance futures order book.")
+    parser.add_argument("symbol", nargs="?", default="XMRUSDT")
+    parser.add_argument("--tick-size", type=float, default=PRICE_TICK)
+    parser.add_argument("--display-interval", type=float, default=1.0,
+                        help="seconds between two prints of the book (0 = never)")
+    parser.add_argument("--levels", type=int, default=10, help="levels printed per side")
+    parser.add_argument("--ws-url", help="depth stream URL (default: Binance futures)")
+    parser.add_argument("--snapshot-url", help="REST snapshot URL (default: Binance futures)")
+    parser.add_argument("--history-dir", help="record depth history, spilling old samples to this directory")
+    parser.add_argument("--history-interval", type=float, default=DEFAULT_INTERVAL)
+    parser.add_argument("--history-band", type=int, default=DEFAULT_BAND, help="ticks on each side of mid")
+    parser.add_argument("--history-capacity", type=int, default=DEFAULT_CAPACITY, help="samples kept in memory")
+    args = parser.parse_args()
+
+    history = None
+    if args.history_dir:
+        history = DepthHistory(args.history_dir, args.tick_size, args.history_interval,
+                               args.history_band, args.history_capacity)
+    manager = OrderBookManager(args.symbol.upper(), args.tick_size, args.ws_url, args.snapshot_url,
+                               history=history)
+    try:
+        await manager.initialize(args.display_interval, args.levels)
+    finally:
+        if history is not None:
+            history.close()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\nShutting down...")
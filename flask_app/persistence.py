@@ -0,0 +1,308 @@
+# persistence.py
+import io
+import os
+import csv
+import json
+import math
+import time
+import threading
+
+# CSV headers for each timeframe file.
+CSV_FIELDS = [
+    "bucket", "total_volume", "buy_volume", "sell_volume",
+    "buy_contracts", "sell_contracts",
+    "open", "high", "low", "close",
+    "delta", "max_delta", "min_delta", "CVD", "buy_sell_ratio",
+    "pocs", "price_levels", "imbalances"
+]
+# Fields holding integers and nested JSON values; the other fields are decimals.
+INTEGER_FIELDS = {"bucket", "buy_contracts", "sell_contracts"}
+JSON_FIELDS = {"pocs", "price_levels", "imbalances"}
+
+# Seconds between two fsync calls on a footprint file. Writes in between are
+# flushed to the OS but only made durable on the next batched fsync.
+FSYNC_INTERVAL = 5.0
+
+
+def _json_field(summary, key, default):
+    """Return the JSON text of a nested summary field (pocs, price_levels, imbalances)."""
+    value = summary.get(key, default)
+    if isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+def summary_to_row(summary):
+    """Convert a candle summary (finalized or in-progress) into a CSV row list."""
+    return [
+        summary.get("bucket", ""),
+        summary.get("total_volume", ""),
+        summary.get("buy_volume", ""),
+        summary.get("sell_volume", ""),
+        summary.get("buy_contracts", ""),
+        summary.get("sell_contracts", ""),
+        summary.get("open", ""),
+        summary.get("high", ""),
+        summary.get("low", ""),
+        summary.get("close", ""),
+        summary.get("delta", ""),
+        summary.get("max_delta", ""),
+        summary.get("min_delta", ""),
+        summary.get("CVD", ""),
+        summary.get("buy_sell_ratio", ""),
+        _json_field(summary, "pocs", []),
+        _json_field(summary, "price_levels", {}),
+        _json_field(summary, "imbalances", [])
+    ]
+
+
+def summary_to_record(summary):
+    """
+    Convert a candle summary into the dict a csv.DictReader would return for its row,
+    i.e. every field as a string, with nested fields as JSON text.
+    """
+    return {
+        field: "" if value is None else str(value)
+        for field, value in zip(CSV_FIELDS, summary_to_row(summary))
+    }
+
+
+def summary_to_values(summary, fields=CSV_FIELDS):
+    """
+    Values of `fields` of a candle summary with their own types: counts and bucket as int,
+    other numbers as float, nested fields decoded. Missing values, and values that JSON
+    cannot hold (the infinite buy_sell_ratio of a candle without sells), become None.
+    Summaries read back from CSV carry strings, which are converted the same way.
+    """
+    values = []
+    for field in fields:
+        value = summary.get(field)
+        if value is None or value == "":
+            value = None
+        elif field in JSON_FIELDS:
+            if isinstance(value, str):
+                value = json.loads(value)
+            elif isinstance(value, dict):
+                # Price keys as in the JSON text (and in rows read back from CSV).
+                value = {str(key): item for key, item in value.items()}
+        elif field in INTEGER_FIELDS:
+            value = int(value)
+        else:
+            value = float(value)
+            if not math.isfinite(value):
+                value = None
+        values.append(value)
+    return values
+
+
+def load_candle_file(filename):
+    """
+    Read a footprint CSV file into a bucket-sorted list of summaries (csv.DictReader rows
+    with pocs, price_levels and imbalances decoded from JSON). Missing or empty files
+    give an empty list.
+    """
+    return load_candle_tail(filename)[0]
+
+
+def load_candle_tail(filename, after_bucket=None):
+    """
+    Like load_candle_file, but rows with bucket <= after_bucket are only counted, not
+    decoded or kept. Returns (rows, number of skipped rows).
+    """
+    rows = []
+    skipped = 0
+    if not os.path.exists(filename) or os.path.getsize(filename) == 0:
+        return rows, skipped
+    with open(filename, "r") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            if after_bucket is not None and int(row["bucket"]) <= after_bucket:
+                skipped += 1
+                continue
+            rows.append(_decode_row(row))
+    # Keep the data bucket-sorted so that range queries can use bisect.
+    rows.sort(key=lambda r: int(r["bucket"]))
+    return rows, skipped
+
+
+def _decode_row(row):
+    # Convert JSON string fields back to their native Python types.
+    for key in ["pocs", "price_levels", "imbalances"]:
+        if key in row and row[key]:
+            try:
+                row[key] = json.loads(row[key])
+            except Exception:
+                # If conversion fails, leave the value as is.
+                pass
+    return row
+
+
+def read_header(filename):
+    """Column names of a footprint CSV file and the byte offset where its rows start."""
+    with open(filename, "rb") as f:
+        line = f.readline()
+    return next(csv.reader([line.decode("utf-8")])), len(line)
+
+
+def read_rows_between(filename, start, end, fieldnames=CSV_FIELDS):
+    """Decode the footprint rows stored between byte offsets start and end of filename."""
+    with open(filename, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start).decode("utf-8")
+    return [_decode_row(row) for row in csv.DictReader(io.StringIO(data, newline=""), fieldnames=fieldnames)]
+
+
+def _row_bucket(line):
+    return int(line.split(b",", 1)[0])
+
+
+def row_offset_after(filename, bucket, start, end):
+    """
+    Byte offset of the first row starting in [start, end) whose bucket is greater than
+    `bucket` (or end). Rows are bucket-sorted, one per line, and start must be the start
+    of a row, so a binary search over byte offsets needs O(log n) short reads.
+    """
+    with open(filename, "rb") as f:
+        lo, hi = start, end
+        while lo < hi:
+            mid = (lo + hi) // 2
+            # First row starting at or after mid.
+            if mid > start:
+                f.seek(mid - 1)
+                f.readline()
+            else:
+                f.seek(mid)
+            row_start = f.tell()
+            if row_start >= hi:
+                hi = mid
+                continue
+            line = f.readline()
+            if _row_bucket(line) <= bucket:
+                lo = f.tell()
+            else:
+                hi = row_start
+        return lo
+
+
+def last_row_bucket(filename, end, start=0):
+    """Bucket of the last row ending at byte offset `end`, or None if there is none after start."""
+    with open(filename, "rb") as f:
+        chunk = 4096
+        while True:
+            begin = max(start, end - chunk)
+            f.seek(begin)
+            data = f.read(end - begin)
+            # The row's own line ending is the last byte(s) of data.
+            cut = data.rstrip(b"\r\n").rfind(b"\n")
+            if cut >= 0:
+                return _row_bucket(data[cut + 1:])
+            if begin == start:
+                line = data.strip()
+                return _row_bucket(line) if line else None
+            chunk *= 4
+
+
+def encode_rows(rows):
+    """Encode a list of CSV row lists into bytes using the csv module dialect."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerows(rows)
+    return buf.getvalue().encode("utf-8")
+
+
+class CandleFileWriter:
+    """
+    Incremental writer for one footprint_{tf}.csv file.
+
+    The file layout is unchanged (header, finalized rows, optional in-progress
+    row last), but instead of rewriting everything on every tick we remember the
+    byte offset where the finalized rows end:
+      - newly finalized candles are appended exactly once at that offset,
+      - the in-progress candle is a small tail that is truncated and rewritten
+        only when its serialized form changed,
+      - fsync is batched to at most once per fsync_interval seconds.
+    """
+
+    def __init__(self, filename, finalized_count=0, fsync_interval=FSYNC_INTERVAL, finalized_end=None):
+        self.filename = filename
+        self.fsync_interval = fsync_interval
+        self.rows_written = finalized_count
+        self.bytes_written = 0
+        self._tail = b""
+        self._dirty = False
+        self._last_fsync = time.monotonic()
+        self._lock = threading.Lock()
+
+        exists = os.path.exists(filename) and os.path.getsize(filename) > 0
+        self._file = open(filename, "r+b" if exists else "w+b")
+        if exists and finalized_end is not None:
+            # Resuming (from a checkpoint, or after an in-progress row found at startup):
+            # what follows finalized_end is the old in-progress row.
+            self._finalized_end = finalized_end
+            self._file.seek(finalized_end)
+            self._tail = self._file.read()
+        elif exists:
+            # Everything already on disk is finalized.
+            self._finalized_end = self._file.seek(0, os.SEEK_END)
+        else:
+            self._file.write(encode_rows([CSV_FIELDS]))
+            self._finalized_end = self._file.tell()
+            self._dirty = True
+
+    def sync(self, finalized, current=None, count=None):
+        """
+        Bring the file up to date with the finalized list and the in-progress candle.
+        Only rows that were not yet written (and a changed tail) hit the disk. count limits
+        the finalized rows to the first `count` (the finalized count of the snapshot that
+        `current` was taken from).
+        """
+        with self._lock:
+            if self._file.closed:
+                return
+            self._sync(finalized, current, count)
+
+    def _sync(self, finalized, current, count=None):
+        new_rows = finalized[self.rows_written:count]
+        tail = encode_rows([summary_to_row(current)]) if current else b""
+
+        if new_rows:
+            self._file.seek(self._finalized_end)
+            data = encode_rows([summary_to_row(summary) for summary in new_rows])
+            self._file.write(data)
+            self._finalized_end = self._file.tell()
+            self.rows_written += len(new_rows)
+            self.bytes_written += len(data)
+            self._tail = b""
+            self._dirty = True
+
+        # Without an in-progress candle (no trade since startup) an old tail row stays
+        # until a finalized row or a new in-progress row takes its place.
+        if (current and tail != self._tail) or new_rows:
+            self._file.seek(self._finalized_end)
+            self._file.write(tail)
+            self._file.truncate()
+            self._tail = tail
+            self.bytes_written += len(tail)
+            self._dirty = True
+
+        if self._dirty:
+            self._file.flush()
+            now = time.monotonic()
+            if now - self._last_fsync >= self.fsync_interval:
+                os.fsync(self._file.fileno())
+                self._last_fsync = now
+                self._dirty = False
+
+    @property
+    def finalized_end(self):
+        """Byte offset where the finalized rows end (and the in-progress row starts)."""
+        return self._finalized_end
+
+    def close(self):
+        """Flush and fsync pending writes, then close the file."""
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
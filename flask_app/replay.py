@@ -0,0 +1,145 @@
+# replay.py
+"""
+Rebuild footprint files from recorded tick data, as fast as possible.
+
+Feeds one or more tick_data_{SYMBOL}_{date}.csv files (as written by
+python_footprint/data.py, optionally gzip/bz2/xz/zstd-compressed) through the same
+FootprintEngine the live service uses, then writes the per-timeframe files the
+live service would have written: finalized candles plus the in-progress candle.
+
+Usage:
+    python replay.py --out data_rebuilt tick_data_XMRUSDT_2025-04-15.csv [more files...]
+    python replay.py --out data_rebuilt --backend binary --timeframes 1m,5m ticks/*.csv.gz
+"""
+import os
+import csv
+import sys
+import bz2
+import gzip
+import lzma
+import time
+import argparse
+
+try:
+    from compression import zstd  # Python 3.14+
+except ImportError:  # Only needed for .zst recordings.
+    zstd = None
+
+from footprint_engine import FootprintEngine
+from ladder import PRICE_TICK
+from persistence import CandleFileWriter
+from candle_store import CandleStore
+
+DEFAULT_TIMEFRAMES = ["1m", "3m", "5m", "15m", "1h", "4h"]
+
+
+def open_ticks(path):
+    """Open a tick file for reading as text, transparently handling .gz, .bz2, .xz and .zst files."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", newline="")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rt", newline="")
+    if path.endswith(".xz"):
+        return lzma.open(path, "rt", newline="")
+    if path.endswith(".zst"):
+        if zstd is None:
+            raise RuntimeError(f"{path}: reading .zst files needs Python 3.14 (compression.zstd)")
+        return zstd.open(path, "rt", newline="")
+    return open(path, "r", newline="")
+
+
+def read_ticks(path):
+    """
+    Yield (timestamp_ms, price, quantity, is_seller, trade_id) from a tick file with the
+    columns timestamp_ms, price, quantity, side, symbol, trade_id.
+    """
+    with open_ticks(path) as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        columns = {name: i for i, name in enumerate(header)}
+        ts_i, price_i, qty_i = columns["timestamp_ms"], columns["price"], columns["quantity"]
+        side_i, id_i = columns["side"], columns["trade_id"]
+        for row in reader:
+            if not row:
+                continue
+            yield int(row[ts_i]), float(row[price_i]), float(row[qty_i]), row[side_i] == "sell", int(row[id_i])
+
+
+def replay_files(paths, timeframes=DEFAULT_TIMEFRAMES, tick_size=PRICE_TICK, engine=None):
+    """
+    Replay tick files in the given order through a FootprintEngine. Trades whose id is not
+    newer than the last one replayed (overlapping or duplicated recordings) are skipped.
+    Returns (engine, stats).
+    """
+    if engine is None:
+        engine = FootprintEngine(timeframes, tick_size=tick_size)
+    add_trade = engine.add_trade
+    trades = 0
+    skipped = 0
+    last_id = -1
+    started = time.perf_counter()
+    for path in paths:
+        for timestamp_ms, price, quantity, is_seller, trade_id in read_ticks(path):
+            if trade_id <= last_id:
+                skipped += 1
+                continue
+            last_id = trade_id
+            add_trade(timestamp_ms, price, quantity, is_seller)
+            trades += 1
+    elapsed = time.perf_counter() - started
+    stats = {
+        "files": len(paths),
+        "trades": trades,
+        "skipped": skipped,
+        "seconds": elapsed,
+        "trades_per_sec": trades / elapsed if elapsed > 0 else float("inf"),
+        "candles": {tf: len(engine.finalized_data[tf]) for tf in engine.timeframes},
+    }
+    return engine, stats
+
+
+def write_outputs(engine, out_dir, backend="csv"):
+    """Write every timeframe of `engine` to out_dir the way the live service persists it."""
+    os.makedirs(out_dir, exist_ok=True)
+    for tf in engine.timeframes:
+        if backend == "binary":
+            prefix = os.path.join(out_dir, f"footprint_{tf}")
+            for ext in (".fpc", ".fpl"):
+                if os.path.exists(prefix + ext):
+                    os.remove(prefix + ext)
+            writer = CandleStore(prefix)
+        else:
+            filename = os.path.join(out_dir, f"footprint_{tf}.csv")
+            if os.path.exists(filename):
+                os.remove(filename)
+            writer = CandleFileWriter(filename)
+        writer.sync(engine.finalized_data[tf], engine.live_summary(tf))
+        writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild footprint files from recorded tick CSVs.")
+    parser.add_argument("files", nargs="+", help="tick CSV files (.csv, optionally .gz/.bz2/.xz/.zst), replayed in order")
+    parser.add_argument("--out", required=True, help="output directory for footprint files")
+    parser.add_argument("--timeframes", default=",".join(DEFAULT_TIMEFRAMES))
+    parser.add_argument("--tick-size", type=float, default=PRICE_TICK)
+    parser.add_argument("--backend", choices=["csv", "binary"], default="csv")
+    args = parser.parse_args(argv)
+
+    engine, stats = replay_files(args.files, args.timeframes.split(","), args.tick_size)
+    write_started = time.perf_counter()
+    write_outputs(engine, args.out, args.backend)
+    write_seconds = time.perf_counter() - write_started
+
+    print(f"Replayed {stats['trades']} trades from {stats['files']} file(s) "
+          f"in {stats['seconds']:.2f}s ({stats['trades_per_sec']:,.0f} trades/sec), "
+          f"skipped {stats['skipped']} duplicates")
+    print("Candles: " + ", ".join(f"{tf}={count}" for tf, count in stats["candles"].items()))
+    print(f"Wrote {args.backend} files to {args.out} in {write_seconds:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
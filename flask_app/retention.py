@@ -0,0 +1,403 @@
+# retention.py
+"""
+Bounded in-memory retention of finalized candles.
+
+Per timeframe only the hot end of the history stays in memory as summary dicts: the
+last `candles` candles, plus any candle of the last `hours` hours. Older candles live
+on disk and are decoded lazily (through candle_store.StoredCandles) when a history
+query reaches back that far:
+  - binary backend: the timeframe's own CandleStore already holds every finalized
+    candle, so candles are simply released from memory once the store has them;
+  - CSV backend: candles are spilled, in batches, into immutable segment files under
+    DATA_DIR/segments/footprint_{tf}/, which index the leading rows of
+    footprint_{tf}.csv. Each segment is a small CandleStore plus the rows' CSV text
+    (see Segment), so spilled rows read back exactly as footprint_{tf}.csv has them.
+Resident memory therefore plateaus however long the service runs.
+"""
+import os
+import time
+import bisect
+import shutil
+import threading
+from array import array
+from collections import OrderedDict
+
+from persistence import (CSV_FIELDS, CandleFileWriter, encode_rows, last_row_bucket, load_candle_tail,
+                         read_header, read_rows_between, row_offset_after, summary_to_row)
+from candle_store import CANDLE_RECORD, HEADER, CandleStore, StoredBuckets, StoredCandles, open_store
+
+# Candles kept in memory per timeframe: the last `candles`, plus any within the last `hours`.
+DEFAULT_RETENTION = {"candles": 1000, "hours": 24}
+# Candles are moved out of memory in batches of at least this many, so segments stay large.
+SPILL_BATCH = 256
+# Segments kept open at a time (two file descriptors and two maps each).
+OPEN_SEGMENTS = 8
+
+
+class Segment:
+    """
+    One segment: a CandleStore (<prefix>.fpc/.fpl: buckets and columns) plus the CSV text
+    of its rows (<prefix>.csv, no header) and the byte offset of every row
+    (<prefix>.off, count + 1 little-endian uint64). Rows are read from the text, which is
+    what footprint_{tf}.csv holds for them: the columnar records round numbers and
+    cannot tell an empty field from 0. Segments without text (older versions) are
+    decoded from the store.
+    """
+
+    EXTENSIONS = (".csv", ".off", ".fpc", ".fpl")
+
+    def __init__(self, prefix):
+        self.store = CandleStore(prefix)
+        self.rows_file = prefix + ".csv"
+        self.offsets = None
+        if os.path.exists(prefix + ".off"):
+            offsets = array("Q")
+            with open(prefix + ".off", "rb") as f:
+                offsets.frombytes(f.read())
+            if len(offsets) == len(self.store) + 1:
+                self.offsets = offsets
+
+    @classmethod
+    def write(cls, prefix, summaries):
+        """Write `summaries` as the segment at prefix (the text first, all fsynced)."""
+        offsets = array("Q", [0])
+        with open(prefix + ".csv", "wb") as f:
+            for summary in summaries:
+                offsets.append(offsets[-1] + f.write(encode_rows([summary_to_row(summary)])))
+            f.flush()
+            os.fsync(f.fileno())
+        with open(prefix + ".off", "wb") as f:
+            f.write(offsets.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        store = CandleStore(prefix, fsync_interval=0)
+        store.append(summaries)
+        store.close()
+
+    def __len__(self):
+        return len(self.store)
+
+    def bucket(self, i):
+        return self.store.bucket(i)
+
+    def read(self, start, stop):
+        stop = min(stop, len(self))
+        if self.offsets is None:
+            return self.store.read(start, stop)
+        if start >= stop:
+            return []
+        return read_rows_between(self.rows_file, self.offsets[start], self.offsets[stop], CSV_FIELDS)
+
+    def close(self):
+        self.store.close()
+
+
+class SegmentSet:
+    """
+    Immutable, append-only sequence of candles split over segments (see Segment) named
+    seg_<first index>. Implements the read side of CandleStore (len, bucket, read) so
+    it can back StoredCandles/StoredBuckets. Segments are opened on demand.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.starts = []
+        self.counts = []
+        for name in sorted(os.listdir(directory)):
+            if name.startswith("seg_") and name.endswith(".fpc"):
+                size = os.path.getsize(os.path.join(directory, name))
+                count = max(size - HEADER.size, 0) // CANDLE_RECORD.size
+                start = int(name[4:-4])
+                # A segment that does not continue the sequence is the leftover of an
+                # interrupted spill; everything from there on is ignored and overwritten.
+                if count and start == len(self):
+                    self.starts.append(start)
+                    self.counts.append(count)
+        self._open = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.starts[-1] + self.counts[-1] if self.starts else 0
+
+    def _prefix(self, start):
+        return os.path.join(self.directory, f"seg_{start:012d}")
+
+    def _segment(self, i):
+        """(first index, store) of the segment holding candle i."""
+        k = bisect.bisect_right(self.starts, i) - 1
+        start = self.starts[k]
+        with self._lock:
+            store = self._open.get(start)
+            if store is None:
+                store = self._open[start] = Segment(self._prefix(start))
+                if len(self._open) > OPEN_SEGMENTS:
+                    # Not closed explicitly: a reader may still be using it. Its files
+                    # are closed when the last reference goes away.
+                    self._open.popitem(last=False)
+            else:
+                self._open.move_to_end(start)
+        return start, store
+
+    def bucket(self, i):
+        start, store = self._segment(i)
+        return store.bucket(i - start)
+
+    def read(self, start, stop):
+        rows = []
+        stop = min(stop, len(self))
+        while start < stop:
+            first, store = self._segment(start)
+            end = min(stop, first + len(store))
+            rows.extend(store.read(start - first, end - first))
+            start = end
+        return rows
+
+    def last_bucket(self):
+        return self.bucket(len(self) - 1) if len(self) else None
+
+    def append(self, summaries):
+        """Write `summaries` as a new segment (fsynced before it becomes visible)."""
+        if not summaries:
+            return
+        start = len(self)
+        prefix = self._prefix(start)
+        for ext in Segment.EXTENSIONS:
+            if os.path.exists(prefix + ext):
+                os.remove(prefix + ext)
+        Segment.write(prefix, summaries)
+        self.starts.append(start)
+        self.counts.append(len(summaries))
+
+    def clear(self):
+        with self._lock:
+            self._open.clear()
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory, exist_ok=True)
+        self.starts = []
+        self.counts = []
+
+    def close(self):
+        with self._lock:
+            stores, self._open = list(self._open.values()), OrderedDict()
+        for store in stores:
+            store.close()
+
+
+class RetainedHistory:
+    """
+    Keeps the in-memory tail of one timeframe's finalized candles bounded. `candles` and
+    `buckets` are the StoredCandles/StoredBuckets pair the engine appends to; `cold` is
+    their store. With spill=True (segments) enforce() writes the excess to the store
+    first; otherwise it only releases candles the store already holds.
+    """
+
+    def __init__(self, candles, buckets, cold, lock, retention=None, spill=True):
+        self.candles = candles
+        self.buckets = buckets
+        self.cold = cold
+        self.lock = lock
+        retention = dict(DEFAULT_RETENTION, **(retention or {}))
+        self.keep_candles = retention["candles"]
+        self.keep_seconds = retention["hours"] * 3600 if retention["hours"] else 0
+        self.spill = spill
+        self.released = 0
+
+    def excess(self):
+        """Number of tail candles that may leave memory."""
+        tail = self.buckets.tail
+        count = len(tail) - self.keep_candles
+        if count <= 0:
+            return 0
+        if self.keep_seconds and tail:
+            # Also keep every candle of the last keep_seconds.
+            count = min(count, bisect.bisect_left(tail, tail[-1] - self.keep_seconds))
+        return count
+
+    def enforce(self):
+        """Move the excess out of memory if it reached SPILL_BATCH. Returns the number moved."""
+        count = self.excess()
+        if count < SPILL_BATCH:
+            return 0
+        stored = self.candles.stored
+        if self.spill:
+            # The oldest tail candles are never modified again, so the (slow) write
+            # happens without the lock.
+            self.cold.append(self.candles.tail[:count])
+        else:
+            count = min(count, len(self.cold) - stored)
+            if count <= 0:
+                return 0
+        with self.lock:
+            self.candles.release(count)
+            self.buckets.release(count)
+        self.released += count
+        return count
+
+
+class CsvRegion:
+    """
+    The `count` footprint CSV rows between two byte offsets, decoded on first use. Read
+    side of CandleStore (len, bucket, read), like SegmentSet.
+    """
+
+    def __init__(self, filename=None, start=0, end=0, count=0, fieldnames=None, last_bucket=None):
+        self.filename = filename
+        self.start = start
+        self.end = end
+        self.count = count
+        self.fieldnames = fieldnames
+        # Known from the checkpoint, so asking for the newest bucket does not decode the region.
+        self.last_bucket = last_bucket
+        self._rows = None
+        self._buckets = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def _load(self):
+        with self._lock:
+            if self._rows is None:
+                rows = read_rows_between(self.filename, self.start, self.end, self.fieldnames) if self.count else []
+                if len(rows) != self.count:
+                    raise ValueError(f"{self.filename}: expected {self.count} rows at "
+                                     f"[{self.start}, {self.end}), found {len(rows)}")
+                self._buckets = [int(row["bucket"]) for row in rows]
+                self._rows = rows
+        return self._rows
+
+    def bucket(self, i):
+        if i == self.count - 1 and self.last_bucket is not None and self._rows is None:
+            return self.last_bucket
+        self._load()
+        return self._buckets[i]
+
+    def read(self, start, stop):
+        return self._load()[start:stop]
+
+
+class TieredStore:
+    """
+    Cold tiers of a CSV-backed timeframe: immutable segments followed by a CsvRegion (the
+    finalized CSV rows that are not in a segment yet, still undecoded after a start from a
+    checkpoint). Appending moves the region into a new segment together with the new
+    candles.
+    """
+
+    def __init__(self, segments, region=None):
+        self.segments = segments
+        # (segment count, region), replaced as a whole so readers see a consistent split.
+        self._tiers = (len(segments), region or CsvRegion())
+
+    def __len__(self):
+        count, region = self._tiers
+        return count + len(region)
+
+    def bucket(self, i):
+        count, region = self._tiers
+        return self.segments.bucket(i) if i < count else region.bucket(i - count)
+
+    def read(self, start, stop):
+        count, region = self._tiers
+        rows = self.segments.read(start, min(stop, count)) if start < count else []
+        if stop > count:
+            rows.extend(region.read(max(start - count, 0), stop - count))
+        return rows
+
+    def append(self, summaries):
+        count, region = self._tiers
+        if len(region):
+            summaries = region.read(0, len(region)) + list(summaries)
+        self.segments.append(summaries)
+        self._tiers = (len(self.segments), CsvRegion())
+
+    def close(self):
+        self.segments.close()
+
+
+def checkpoint_matches(directory, tf, backend, entry):
+    """
+    Whether the stored history of tf is exactly what the checkpoint entry describes
+    (finalized count, last finalized bucket and, for CSV, where the finalized rows end).
+    """
+    if backend == "binary":
+        prefix = os.path.join(directory, f"footprint_{tf}")
+        if not os.path.exists(prefix + ".fpc"):
+            return entry["count"] == 0
+        count = max(os.path.getsize(prefix + ".fpc") - HEADER.size, 0) // CANDLE_RECORD.size
+        if count != entry["count"]:
+            return False
+        if count == 0:
+            return True
+        store = CandleStore(prefix)
+        try:
+            return store.bucket(count - 1) == entry["last_bucket"]
+        finally:
+            store.close()
+    filename = os.path.join(directory, f"footprint_{tf}.csv")
+    if not os.path.exists(filename) or os.path.getsize(filename) < entry["finalized_end"]:
+        return False
+    if len(SegmentSet(os.path.join(directory, "segments", f"footprint_{tf}"))) > entry["count"]:
+        return False
+    header_end = read_header(filename)[1]
+    with open(filename, "rb") as f:
+        f.seek(entry["finalized_end"])
+        # After the finalized rows there is at most the in-progress row.
+        if f.read().rstrip(b"\r\n").count(b"\n"):
+            return False
+    return last_row_bucket(filename, entry["finalized_end"], header_end) == entry["last_bucket"]
+
+
+def open_history(engine, tf, directory, backend="csv", retention=None, checkpoint=None, now=None):
+    """
+    Attach the stored history of timeframe tf in `directory` to engine: finalized_data[tf]
+    and finalized_buckets[tf] become lazily loaded views with a bounded in-memory tail.
+    Returns (writer, RetainedHistory); the writer persists new candles like the live
+    service always has (CandleFileWriter, or the CandleStore itself for "binary").
+
+    With a checkpoint entry (see checkpoint_matches) nothing is decoded: the CSV rows after
+    the last segment are found by binary search and decoded on first access. Without one
+    the CSV rows after the last segment are read. The last of them is the previous
+    process's in-progress candle when its bucket has not ended at `now` (unix seconds,
+    default the current time): it stays the file's tail and is rewritten in place by the
+    in-progress candle, so the bucket is never stored twice.
+    """
+    filename = os.path.join(directory, f"footprint_{tf}.csv")
+    if backend == "binary":
+        cold = writer = open_store(os.path.join(directory, f"footprint_{tf}"), filename)
+        candles = StoredCandles(cold)
+        buckets = StoredBuckets(cold)
+        spill = False
+    else:
+        segments = SegmentSet(os.path.join(directory, "segments", f"footprint_{tf}"))
+        tail = []
+        if checkpoint is not None and os.path.exists(filename):
+            fieldnames, header_end = read_header(filename)
+            end = checkpoint["finalized_end"]
+            start = row_offset_after(filename, segments.last_bucket(), header_end, end) if len(segments) else header_end
+            region = CsvRegion(filename, start, end, checkpoint["count"] - len(segments), fieldnames,
+                               checkpoint["last_bucket"])
+            cold = TieredStore(segments, region)
+            writer = CandleFileWriter(filename, finalized_count=checkpoint["count"], finalized_end=end)
+        else:
+            tail, skipped = load_candle_tail(filename, segments.last_bucket())
+            if skipped != len(segments):
+                # The CSV no longer starts with what the segments hold (e.g. it was rebuilt):
+                # the CSV is authoritative, segments are rebuilt from it.
+                segments.clear()
+                tail, skipped = load_candle_tail(filename)
+            cold = TieredStore(segments)
+            finalized_end = None
+            if tail and int(tail[-1]["bucket"]) >= engine.bucket_of(tf, int(time.time() if now is None else now)):
+                # Still in progress: the file's finalized rows end where this row starts.
+                in_progress = int(tail.pop()["bucket"])
+                _, header_end = read_header(filename)
+                finalized_end = row_offset_after(filename, in_progress - 1, header_end, os.path.getsize(filename))
+            writer = CandleFileWriter(filename, finalized_count=skipped + len(tail), finalized_end=finalized_end)
+        candles = StoredCandles(cold, tail)
+        buckets = StoredBuckets(cold, [int(row["bucket"]) for row in tail])
+        spill = True
+    engine.finalized_data[tf] = candles
+    engine.finalized_buckets[tf] = buckets
+    return writer, RetainedHistory(candles, buckets, cold, engine.lock, retention, spill)
@@ -0,0 +1,162 @@
+# storage.py
+"""
+Persistence of one FootprintEngine: footprint files, bounded retention (retention.py) and
+a checkpoint of the aggregation state.
+
+<data dir>/checkpoint.json is replaced atomically every CHECKPOINT_INTERVAL seconds
+(when anything changed) and on shutdown. It holds, per timeframe, the number of
+finalized candles, the last finalized bucket and, for CSV files, the byte offset where
+the finalized rows end; plus the in-progress base candle, the roll-ups and the
+cumulative delta in volume units. Files and checkpoint are written from the same
+EngineState, so they always agree.
+
+On startup a checkpoint that still matches the files lets the engine continue exactly
+where it stopped, CVD included, without decoding any history: startup cost does not
+depend on how much history there is. Without one (first start, crash before the first
+checkpoint, files replaced) history is loaded from the files as before and CVD
+continues from the last stored candle.
+"""
+import os
+import json
+import time
+import threading
+
+from footprint_engine import VOLUME_SCALE
+from retention import checkpoint_matches, open_history
+
+# Storage backends for finalized candles: footprint_{tf}.csv, or a CandleStore (candle_store.py).
+BACKENDS = ("csv", "binary")
+
+CHECKPOINT_FILE = "checkpoint.json"
+CHECKPOINT_VERSION = 1
+CHECKPOINT_INTERVAL = 5.0
+
+
+def load_checkpoint(path):
+    """The checkpoint at path, or None if there is none or it cannot be used."""
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != CHECKPOINT_VERSION:
+        return None
+    return data
+
+
+def save_checkpoint(path, data):
+    """
+    Write data to path atomically: readers see the old or the new checkpoint, never a mix.
+    Returns the size of the checkpoint in bytes.
+    """
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+        f.flush()
+        os.fsync(f.fileno())
+        size = f.tell()
+    os.replace(tmp, path)
+    return size
+
+
+class FootprintStorage:
+    """
+    Opens the stored history of every timeframe of `engine` in `directory` (restoring
+    the checkpoint when it matches) and keeps files, memory bound and checkpoint up to
+    date through sync(). `retention` maps timeframes to retention.RETENTION-style dicts.
+    """
+
+    def __init__(self, engine, directory, backend="csv", retention=None,
+                 checkpoint_interval=CHECKPOINT_INTERVAL):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown storage backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+        self.engine = engine
+        self.directory = directory
+        self.backend = backend
+        self.path = os.path.join(directory, CHECKPOINT_FILE)
+        self.checkpoint_interval = checkpoint_interval
+        self._lock = threading.Lock()
+        self._saved_version = None
+        self._last_save = 0.0
+        self.checkpoint_bytes = 0
+        self.closed = False
+
+        checkpoint = load_checkpoint(self.path)
+        if checkpoint is not None and not self._matches(checkpoint):
+            checkpoint = None
+        self.restored = checkpoint is not None
+
+        self.writers = {}
+        self.histories = {}
+        for tf in engine.timeframes:
+            entry = checkpoint["timeframes"][tf] if checkpoint else None
+            self.writers[tf], self.histories[tf] = open_history(
+                engine, tf, directory, backend, (retention or {}).get(tf), entry)
+        if checkpoint is not None:
+            engine.restore(checkpoint["engine"])
+            self._saved_version = engine.version
+        else:
+            self._continue_cvd()
+
+    def _matches(self, checkpoint):
+        if checkpoint.get("backend") != self.backend:
+            return False
+        entries = checkpoint.get("timeframes", {})
+        return (set(entries) == set(self.engine.timeframes)
+                and all(checkpoint_matches(self.directory, tf, self.backend, entries[tf]) for tf in entries))
+
+    def _continue_cvd(self):
+        """Without a checkpoint: continue CVD from the last stored candle (2 decimals)."""
+        engine = self.engine
+        for tf in engine.timeframes:
+            data = engine.finalized_data[tf]
+            if len(data):
+                cvd = data[-1].get("CVD")
+                if cvd not in (None, ""):
+                    engine.cumulative_delta[tf] = round(float(cvd) * VOLUME_SCALE)
+
+    def sync(self, force_checkpoint=False):
+        """
+        Write new finalized candles and the in-progress rows, move candles beyond the
+        retention out of memory and save the checkpoint when it is due. Everything is
+        taken from one EngineState.
+        """
+        with self._lock:
+            if self.closed:
+                return
+            engine = self.engine
+            state = engine.capture()
+            for tf in engine.timeframes:
+                self.writers[tf].sync(engine.finalized_data[tf], state.live_summary(tf),
+                                      state.finalized_counts[tf])
+                self.histories[tf].enforce()
+            now = time.monotonic()
+            due = state.version != self._saved_version and now - self._last_save >= self.checkpoint_interval
+            if force_checkpoint or due:
+                self._save(state)
+                self._saved_version = state.version
+                self._last_save = now
+
+    def _save(self, state):
+        timeframes = {}
+        for tf in self.engine.timeframes:
+            entry = {"count": state.finalized_counts[tf], "last_bucket": state.last_buckets[tf]}
+            if self.backend != "binary":
+                entry["finalized_end"] = self.writers[tf].finalized_end
+            timeframes[tf] = entry
+        self.checkpoint_bytes += save_checkpoint(self.path, {
+            "version": CHECKPOINT_VERSION,
+            "backend": self.backend,
+            "saved_at": time.time(),
+            "timeframes": timeframes,
+            "engine": state.to_state(),
+        })
+
+    def close(self):
+        """Final sync and checkpoint, then close every file."""
+        self.sync(force_checkpoint=True)
+        with self._lock:
+            self.closed = True
+            for tf in self.engine.timeframes:
+                self.writers[tf].close()
+                self.histories[tf].cold.close()
@@ -0,0 +1,103 @@
+# streaming.py
+import json
+import queue
+import threading
+
+# Maximum number of pending events per connected client. A client that falls
+# further behind is not allowed to grow memory: its queue is dropped and it is
+# sent a fresh snapshot instead.
+STREAM_QUEUE_SIZE = 256
+
+# Seconds without any event after which a comment line is sent, so proxies and
+# browsers keep the connection open.
+STREAM_KEEPALIVE = 15.0
+
+
+def encode_event(event, payload):
+    """Encode one Server-Sent Event. The payload is serialized to JSON exactly once."""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+class Subscription:
+    """A connected stream client: the timeframes it follows and its bounded queue."""
+
+    def __init__(self, timeframes, queue_size):
+        self.timeframes = set(timeframes)
+        self.queue = queue.Queue(maxsize=queue_size)
+        # Timeframes for which events were dropped and a new snapshot is owed.
+        self.lagged = set()
+        self.dropped = 0
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            # The client is too slow. Everything it has queued is superseded by the
+            # snapshot it will get instead, so free the queue and flag the resync.
+            self.dropped += 1
+            self.lagged.update(self.timeframes)
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            try:
+                self.queue.put_nowait(None)  # wake up the consumer
+            except queue.Full:
+                pass
+
+    def get(self, timeout):
+        """Return the next encoded event, None to signal a resync, or "" on keep-alive timeout."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return ""
+
+
+class CandleBroadcaster:
+    """
+    Fan-out of candle events to stream subscribers, per timeframe.
+    Each event is encoded once and the same string is handed to every subscriber,
+    so the cost of a publish does not depend on the payload size times the number
+    of viewers.
+    """
+
+    def __init__(self, queue_size=STREAM_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self.published = 0
+
+    def subscribe(self, timeframes):
+        sub = Subscription(timeframes, self.queue_size)
+        with self._lock:
+            for tf in sub.timeframes:
+                self._subscribers.setdefault(tf, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            for tf in sub.timeframes:
+                subs = self._subscribers.get(tf)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._subscribers[tf]
+
+    def has_subscribers(self, tf):
+        return tf in self._subscribers
+
+    def subscriber_count(self):
+        with self._lock:
+            return len({sub for subs in self._subscribers.values() for sub in subs})
+
+    def publish(self, tf, event, payload):
+        """Send an event to every subscriber of timeframe tf."""
+        with self._lock:
+            subs = list(self._subscribers.get(tf, ()))
+        if not subs:
+            return
+        message = encode_event(event, payload)
+        for sub in subs:
+            sub.put(message)
+        self.published += 1
@@ -0,0 +1,366 @@
+# symbol_workers.py
+"""
+Footprint aggregation for additional symbols in worker processes.
+
+Every worker is a separate interpreter (`python symbol_workers.py ...`) that owns a
+group of symbols: per symbol a Binance trade websocket feeding a TradeIngest queue (the
+callback only queues frames, see ingest.py), one FootprintEngine and one set of
+footprint files under DATA_DIR/<SYMBOL>/. A burst on one symbol therefore only competes
+for the CPU of its own worker, and workers run on separate cores.
+
+Every symbol is aggregated on its own tick size: the configured one, else the
+PRICE_FILTER of Binance's exchangeInfo (looked up once by the Flask process), else
+PRICE_TICK. Everything else (trade stream, imbalance rules, price bins, retention, ingest
+queue) follows the Flask process's own symbol, passed to workers as an engine config.
+
+The Flask process talks to each worker over a private socket pair carrying
+multiprocessing Connection messages (request_id, method, args) -> (request_id, status,
+value). SymbolRouter assigns symbols to workers and forwards requests; workers answer
+with ready-to-send response bodies so that serialization also happens off the Flask
+process.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import argparse
+import threading
+import subprocess
+from multiprocessing.connection import Connection
+
+import requests
+import websocket
+
+from footprint_engine import FootprintEngine
+from history_cache import HistoryCache
+from imbalance import IMBALANCE_MIN_VOLUME, IMBALANCE_RATIO, STACKED_LEVELS, ImbalanceRules
+from imbalance import add_history_fields as add_imbalance_fields
+from volume_profile import add_history_fields as add_value_area_fields
+from binning import PRICE_BINS, usable_bins
+from ingest import INGEST_BATCH, INGEST_QUEUE_SIZE, TradeIngest, trade_stream_url
+from ladder import PRICE_TICK
+from retention import DEFAULT_RETENTION
+from storage import BACKENDS, FootprintStorage
+
+BINANCE_EXCHANGE_INFO_URL = "https://fapi.binance.com/fapi/v1/exchangeInfo"
+EXCHANGE_INFO_TIMEOUT = 10.0
+# Seconds the Flask process waits for a worker to answer a request.
+RPC_TIMEOUT = 10.0
+# Seconds between two syncs of a worker's footprint files.
+PERSIST_INTERVAL = 1.0
+# Engine and ingest settings of a worker's symbols; app.py passes its own (FOOTPRINT_STREAM,
+# FOOTPRINT_IMBALANCE_*, FOOTPRINT_PRICE_BINS, ...) so every symbol serves the same fields.
+DEFAULT_ENGINE_CONFIG = {
+    "stream": "trade",
+    "imbalance_ratio": IMBALANCE_RATIO,
+    "imbalance_min_volume": IMBALANCE_MIN_VOLUME,
+    "stacked_levels": STACKED_LEVELS,
+    "price_bins": list(PRICE_BINS),
+    "retention": dict(DEFAULT_RETENTION),
+    "ingest_queue": INGEST_QUEUE_SIZE,
+    "ingest_batch": INGEST_BATCH,
+    "ingest_overflow": "block",
+}
+
+log = logging.getLogger(__name__)
+
+
+class ShardError(RuntimeError):
+    """A worker could not be reached or failed to answer a request."""
+
+
+def engine_config(config=None):
+    """DEFAULT_ENGINE_CONFIG updated with `config`, rejecting unknown settings."""
+    unknown = set(config or ()) - set(DEFAULT_ENGINE_CONFIG)
+    if unknown:
+        raise ValueError(f"Unknown engine settings: {', '.join(sorted(unknown))}")
+    return dict(DEFAULT_ENGINE_CONFIG, **(config or {}))
+
+
+def parse_tick_sizes(text):
+    """{symbol: tick size} of "BTCUSDT=0.1,ETHUSDT=0.01"."""
+    return {
+        symbol.strip().upper(): float(size) for symbol, _, size in (
+            item.partition("=") for item in text.split(",") if item.strip())
+    }
+
+
+def format_tick_sizes(tick_sizes):
+    return ",".join(f"{symbol}={size!r}" for symbol, size in tick_sizes.items())
+
+
+def fetch_tick_sizes(symbols, url=BINANCE_EXCHANGE_INFO_URL):
+    """{symbol: tick size} of those of `symbols` listed in Binance's exchangeInfo."""
+    response = requests.get(url, timeout=EXCHANGE_INFO_TIMEOUT)
+    response.raise_for_status()
+    wanted = set(symbols)
+    tick_sizes = {}
+    for info in response.json().get("symbols", []):
+        if info.get("symbol") not in wanted:
+            continue
+        for price_filter in info.get("filters", []):
+            if price_filter.get("filterType") == "PRICE_FILTER":
+                tick_sizes[info["symbol"]] = float(price_filter["tickSize"])
+    return tick_sizes
+
+
+def resolve_tick_sizes(symbols, configured=None, lookup=True):
+    """
+    Tick size of every symbol: `configured`, else exchangeInfo (when `lookup`), else
+    PRICE_TICK (with a warning when it was looked up and not found).
+    """
+    tick_sizes = {symbol: configured[symbol] for symbol in symbols if configured and symbol in configured}
+    missing = [symbol for symbol in symbols if symbol not in tick_sizes]
+    if missing and lookup:
+        try:
+            tick_sizes.update(fetch_tick_sizes(missing))
+        except (requests.RequestException, ValueError, KeyError) as exc:
+            log.warning("exchangeInfo lookup failed (%s)", exc)
+        for symbol in missing:
+            if symbol not in tick_sizes:
+                log.warning("No tick size for %s, using %s", symbol, PRICE_TICK)
+    return {symbol: tick_sizes.get(symbol, PRICE_TICK) for symbol in symbols}
+
+
+# ----------------------------
+# Worker process
+# ----------------------------
+class SymbolState:
+    """Engine and footprint storage of one symbol inside a worker (see engine_config)."""
+
+    def __init__(self, symbol, data_dir, timeframes, backend="csv", tick_size=PRICE_TICK, config=None):
+        config = engine_config(config)
+        self.symbol = symbol
+        self.stream = config["stream"]
+        self.directory = os.path.join(data_dir, symbol)
+        os.makedirs(self.directory, exist_ok=True)
+        rules = ImbalanceRules(config["imbalance_ratio"], config["imbalance_min_volume"], config["stacked_levels"])
+        # Bins that are not a multiple of this symbol's tick are still binned on request.
+        self.engine = FootprintEngine(timeframes, tick_size, imbalance_rules=rules,
+                                      price_bins=usable_bins(config["price_bins"], tick_size))
+        self.ingest = TradeIngest(self.engine, config["ingest_queue"], config["ingest_batch"],
+                                  config["ingest_overflow"])
+        retention = {tf: dict(config["retention"]) for tf in timeframes}
+        self.storage = FootprintStorage(self.engine, self.directory, backend, retention)
+        self.history_cache = HistoryCache(self.engine)
+        add_imbalance_fields(self.history_cache, self.engine)
+        add_value_area_fields(self.history_cache)
+
+    def sync(self):
+        self.storage.sync()
+
+    def close(self):
+        self.storage.close()
+
+
+class SymbolWorker:
+    """The request loop, ingest and persistence of one worker process."""
+
+    def __init__(self, conn, symbols, data_dir, timeframes, backend="csv", tick_sizes=None, config=None):
+        self.conn = conn
+        tick_sizes = tick_sizes or {}
+        self.states = {
+            symbol: SymbolState(symbol, data_dir, timeframes, backend, tick_sizes.get(symbol, PRICE_TICK), config)
+            for symbol in symbols
+        }
+        self.handlers = {"history": self.history, "stats": self.stats}
+
+    def start_ingest(self):
+        """Start every symbol's ingest thread and trade websocket."""
+        for symbol, state in self.states.items():
+            state.ingest.start()
+            ws = websocket.WebSocketApp(trade_stream_url(symbol, state.stream), on_message=state.ingest.on_message)
+            threading.Thread(target=ws.run_forever, daemon=True).start()
+
+    def persist(self):
+        while True:
+            for state in self.states.values():
+                state.sync()
+            time.sleep(PERSIST_INTERVAL)
+
+    def history(self, symbol, tf, since=None, until=None, limit=None, fields=None, wire_format="rows", price_bin=1):
+        """Body of the history window, as served by /api/footprint/history/<tf> (uncompressed)."""
+        state = self.states[symbol]
+        snapshot, lo, hi, live = state.engine.history_window(tf, since, until, limit)
+        return state.history_cache.body(tf, (since, until, limit), lo, hi, live, None, fields, wire_format, price_bin)
+
+    def stats(self):
+        return {
+            symbol: {
+                "tick_size": state.engine.tick_size,
+                "stream": state.stream,
+                "engine": state.engine.stats(),
+                "ingest": state.ingest.stats(),
+                "candles": {tf: len(state.engine.finalized_data[tf]) for tf in state.engine.timeframes},
+            }
+            for symbol, state in self.states.items()
+        }
+
+    def serve(self):
+        """Answer requests until the Flask process closes the connection or sends "close"."""
+        try:
+            while True:
+                try:
+                    request_id, method, args = self.conn.recv()
+                except EOFError:
+                    break
+                if method == "close":
+                    self.conn.send((request_id, "ok", None))
+                    break
+                try:
+                    self.conn.send((request_id, "ok", self.handlers[method](*args)))
+                except Exception as exc:
+                    self.conn.send((request_id, "error", f"{type(exc).__name__}: {exc}"))
+        finally:
+            for state in self.states.values():
+                state.close()
+
+
+# ----------------------------
+# Flask side
+# ----------------------------
+class ShardClient:
+    """One worker process and its connection. Requests are serialized by a lock."""
+
+    def __init__(self, index, symbols, data_dir, timeframes, backend="csv", ingest=True, tick_sizes=None,
+                 config=None):
+        self.index = index
+        self.symbols = list(symbols)
+        self.tick_sizes = {symbol: tick_sizes[symbol] for symbol in self.symbols if tick_sizes and symbol in tick_sizes}
+        self.data_dir = data_dir
+        self.timeframes = list(timeframes)
+        self.backend = backend
+        self.ingest = ingest
+        self.config = engine_config(config)
+        self.process = None
+        self.conn = None
+        self.restarts = 0
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        parent_sock, child_sock = socket.socketpair()
+        command = [sys.executable, os.path.abspath(__file__),
+                   "--fd", str(child_sock.fileno()),
+                   "--data-dir", self.data_dir,
+                   "--timeframes", ",".join(self.timeframes),
+                   "--backend", self.backend,
+                   "--tick-sizes", format_tick_sizes(self.tick_sizes),
+                   "--config", json.dumps(self.config)]
+        if not self.ingest:
+            command.append("--no-ingest")
+        self.process = subprocess.Popen(command + self.symbols, pass_fds=(child_sock.fileno(),))
+        child_sock.close()
+        self.conn = Connection(parent_sock.detach())
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def call(self, method, *args, timeout=RPC_TIMEOUT):
+        """Send one request and wait for its answer. Raises ShardError or TimeoutError."""
+        with self._lock:
+            if not self.is_alive():
+                if self.process is not None:
+                    self.restarts += 1
+                self.start()
+            self._next_id += 1
+            request_id = self._next_id
+            deadline = time.monotonic() + timeout
+            try:
+                self.conn.send((request_id, method, args))
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self.conn.poll(remaining):
+                        raise TimeoutError(f"worker {self.index} did not answer {method} in {timeout}s")
+                    reply_id, status, value = self.conn.recv()
+                    # Answers to requests that timed out earlier are dropped here.
+                    if reply_id == request_id:
+                        break
+            except (EOFError, OSError) as exc:
+                raise ShardError(f"worker {self.index} is unavailable: {exc}") from exc
+        if status != "ok":
+            raise ShardError(value)
+        return value
+
+    def close(self):
+        if not self.is_alive():
+            return
+        try:
+            self.call("close", timeout=5.0)
+            self.process.wait(timeout=5.0)
+        except (ShardError, TimeoutError, subprocess.TimeoutExpired):
+            self.process.kill()
+        self.conn.close()
+
+
+class SymbolRouter:
+    """
+    Assigns symbols round-robin to `workers` worker processes (default: one per symbol,
+    at most one per core) and forwards requests to the owning worker. Tick sizes not in
+    `tick_sizes` are looked up in exchangeInfo when the workers ingest; `config` holds
+    the engine settings of every symbol (see engine_config).
+    """
+
+    def __init__(self, symbols, data_dir, timeframes, backend="csv", workers=None, ingest=True, tick_sizes=None,
+                 config=None):
+        self.symbols = list(symbols)
+        self.tick_sizes = resolve_tick_sizes(self.symbols, tick_sizes, lookup=ingest) if self.symbols else {}
+        count = workers or min(len(self.symbols), os.cpu_count() or 1)
+        count = max(1, min(count, len(self.symbols) or 1))
+        self.shards = [
+            ShardClient(i, self.symbols[i::count], data_dir, timeframes, backend, ingest, self.tick_sizes, config)
+            for i in range(count)
+        ] if self.symbols else []
+        self.shard_of = {symbol: shard for shard in self.shards for symbol in shard.symbols}
+
+    def __contains__(self, symbol):
+        return symbol in self.shard_of
+
+    def start(self):
+        for shard in self.shards:
+            if not shard.is_alive():
+                shard.start()
+
+    def history(self, symbol, tf, since=None, until=None, limit=None, fields=None, wire_format="rows", price_bin=1):
+        """Response body of the history of `symbol`, computed by its worker."""
+        return self.shard_of[symbol].call("history", symbol, tf, since, until, limit, fields, wire_format,
+                                          price_bin)
+
+    def stats(self):
+        stats = {}
+        for shard in self.shards:
+            for symbol, values in shard.call("stats").items():
+                stats[symbol] = dict(values, worker=shard.index, pid=shard.process.pid,
+                                     restarts=shard.restarts)
+        return stats
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Footprint worker for a group of symbols.")
+    parser.add_argument("symbols", nargs="+")
+    parser.add_argument("--fd", type=int, required=True, help="socket inherited from the Flask process")
+    parser.add_argument("--data-dir", required=True)
+    parser.add_argument("--timeframes", required=True)
+    parser.add_argument("--backend", choices=BACKENDS, default="csv")
+    parser.add_argument("--tick-sizes", default="", help="SYMBOL=TICK,... (PRICE_TICK for others)")
+    parser.add_argument("--config", default="{}", help="engine settings as JSON (see DEFAULT_ENGINE_CONFIG)")
+    parser.add_argument("--no-ingest", action="store_true", help="serve stored data without a websocket")
+    args = parser.parse_args(argv)
+
+    worker = SymbolWorker(Connection(args.fd), args.symbols, args.data_dir, args.timeframes.split(","),
+                          args.backend, parse_tick_sizes(args.tick_sizes), json.loads(args.config))
+    threading.Thread(target=worker.persist, daemon=True).start()
+    if not args.no_ingest:
+        worker.start_ingest()
+    worker.serve()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+# volume_profile.py
+"""
+Volume profile of footprint candles: point of control, level delta extremes and the
+value area.
+
+LevelStats keeps the POC (highest level volume) and the max/min level delta of the live
+base candle up to date per trade. Level volumes only grow, so the POC is a running
+maximum plus the set of ticks holding it. A level delta can move either way, so each
+extreme keeps the set of ticks holding it; the value only has to be looked up again
+when a trade moves the last of those ticks off it, and that lookup is deferred to the
+next read (which walks the ladder anyway to report the levels).
+
+The value area is the range of levels around the POC holding VALUE_AREA_SHARE of the
+candle's volume: starting at the POC, the larger of the next level above and below is
+added until the share is reached. It is evaluated when a summary is built, in one pass
+over the traded levels. Summaries carry it as "value_area_high" and "value_area_low";
+like the imbalance fields it is not part of the footprint files, and the history API
+evaluates it from price_levels for candles read back from disk.
+"""
+import json
+
+from ladder import VOLUME_SCALE
+
+# Share of a candle's volume inside its value area.
+VALUE_AREA_SHARE = 0.70
+# Summary fields (and extra history fields) holding it.
+VALUE_AREA_FIELDS = ("value_area_high", "value_area_low")
+
+_INF = float("inf")
+
+
+class LevelStats:
+    """Running POC and level delta extremes of one PriceLadder, updated per trade."""
+
+    __slots__ = ("max_volume", "poc_ticks", "max_delta", "max_delta_ticks", "min_delta", "min_delta_ticks")
+
+    def __init__(self):
+        self.max_volume = -1
+        self.poc_ticks = set()
+        # An empty tick set means the extreme is unknown and is looked up on the next read.
+        self.max_delta = -_INF
+        self.max_delta_ticks = set()
+        self.min_delta = _INF
+        self.min_delta_ticks = set()
+
+    def copy(self):
+        stats = LevelStats()
+        stats.max_volume = self.max_volume
+        stats.poc_ticks = set(self.poc_ticks)
+        stats.max_delta = self.max_delta
+        stats.max_delta_ticks = set(self.max_delta_ticks)
+        stats.min_delta = self.min_delta
+        stats.min_delta_ticks = set(self.min_delta_ticks)
+        return stats
+
+    @classmethod
+    def from_ladder(cls, ladder):
+        """Stats of an existing ladder (e.g. a candle restored from a checkpoint)."""
+        stats = cls()
+        stats._rescan(ladder, True)
+        return stats
+
+    def update(self, ladder, i, tick):
+        """Account for a trade that changed level `tick` (array index i) of `ladder`."""
+        buy = ladder.buy[i]
+        sell = ladder.sell[i]
+        total = buy + sell
+        if total > self.max_volume:
+            self.max_volume = total
+            self.poc_ticks = {tick}
+        elif total == self.max_volume:
+            self.poc_ticks.add(tick)
+        # A stale extreme (empty tick set) is never below the true one, so a level reaching
+        # or passing it is the new extreme.
+        delta = buy - sell
+        if delta > self.max_delta:
+            self.max_delta = delta
+            self.max_delta_ticks = {tick}
+        elif delta == self.max_delta:
+            self.max_delta_ticks.add(tick)
+        else:
+            self.max_delta_ticks.discard(tick)
+        if delta < self.min_delta:
+            self.min_delta = delta
+            self.min_delta_ticks = {tick}
+        elif delta == self.min_delta:
+            self.min_delta_ticks.add(tick)
+        else:
+            self.min_delta_ticks.discard(tick)
+
+    def extremes(self, ladder):
+        """(max level volume, max level delta, min level delta), None for an empty ladder."""
+        if not self.max_delta_ticks or not self.min_delta_ticks:
+            self._rescan(ladder, False)
+        if not self.poc_ticks:
+            return None, None, None
+        return self.max_volume, self.max_delta, self.min_delta
+
+    def _rescan(self, ladder, volumes):
+        max_volume = max_delta = min_delta = None
+        for tick, buy, sell, _, _ in ladder.levels():
+            if volumes:
+                total = buy + sell
+                if max_volume is None or total > max_volume:
+                    max_volume = total
+                    self.poc_ticks = {tick}
+                elif total == max_volume:
+                    self.poc_ticks.add(tick)
+            delta = buy - sell
+            if max_delta is None or delta > max_delta:
+                max_delta = delta
+                self.max_delta_ticks = {tick}
+            elif delta == max_delta:
+                self.max_delta_ticks.add(tick)
+            if min_delta is None or delta < min_delta:
+                min_delta = delta
+                self.min_delta_ticks = {tick}
+            elif delta == min_delta:
+                self.min_delta_ticks.add(tick)
+        if volumes and max_volume is not None:
+            self.max_volume = max_volume
+        if max_delta is not None:
+            self.max_delta = max_delta
+            self.min_delta = min_delta
+
+
+def value_area(volumes, poc, share=VALUE_AREA_SHARE):
+    """
+    (low index, high index) of the value area of level `volumes` (ascending by price)
+    around index `poc`.
+    """
+    target = share * sum(volumes)
+    lo = hi = poc
+    covered = volumes[poc]
+    last = len(volumes) - 1
+    while covered < target and (lo > 0 or hi < last):
+        below = volumes[lo - 1] if lo > 0 else -1
+        above = volumes[hi + 1] if hi < last else -1
+        if above >= below:
+            hi += 1
+            covered += above
+        else:
+            lo -= 1
+            covered += below
+    return lo, hi
+
+
+def summary_value_area(summary, share=VALUE_AREA_SHARE):
+    """
+    Value area fields of a summary: its own when it has them, else evaluated from its
+    price_levels (rows read back from disk, whose volumes are rounded as stored).
+    """
+    if "value_area_high" in summary:
+        return {name: summary[name] for name in VALUE_AREA_FIELDS}
+    # Rows written by older versions use "buy"/"sell" keys.
+    levels = sorted((float(price), float(level.get("buy_volume", level.get("buy", 0)))
+                     + float(level.get("sell_volume", level.get("sell", 0))))
+                    for price, level in (summary.get("price_levels") or {}).items())
+    if not levels:
+        return {"value_area_high": None, "value_area_low": None}
+    volumes = [volume for _, volume in levels]
+    pocs = summary.get("pocs")
+    if isinstance(pocs, str):
+        pocs = json.loads(pocs)
+    # The stored POC was found on exact volumes; the rounded ones may tie differently.
+    prices = [price for price, _ in levels]
+    poc = prices.index(float(pocs[0]["price"])) if pocs else volumes.index(max(volumes))
+    lo, hi = value_area(volumes, poc, share)
+    return {"value_area_high": levels[hi][0], "value_area_low": levels[lo][0]}
+
+
+def add_history_fields(history_cache):
+    """Serve the value area of candles as extra history fields."""
+    for name in VALUE_AREA_FIELDS:
+        def encode(tf, summary, live=False, name=name):
+            return json.dumps(summary_value_area(summary)[name])
+        # Live rows carry their own fields, so the snapshot version in the ETag covers them.
+        history_cache.add_field(name, encode, lambda: 0)
@@ -3,13 +3,41 @@ import axios from 'axios';
 
 const SERVER_URL = 'http://localhost:5000';
 
-export async function fetchHistoricalFootprint(timeframe) {
+export async function fetchHistoricalFootprint(timeframe, params = {}) {
   try {
-    // We call the endpoint that returns all candle summary rows from the CSV.
-    const response = await axios.get(`${SERVER_URL}/api/footprint/history/${timeframe}`);
+    // We call the endpoint that returns candle summary rows.
+    // Optional params: since / until (bucket, unix seconds), limit, fields
+    // (e.g. 'bucket,open,high,low,close'), format ('json' for numbers as numbers)
+    // and bin (price step of price_levels, e.g. 0.25).
+    const response = await axios.get(`${SERVER_URL}/api/footprint/history/${timeframe}`, { params });
     return response.data; // Expected to be an array of candle summary objects.
   } catch (error) {
     console.error("Error fetching historical footprint:", error);
     return [];
   }
 }
+
+export async function fetchLiveFootprint(timeframe) {
+  try {
+    // The in-progress candle with typed values, its value area and imbalances
+    // (null while no candle is in progress).
+    const response = await axios.get(`${SERVER_URL}/api/footprint/live/${timeframe}`);
+    return response.data.candle;
+  } catch (error) {
+    console.error("Error fetching live footprint:", error);
+    return null;
+  }
+}
+
+// Open a Server-Sent Events stream for a timeframe. The server first sends a
+// "snapshot" event with the history, then "update" events for the live candle
+// and "finalized" events for every closed candle.
+export function openFootprintStream(timeframe, { onSnapshot, onCandle }) {
+  const source = new EventSource(`${SERVER_URL}/api/footprint/stream/${timeframe}`);
+  source.addEventListener('snapshot', (e) => onSnapshot(JSON.parse(e.data).candles));
+  const handleCandle = (e) => onCandle(JSON.parse(e.data).candle);
+  source.addEventListener('update', handleCandle);
+  source.addEventListener('finalized', handleCandle);
+  source.onerror = (error) => console.error("Footprint stream error:", error);
+  return source;
+}
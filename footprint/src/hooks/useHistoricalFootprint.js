@@ -1,27 +1,35 @@
 // src/hooks/useHistoricalFootprint.js
 import { useState, useEffect } from 'react';
-import { fetchHistoricalFootprint } from '../api/flask_api';
+import { openFootprintStream } from '../api/flask_api';
+
+// Merge a candle pushed by the server into the list: replace the candle with the
+// same bucket (the live candle) or append it when it is newer.
+function mergeCandle(previous, candle) {
+  const bucket = parseInt(candle.bucket, 10);
+  const last = previous.length ? parseInt(previous[previous.length - 1].bucket, 10) : -Infinity;
+  if (bucket > last) return previous.concat([candle]);
+  const index = previous.findIndex((item) => parseInt(item.bucket, 10) === bucket);
+  if (index === -1) return previous;
+  const next = previous.slice();
+  next[index] = candle;
+  return next;
+}
 
 export default function useHistoricalFootprint(timeframe) {
   const [footprints, setFootprints] = useState([]);
 
-  // Load history once when timeframe changes.
-  useEffect(() => {
-    async function loadHistory() {
-      const data = await fetchHistoricalFootprint(timeframe);
-      console.log("Loaded historical footprint data for", timeframe, data);
-      setFootprints(data);
-    }
-    loadHistory();
-  }, [timeframe]);
-
-  // Poll every second for real-time updates.
+  // Subscribe to the live stream when the timeframe changes. The snapshot
+  // replaces the history; afterwards only changed candles are pushed.
   useEffect(() => {
-    const intervalId = setInterval(async () => {
-      const data = await fetchHistoricalFootprint(timeframe);
-      setFootprints(data);
-    }, 1000);
-    return () => clearInterval(intervalId);
+    setFootprints([]);
+    const source = openFootprintStream(timeframe, {
+      onSnapshot: (candles) => {
+        console.log("Loaded historical footprint data for", timeframe, candles);
+        setFootprints(candles);
+      },
+      onCandle: (candle) => setFootprints((previous) => mergeCandle(previous, candle)),
+    });
+    return () => source.close();
   }, [timeframe]);
 
   return footprints;
@@ -2,19 +2,56 @@ import websocket
 import json
 import csv
 import os
-from datetime import datetime
+import io
+import bz2
+import sys
+import gzip
+import lzma
+import time
+import atexit
+import signal
+import argparse
+import threading
+from datetime import datetime, timezone
+
+try:
+    from compression import zstd  # Python 3.14+
+except ImportError:  # zstd is optional; the other codecs are always available.
+    zstd = None
 
 # === CONFIG ===
 SYMBOL = "XMRUSDT"
 WS_URL = f"wss://fstream.binance.com/ws/{SYMBOL.lower()}@trade"
 CSV_FILENAME = f"tick_data_{SYMBOL}_{datetime.now().strftime('%Y-%m-%d')}.csv"
+CSV_HEADER = ["timestamp_ms", "price", "quantity", "side", "symbol", "trade_id"]
+
+# Recorder defaults: flush after FLUSH_ROWS buffered trades or FLUSH_INTERVAL seconds,
+# whichever comes first; trades arriving while MAX_BUFFER are queued are dropped (and counted).
+FLUSH_ROWS = 1000
+FLUSH_INTERVAL = 1.0
+MAX_BUFFER = 200000
+STATS_INTERVAL = 60.0
+
+# File name period per rotation mode (UTC, from the trade time).
+ROTATIONS = {"none": None, "daily": "%Y-%m-%d", "hourly": "%Y-%m-%d_%H"}
+# Compression per mode: (file suffix, function compressing one flushed batch). Every batch
+# is a complete gzip member / bz2, xz or zstd stream; concatenated they form a valid file,
+# so a file is readable up to the last flush even if the recorder is killed.
+COMPRESSORS = {
+    "none": ("", None),
+    "gzip": (".gz", gzip.compress),
+    "bz2": (".bz2", bz2.compress),
+    "xz": (".xz", lzma.compress),
+}
+if zstd is not None:
+    COMPRESSORS["zstd"] = (".zst", zstd.compress)
 
 # === Ensure CSV file with headers exists ===
 def init_csv_file():
     if not os.path.exists(CSV_FILENAME):
         with open(CSV_FILENAME, mode='w', newline='') as file:
             writer = csv.writer(file)
-            writer.writerow(["timestamp_ms", "price", "quantity", "side", "symbol", "trade_id"])
+            writer.writerow(CSV_HEADER)
 
 # === Parse and save trade data ===
 def save_trade_to_csv(data):
@@ -31,10 +68,167 @@ def save_trade_to_csv(data):
         writer = csv.writer(file)
         writer.writerow(row)
 
+# === Buffered recorder ===
+class TickRecorder:
+    """
+    Records trades in the save_trade_to_csv format without touching the disk per trade:
+    record() only appends to a bounded in-memory buffer, and a flusher thread writes the
+    buffer in batches (every flush_rows trades or flush_interval seconds) to
+    tick_data_{SYMBOL}_{period}.csv[.gz|.bz2|.xz|.zst], one file per day or hour.
+    close() flushes whatever is still buffered.
+    """
+
+    def __init__(self, symbol=SYMBOL, directory=".", rotate="daily", compress="none",
+                 flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL, max_buffer=MAX_BUFFER,
+                 fsync=False, stats_interval=STATS_INTERVAL):
+        self.symbol = symbol
+        self.directory = directory
+        self.period_format = ROTATIONS[rotate]
+        self.suffix, self.compressor = COMPRESSORS[compress]
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.fsync = fsync
+        self.stats_interval = stats_interval
+        # Without rotation the file is named after the start date, like CSV_FILENAME.
+        self.fixed_period = datetime.now().strftime('%Y-%m-%d')
+        os.makedirs(directory, exist_ok=True)
+
+        self.recorded = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.max_queued = 0
+        self.current_file = None
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = None
+
+    def filename(self, timestamp_ms):
+        if self.period_format is None:
+            period = self.fixed_period
+        else:
+            period = datetime.fromtimestamp(timestamp_ms / 1000, timezone.utc).strftime(self.period_format)
+        return os.path.join(self.directory, f"tick_data_{self.symbol}_{period}.csv{self.suffix}")
+
+    def record(self, data):
+        """Queue one @trade message. Returns False if the buffer was full and it was dropped."""
+        row = (data["T"], data["p"], data["q"], data["m"], data["s"], data["t"])
+        with self._lock:
+            queued = len(self._buffer)
+            if queued >= self.max_buffer:
+                self.dropped += 1
+                return False
+            self._buffer.append(row)
+            self.recorded += 1
+        if queued + 1 >= self.flush_rows:
+            self._wake.set()
+        return True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        last_stats = time.monotonic()
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+            if self.stats_interval and time.monotonic() - last_stats >= self.stats_interval:
+                last_stats = time.monotonic()
+                print(self.status())
+
+    def flush(self):
+        """Write every buffered trade; returns the number written."""
+        with self._write_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+                self.max_queued = max(self.max_queued, len(rows))
+            if not rows:
+                return 0
+            # Group by target file: a batch may straddle a rotation boundary.
+            batches = {}
+            for row in rows:
+                batches.setdefault(self.filename(row[0]), []).append(row)
+            written = 0
+            for path, batch in batches.items():
+                try:
+                    self._write(path, batch)
+                    written += len(batch)
+                except OSError as exc:
+                    print(f"Recorder could not write {len(batch)} trades to {path}: {exc}")
+                    with self._lock:
+                        self.dropped += len(batch)
+            with self._lock:
+                self.flushed += written
+                self.flushes += 1
+            return written
+
+    def _write(self, path, batch):
+        text = io.StringIO()
+        writer = csv.writer(text)
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        if new_file:
+            writer.writerow(CSV_HEADER)
+        writer.writerows(
+            [timestamp_ms, float(price), float(quantity), "sell" if is_seller else "buy", symbol, trade_id]
+            for timestamp_ms, price, quantity, is_seller, symbol, trade_id in batch
+        )
+        data = text.getvalue().encode()
+        if self.compressor is not None:
+            data = self.compressor(data)
+        with open(path, "ab") as f:
+            f.write(data)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        if path != self.current_file:
+            self.current_file = path
+            print(f"Recording to {path}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "recorded": self.recorded,
+                "flushed": self.flushed,
+                "queued": len(self._buffer),
+                "max_queued": self.max_queued,
+                "dropped": self.dropped,
+                "flushes": self.flushes,
+                "file": self.current_file,
+            }
+
+    def status(self):
+        stats = self.stats()
+        return ("Recorder: {recorded} recorded, {flushed} written in {flushes} flushes, "
+                "{queued} queued (peak {max_queued}), {dropped} dropped".format(**stats))
+
+    def close(self):
+        """Stop the flusher and write everything still buffered. Safe to call twice."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        print(self.status())
+
+
+# The recorder used by on_message; None records with save_trade_to_csv.
+recorder = None
+
 # === WebSocket Callbacks ===
 def on_message(ws, message):
     trade = json.loads(message)
-    save_trade_to_csv(trade)
+    if recorder is not None:
+        recorder.record(trade)
+    else:
+        save_trade_to_csv(trade)
 
 def on_error(ws, error):
     print("WebSocket error:", error)
@@ -43,11 +237,41 @@ def on_close(ws, close_status_code, close_msg):
     print("WebSocket closed")
 
 def on_open(ws):
-    print(f"Connected to {WS_URL} and writing to {CSV_FILENAME}")
+    if recorder is not None:
+        print(f"Connected to {WS_URL} and recording to {recorder.directory}")
+    else:
+        print(f"Connected to {WS_URL} and writing to {CSV_FILENAME}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=f"Record {SYMBOL} trades to tick CSV files.")
+    parser.add_argument("--per-trade", action="store_true",
+                        help=f"append every trade to {CSV_FILENAME} directly (no buffering or rotation)")
+    parser.add_argument("--dir", default=".", help="directory for the tick files")
+    parser.add_argument("--rotate", choices=list(ROTATIONS), default="daily")
+    parser.add_argument("--compress", choices=list(COMPRESSORS), default="none")
+    parser.add_argument("--flush-rows", type=int, default=FLUSH_ROWS)
+    parser.add_argument("--flush-interval", type=float, default=FLUSH_INTERVAL)
+    parser.add_argument("--max-buffer", type=int, default=MAX_BUFFER)
+    parser.add_argument("--fsync", action="store_true", help="fsync every flush")
+    parser.add_argument("--stats-interval", type=float, default=STATS_INTERVAL,
+                        help="seconds between recorder status lines (0 = only on exit)")
+    return parser.parse_args(argv)
+
+def handle_sigterm(signum, frame):
+    # Leave through SystemExit so that the buffered trades are flushed.
+    sys.exit(0)
 
 # === Main ===
 if __name__ == "__main__":
-    init_csv_file()
+    args = parse_args()
+    if args.per_trade:
+        init_csv_file()
+    else:
+        recorder = TickRecorder(SYMBOL, args.dir, args.rotate, args.compress, args.flush_rows,
+                                args.flush_interval, args.max_buffer, args.fsync, args.stats_interval)
+        recorder.start()
+        atexit.register(recorder.close)
+        signal.signal(signal.SIGTERM, handle_sigterm)
     ws = websocket.WebSocketApp(
         WS_URL,
         on_open=on_open,
@@ -55,4 +279,8 @@ if __name__ == "__main__":
         on_error=on_error,
         on_close=on_close
     )
-    ws.run_forever()
+    try:
+        ws.run_forever()
+    finally:
+        if recorder is not None:
+            recorder.close()
@@ -0,0 +1,206 @@
+"""
+Local stand-in for the Binance futures @depth stream and REST depth snapshot, so that
+orderbook.py (in flask_app/) can be run and checked without network access.
+
+    python mock_depth.py --rate 500 --gap-rate 0.01 --snapshot-delay 0.5
+    python ../flask_app/orderbook.py XMRUSDT --ws-url "ws://localhost:8765/stream?streams=xmrusdt@depth" \
+        --snapshot-url "http://localhost:8766/fapi/v1/depth?symbol=XMRUSDT&limit=1000"
+
+The mock keeps a true book, sends its diffs with Binance's U/u/pu numbering and can
+skip events (--gap-rate) and answer snapshots late (--snapshot-delay) to force resyncs.
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+import websockets
+
+
+class MockDepthBook:
+    """A random order book around a fixed price, changed a few levels per event."""
+
+    def __init__(self, symbol: str = "XMRUSDT", price: float = 215.0, tick_size: float = 0.01,
+                 levels: int = 200, seed: int = 7):
+        self.symbol = symbol
+        self.tick_size = tick_size
+        self.levels = levels
+        self.rng = random.Random(seed)
+        self.center = round(price / tick_size)
+        self.bids: Dict[int, str] = {}
+        self.asks: Dict[int, str] = {}
+        for i in range(1, levels + 1):
+            self.bids[self.center - i] = self._quantity()
+            self.asks[self.center + i] = self._quantity()
+        self.update_id = 1000
+        self.lock = threading.Lock()
+
+    def _quantity(self) -> str:
+        return f"{self.rng.uniform(0.001, 50.0):.3f}"
+
+    def _price(self, tick: int) -> str:
+        return f"{tick * self.tick_size:.2f}"
+
+    def next_event(self, changes: int = 5) -> dict:
+        """Change up to `changes` levels and return the depthUpdate event describing it."""
+        rng = self.rng
+        with self.lock:
+            bids: Dict[int, str] = {}
+            asks: Dict[int, str] = {}
+            for _ in range(changes):
+                distance = min(int(rng.expovariate(0.05)) + 1, self.levels)
+                quantity = "0.000" if rng.random() < 0.2 else self._quantity()
+                if rng.random() < 0.5:
+                    side, updates, tick = self.bids, bids, self.center - distance
+                else:
+                    side, updates, tick = self.asks, asks, self.center + distance
+                if quantity == "0.000":
+                    side.pop(tick, None)
+                else:
+                    side[tick] = quantity
+                updates[tick] = quantity
+            previous = self.update_id
+            first = previous + 1
+            self.update_id += rng.randint(1, 3)
+            now = int(time.time() * 1000)
+            return {
+                "e": "depthUpdate", "E": now, "T": now, "s": self.symbol,
+                "U": first, "u": self.update_id, "pu": previous,
+                "b": [[self._price(t), q] for t, q in sorted(bids.items(), reverse=True)],
+                "a": [[self._price(t), q] for t, q in sorted(asks.items())],
+            }
+
+    def snapshot(self, limit: int = 1000) -> dict:
+        with self.lock:
+            now = int(time.time() * 1000)
+            return {
+                "lastUpdateId": self.update_id, "E": now, "T": now,
+                "bids": [[self._price(t), self.bids[t]] for t in sorted(self.bids, reverse=True)[:limit]],
+                "asks": [[self._price(t), self.asks[t]] for t in sorted(self.asks)[:limit]],
+            }
+
+    def levels_as_floats(self):
+        """(bids, asks) as {price: quantity} with non-zero quantities, to compare with a client."""
+        with self.lock:
+            bids = {round(t * self.tick_size, 10): float(q) for t, q in self.bids.items()}
+            asks = {round(t * self.tick_size, 10): float(q) for t, q in self.asks.items()}
+        return bids, asks
+
+
+class MockDepthServer:
+    """Serves a MockDepthBook: a websocket depth stream and an HTTP snapshot endpoint."""
+
+    def __init__(self, book: MockDepthBook, rate: float = 100.0, gap_rate: float = 0.0,
+                 snapshot_delay: float = 0.0, seed: int = 11):
+        self.book = book
+        self.rate = rate
+        self.gap_rate = gap_rate
+        self.snapshot_delay = snapshot_delay
+        self.rng = random.Random(seed)
+        self.clients = set()
+        self.events_sent = 0
+        self.events_skipped = 0
+        self.snapshots_served = 0
+        self.running = True
+        self.ws_server = None
+        self.http_server: Optional[ThreadingHTTPServer] = None
+
+    async def _handler(self, connection):
+        self.clients.add(connection)
+        try:
+            await connection.wait_closed()
+        finally:
+            self.clients.discard(connection)
+
+    async def produce(self, count: Optional[int] = None):
+        """Generate events at `rate` per second (`count` of them, or until stopped)."""
+        interval = 1.0 / self.rate
+        stream = f"{self.book.symbol.lower()}@depth"
+        produced = 0
+        while self.running and (count is None or produced < count):
+            event = self.book.next_event()
+            produced += 1
+            if self.rng.random() < self.gap_rate:
+                self.events_skipped += 1
+            else:
+                message = json.dumps({"stream": stream, "data": event})
+                for connection in list(self.clients):
+                    try:
+                        await connection.send(message)
+                    except websockets.exceptions.ConnectionClosed:
+                        self.clients.discard(connection)
+                self.events_sent += 1
+            await asyncio.sleep(interval)
+
+    def _http_handler(self):
+        server = self
+
+        class SnapshotHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                snapshot = server.book.snapshot(int(query.get("limit", ["1000"])[0]))
+                # Answer late: the stream moves on while the client waits.
+                time.sleep(server.snapshot_delay)
+                body = json.dumps(snapshot).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                server.snapshots_served += 1
+
+            def log_message(self, format, *args):
+                pass
+
+        return SnapshotHandler
+
+    async def start(self, host: str = "localhost", ws_port: int = 8765, http_port: int = 8766):
+        """Start both servers; ports 0 pick free ports. Returns (ws_url, snapshot_url)."""
+        self.ws_server = await websockets.serve(self._handler, host, ws_port)
+        ws_port = self.ws_server.sockets[0].getsockname()[1]
+        self.http_server = ThreadingHTTPServer((host, http_port), self._http_handler())
+        http_port = self.http_server.server_address[1]
+        threading.Thread(target=self.http_server.serve_forever, daemon=True).start()
+        symbol = self.book.symbol
+        return (f"ws://{host}:{ws_port}/stream?streams={symbol.lower()}@depth",
+                f"http://{host}:{http_port}/fapi/v1/depth?symbol={symbol}&limit=1000")
+
+    async def stop(self):
+        self.running = False
+        if self.ws_server is not None:
+            self.ws_server.close()
+            await self.ws_server.wait_closed()
+        if self.http_server is not None:
+            self.http_server.shutdown()
+            self.http_server.server_close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Mock Binance futures depth stream and snapshot endpoint.")
+    parser.add_argument("--symbol", default="XMRUSDT")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8765, help="websocket port")
+    parser.add_argument("--http-port", type=int, default=8766, help="snapshot port")
+    parser.add_argument("--rate", type=float, default=100.0, help="depth events per second")
+    parser.add_argument("--gap-rate", type=float, default=0.0, help="share of events not sent")
+    parser.add_argument("--snapshot-delay", type=float, default=0.0, help="seconds before a snapshot is answered")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    server = MockDepthServer(MockDepthBook(args.symbol, seed=args.seed), args.rate, args.gap_rate,
+                             args.snapshot_delay)
+    ws_url, snapshot_url = await server.start(args.host, args.port, args.http_port)
+    print(f"Depth stream: {ws_url}")
+    print(f"Snapshots:    {snapshot_url}")
+    await server.produce()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\nShutting down...")
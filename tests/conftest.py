@@ -0,0 +1,48 @@
+# conftest.py
+"""
+The Flask app and the python_footprint scripts import their modules as siblings (they
+run from their own directories), so both directories are put on sys.path.
+
+Tests of the HTTP API share one imported app.py (app_module) and feed its engine with
+add_trades.
+"""
+import os
+import sys
+import random
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for directory in ("flask_app", "python_footprint"):
+    path = os.path.join(ROOT, directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# Monday 2025-04-14 00:00:00 UTC, aligned on every timeframe of the app.
+START_MS = 1744588800000
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    """app.py imported against a scratch data directory, without background threads or depth."""
+    from benchmark import load_app, unload_app
+    module = load_app(str(tmp_path_factory.mktemp("data")))
+    yield module
+    unload_app(module)
+
+
+def add_trades(engine, minutes, per_minute=20, price=215.0, seed=0):
+    """
+    Trades over `minutes` base candles, starting in the minute after the engine's latest
+    trade, so tests sharing an engine stay in time order. Returns the first trade's bucket.
+    """
+    rng = random.Random(seed)
+    live = engine.current_data[engine.base_tf]
+    start = START_MS if live is None else (live.bucket + 60) * 1000
+    for minute in range(minutes):
+        for i in range(per_minute):
+            price = round(price + rng.choice((-0.01, 0, 0.01)), 2)
+            engine.add_trade(start + minute * 60000 + i * (60000 // per_minute), price,
+                             rng.choice((0.01, 0.5, 1.25)), rng.random() < 0.5)
+    return start // 1000
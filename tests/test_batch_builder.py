@@ -0,0 +1,26 @@
+# test_batch_builder.py
+import random
+
+from batch_builder import build_footprints, compare_with_replay, load_ticks
+
+
+def write_ticks(path, count=5000, seed=3):
+    rng = random.Random(seed)
+    timestamp, price = 1744740000000, 215.0
+    with open(path, "w") as f:
+        f.write("timestamp_ms,price,quantity,side,symbol,trade_id\n")
+        for i in range(count):
+            timestamp += rng.randint(1, 400)
+            price = round(price + rng.choice((-0.02, -0.01, 0, 0, 0.01, 0.02)), 2)
+            side = "sell" if rng.random() < 0.5 else "buy"
+            f.write(f"{timestamp},{price},{rng.random() * 3:.3f},{side},XMRUSDT,{i}\n")
+
+
+def test_batch_matches_streaming_replay(tmp_path):
+    path = str(tmp_path / "tick_data_XMRUSDT_2025-04-15.csv")
+    write_ticks(path)
+    timeframes = ["1m", "5m", "15m"]
+    result = build_footprints(load_ticks([path]), timeframes, 0.01)
+    assert len(result.finalized_data["1m"]) > 10
+    mismatches, _ = compare_with_replay([path], result, timeframes, 0.01)
+    assert mismatches == 0
@@ -0,0 +1,27 @@
+# test_binning.py
+import pytest
+
+from binning import bin_ticks, binned_levels
+
+
+def test_bin_ticks():
+    assert bin_ticks(0.25, 0.01) == 25
+    assert bin_ticks(0.01, 0.01) == 1
+
+
+@pytest.mark.parametrize("size", [0.0, -0.25, 0.015, float("inf"), float("-inf"), float("nan"), 1e-9])
+def test_bin_ticks_rejects(size):
+    with pytest.raises(ValueError, match="bin must be a positive multiple of the tick size 0.01"):
+        bin_ticks(size, 0.01)
+
+
+def test_binned_levels_from_stored_rows():
+    summary = {"price_levels": {
+        "215.0": {"buy_volume": 1.5, "sell_volume": 0.5, "buy_trades": 2, "sell_trades": 1},
+        "215.24": {"buy": 1.0, "sell": 2.0},
+        "215.25": {"buy_volume": 0.25, "sell_volume": 0.0, "buy_trades": 1, "sell_trades": 0},
+    }}
+    assert binned_levels(summary, 25, 0.01) == {
+        215.0: {"buy_volume": 2.5, "sell_volume": 2.5, "buy_trades": 2, "sell_trades": 1},
+        215.25: {"buy_volume": 0.25, "sell_volume": 0.0, "buy_trades": 1, "sell_trades": 0},
+    }
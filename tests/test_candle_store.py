@@ -0,0 +1,112 @@
+# test_candle_store.py
+import os
+import random
+import subprocess
+import sys
+
+import pytest
+
+from candle_store import CANDLE_RECORD, HEADER, CandleStore, StoredCandles, load_columns, np
+from conftest import ROOT
+from footprint_engine import FootprintEngine
+from persistence import CSV_FIELDS, encode_rows, summary_to_record, summary_to_row
+from storage import FootprintStorage
+
+
+def finalized_candles(trades=8000, seed=12):
+    rng = random.Random(seed)
+    engine = FootprintEngine(["1m"])
+    timestamp, price = 1744588800000, 215.0
+    for _ in range(trades):
+        timestamp += rng.randint(1, 400)
+        price = round(price + rng.choice((-0.01, 0, 0.01)), 2)
+        engine.add_trade(timestamp, price, rng.choice((0.001, 0.013, 1.2345678, 3.33333333)), rng.random() < 0.5)
+    return list(engine.finalized_data["1m"])
+
+
+def records(summaries):
+    return [summary_to_record(summary) for summary in summaries]
+
+
+def test_write_and_mmap_read_round_trip(tmp_path):
+    summaries = finalized_candles()
+    prefix = str(tmp_path / "footprint_1m")
+    store = CandleStore(prefix)
+    store.append(summaries[:10])
+    # Reads see appends without reopening (the map is renewed when the files grew).
+    assert records(store.read(0, 10)) == records(summaries[:10])
+    store.append(summaries[10:])
+    assert len(store) == len(summaries)
+    assert store.bucket(len(summaries) - 1) == summaries[-1]["bucket"]
+    assert records(store.read(0, len(store))) == records(summaries)
+    store.close()
+
+    reopened = CandleStore(prefix)
+    assert records(reopened.read(5, 15)) == records(summaries[5:15])
+    candles = StoredCandles(reopened)
+    assert records(candles[-3:]) == records(summaries[-3:])
+    assert summary_to_record(candles[7]) == summary_to_record(summaries[7])
+    reopened.close()
+
+
+def test_torn_append_is_ignored(tmp_path):
+    summaries = finalized_candles(2000)
+    prefix = str(tmp_path / "footprint_1m")
+    store = CandleStore(prefix)
+    store.append(summaries)
+    store.close()
+    with open(prefix + ".fpc", "ab") as f:
+        f.write(b"\0" * (CANDLE_RECORD.size // 2))
+    store = CandleStore(prefix)
+    assert len(store) == len(summaries)
+    assert os.path.getsize(prefix + ".fpc") == HEADER.size + len(summaries) * CANDLE_RECORD.size
+    store.close()
+
+
+@pytest.mark.skipif(np is None, reason="needs numpy")
+def test_load_columns(tmp_path):
+    summaries = finalized_candles(2000)
+    prefix = str(tmp_path / "footprint_1m")
+    store = CandleStore(prefix)
+    store.append(summaries)
+    store.close()
+    candles, levels = load_columns(prefix)
+    assert candles["bucket"].tolist() == [summary["bucket"] for summary in summaries]
+    assert candles["close"].tolist() == [summary["close"] for summary in summaries]
+    assert int(candles["level_count"].sum()) == len(levels)
+
+
+def run_cli(*args):
+    return subprocess.run([sys.executable, os.path.join(ROOT, "flask_app", "candle_store.py"), *args],
+                          capture_output=True, text=True, check=True).stdout
+
+
+def test_import_export_cli(tmp_path):
+    summaries = finalized_candles()
+    csv_path = str(tmp_path / "footprint_1m.csv")
+    text = encode_rows([CSV_FIELDS] + [summary_to_row(summary) for summary in summaries])
+    with open(csv_path, "wb") as f:
+        f.write(text)
+    prefix = str(tmp_path / "store" / "footprint_1m")
+    os.makedirs(os.path.dirname(prefix))
+    assert run_cli("import", csv_path, prefix).strip() == f"imported {len(summaries)} candles"
+    exported = str(tmp_path / "exported.csv")
+    assert run_cli("export", prefix, exported).strip() == f"exported {len(summaries)} candles"
+    with open(exported, "rb") as f:
+        assert f.read() == text
+
+
+def test_binary_backend_imports_csv_history(tmp_path):
+    summaries = finalized_candles(3000)
+    with open(str(tmp_path / "footprint_1m.csv"), "wb") as f:
+        f.write(encode_rows([CSV_FIELDS] + [summary_to_row(summary) for summary in summaries]))
+    engine = FootprintEngine(["1m"])
+    storage = FootprintStorage(engine, str(tmp_path), "binary")
+    assert records(engine.finalized_data["1m"][:]) == records(summaries)
+    storage.close()
+    assert os.path.exists(str(tmp_path / "footprint_1m.fpc"))
+
+
+def test_unknown_backend_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        FootprintStorage(FootprintEngine(["1m"]), str(tmp_path), "parquet")
@@ -0,0 +1,73 @@
+# test_depth.py
+import json
+
+from depth import DepthService, DepthStore, DepthTracker
+from footprint_engine import FootprintEngine
+from orderbook import OrderBookManager
+
+
+def snapshot(update_id, bids, asks=(), time_ms=0):
+    return {"lastUpdateId": update_id, "T": time_ms,
+            "bids": [[price, quantity] for price, quantity in bids],
+            "asks": [[price, quantity] for price, quantity in asks]}
+
+
+def event(first, last, previous, bids=(), asks=(), time_ms=0):
+    return {"U": first, "u": last, "pu": previous, "T": time_ms, "E": time_ms,
+            "b": [list(level) for level in bids], "a": [list(level) for level in asks]}
+
+
+def test_first_snapshot_is_starting_state():
+    manager = OrderBookManager("BTCUSDT")
+    tracker = DepthTracker(manager, ["1m"])
+    manager.load_snapshot(snapshot(10, [("100.00", "3")], time_ms=60_000))
+    manager.apply_event(event(9, 11, 8, bids=[("100.00", "1")], time_ms=61_000))
+    manager.apply_event(event(12, 12, 11, bids=[("100.00", "7")], time_ms=62_000))
+    depth = tracker.candle_depth("1m", 60, ["100.0"])
+    assert depth["100.0"]["bid"] == [3, 7, 1, 7]
+    assert depth["100.0"]["ask"] == [0, 0, 0, 0]
+
+
+def test_resync_reports_changed_levels():
+    manager = OrderBookManager("BTCUSDT")
+    tracker = DepthTracker(manager, ["1m"])
+    manager.load_snapshot(snapshot(10, [("100.00", "3"), ("99.99", "2")], time_ms=60_000))
+    manager.load_snapshot(snapshot(20, [("100.00", "5")], time_ms=61_000))
+    depth = tracker.candle_depth("1m", 60, ["100.0", "99.99"])
+    assert depth["100.0"]["bid"] == [3, 5, 3, 5]
+    assert depth["99.99"]["bid"] == [2, 0, 0, 2]
+
+
+def test_depth_before_sync_is_none():
+    manager = OrderBookManager("BTCUSDT")
+    tracker = DepthTracker(manager, ["1m"])
+    assert tracker.candle_depth("1m", 60, ["100.0"]) is None
+
+
+def test_end_is_quantity_before_next_candle():
+    manager = OrderBookManager("BTCUSDT")
+    tracker = DepthTracker(manager, ["1m"])
+    manager.load_snapshot(snapshot(10, [], [("100.01", "4")], time_ms=60_000))
+    manager.apply_event(event(9, 11, 8, asks=[("100.01", "6")], time_ms=61_000))
+    manager.apply_event(event(12, 12, 11, asks=[("100.01", "2")], time_ms=125_000))
+    assert tracker.candle_depth("1m", 60, ["100.01"], final=True)["100.01"]["ask"] == [4, 6, 4, 6]
+    # Changes to a finalized candle are not tracked any more.
+    assert list(tracker.windows["1m"]) == [120]
+    assert tracker.candle_depth("1m", 120, ["100.01"])["100.01"]["ask"] == [6, 2, 2, 6]
+
+
+def test_finalized_candles_get_depth_field(tmp_path):
+    engine = FootprintEngine(["1m"])
+    manager = OrderBookManager("BTCUSDT")
+    service = DepthService(engine, "BTCUSDT", str(tmp_path), manager=manager)
+    engine.on_finalize.append(service.on_finalize)
+    manager.load_snapshot(snapshot(10, [("100.00", "3")], [("100.01", "2")], time_ms=60_000))
+    engine.add_trade(60_500, 100.0, 0.5, True)
+    manager.apply_event(event(9, 11, 8, bids=[("100.00", "2.5")], time_ms=60_500))
+    engine.add_trade(121_000, 100.01, 1.0, False)
+    summary = engine.finalized_data["1m"][-1]
+    assert summary["bucket"] == 60
+    depth = json.loads(service.depth_text("1m", summary))
+    assert depth == {"100.0": {"bid": [3, 2.5, 2.5, 3], "ask": [0, 0, 0, 0]}}
+    service.flush()
+    assert DepthStore(str(tmp_path), "1m").get(60) == json.dumps(depth)
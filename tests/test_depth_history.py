@@ -0,0 +1,99 @@
+# test_depth_history.py
+import sys
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from depth import DepthService
+from depth_history import DepthHistory
+from footprint_engine import FootprintEngine
+from orderbook import OrderBookManager
+
+BAND = 3
+
+
+def add_sample(history, i):
+    """Sample i: mid around tick 1000 + i, quantity i at every tick of the band."""
+    bid, ask = 1000 + i, 1001 + i
+    ticks = list(range(bid - BAND, ask + BAND + 1))
+    history.add(i * 1000, bid, ask, ticks, [float(i)] * len(ticks))
+
+
+def test_ring_wraps_around_at_fixed_memory():
+    history = DepthHistory(band=BAND, capacity=8, downsample=1, spill_chunk=2)
+    memory = history.stats()["memory_bytes"]
+    for i in range(21):
+        add_sample(history, i)
+    # Without a directory the oldest samples are dropped two at a time.
+    assert (len(history), history.samples, history.spilled) == (7, 21, 14)
+    assert history.stats()["memory_bytes"] == memory
+    times, prices, best, matrix = history.matrix()
+    assert times.tolist() == [i * 1000 for i in range(14, 21)]
+    assert best[0].tolist() == [10.14, 10.15]
+    for row, i in zip(matrix, range(14, 21)):
+        traded = row[row > 0]
+        assert len(traded) == 2 * BAND + 1 and set(traded.tolist()) == {float(i)}
+    assert history.matrix(16000, 17000)[0].tolist() == [16000, 17000]
+
+
+def test_spilled_samples_are_downsampled_and_reloaded(tmp_path):
+    directory = str(tmp_path / "history")
+    history = DepthHistory(directory, band=BAND, capacity=8, downsample=2, spill_chunk=4)
+    for i in range(13):
+        add_sample(history, i)
+    # Two spills of 4 samples, averaged in pairs: the rest is still in memory.
+    assert (len(history), history.stats()["files"]) == (5, 2)
+    times, prices, best, matrix = history.matrix()
+    assert times.tolist() == [1000, 3000, 5000, 7000] + [i * 1000 for i in range(8, 13)]
+    # The pair (0, 1) is aligned on the ticks of sample 1 before averaging.
+    first = dict(zip(prices.tolist(), matrix[0].tolist()))
+    assert first[round(1001 * 0.01 - BAND * 0.01, 2)] == 0.5
+    assert first[round(1001 * 0.01, 2)] == 0.5
+    # Spilled and in-memory samples keep their price grid (times x prices).
+    assert matrix.shape == (9, len(prices))
+
+    history.close()
+    assert (len(history), history.stats()["files"]) == (0, 3)
+    reloaded = DepthHistory(directory, band=BAND, capacity=8, downsample=2)
+    again = reloaded.matrix()
+    assert again[0].tolist() == times.tolist()
+    assert np.array_equal(again[3], matrix) and np.array_equal(again[1], prices)
+    assert reloaded.matrix(7000, 9000)[0].tolist() == [7000, 8000, 9000]
+
+
+def test_service_close_spills_the_history(tmp_path):
+    history = DepthHistory(str(tmp_path / "depth_history"), band=BAND, capacity=16)
+    manager = OrderBookManager("XMRUSDT")
+    service = DepthService(FootprintEngine(["1m"]), "XMRUSDT", str(tmp_path), history=history)
+    assert service.manager.history is history
+    service = DepthService(FootprintEngine(["1m"]), "XMRUSDT", str(tmp_path), manager=manager, history=history)
+    manager.load_snapshot({"lastUpdateId": 1, "bids": [["215.00", "2"]], "asks": [["215.02", "3"]]})
+    assert history.sample(manager, 60000)
+    assert service.stats()["history"]["in_memory"] == 1
+    service.close()
+    assert history.stats()["files"] == 1
+    assert DepthHistory(str(tmp_path / "depth_history"), band=BAND).matrix()[0].tolist() == [60000]
+
+
+def test_heatmap_route(app_module, monkeypatch):
+    history = DepthHistory(band=BAND, capacity=16)
+    for i in range(5):
+        add_sample(history, i)
+    client = app_module.app.test_client()
+    assert client.get("/api/depth/heatmap").status_code == 404
+    monkeypatch.setattr(app_module, "depth_history", history)
+    response = client.get("/api/depth/heatmap?start=1000&end=3000")
+    assert response.status_code == 200
+    body = response.json
+    assert body["times"] == [1000, 2000, 3000]
+    assert (body["best_bid"][0], body["best_ask"][0]) == (10.01, 10.02)
+    assert len(body["quantities"]) == 3 and len(body["quantities"][0]) == len(body["prices"])
+    assert client.get("/api/depth/heatmap?start=abc").status_code == 400
+    # By default: the last HEATMAP_SECONDS before `end`.
+    assert client.get("/api/depth/heatmap?end=4000").json["times"] == [0, 1000, 2000, 3000, 4000]
+
+
+def test_order_book_does_not_need_numpy():
+    # orderbook.py imports depth_history (NumPy) only for its command line.
+    assert "depth_history" not in sys.modules["orderbook"].__dict__
@@ -0,0 +1,61 @@
+# test_history.py
+import pytest
+
+from footprint_engine import FootprintEngine
+
+START = 1744588800  # aligned on every timeframe
+
+
+@pytest.fixture
+def engine():
+    """Five finalized 1m candles (START .. START + 240) and a live one at START + 300."""
+    engine = FootprintEngine(["1m", "5m"])
+    for minute in range(6):
+        engine.add_trade((START + minute * 60 + 5) * 1000, 100 + minute * 0.01, 1.0, minute % 2 == 0)
+    return engine
+
+
+def buckets(rows):
+    return [int(row["bucket"]) for row in rows]
+
+
+def test_whole_history_ends_with_live_candle(engine):
+    assert buckets(engine.select_history("1m")) == [START + i * 60 for i in range(6)]
+    assert buckets(engine.select_history("5m")) == [START, START + 300]
+
+
+@pytest.mark.parametrize("since, until, expected", [
+    (START + 60, None, [1, 2, 3, 4, 5]),        # since on a bucket includes it
+    (START + 61, None, [2, 3, 4, 5]),           # since inside a bucket starts at the next one
+    (None, START + 120, [0, 1, 2]),             # until on a bucket includes it
+    (None, START + 119, [0, 1]),
+    (START + 120, START + 180, [2, 3]),
+    (START + 300, None, [5]),                   # only the live candle
+    (START + 301, None, []),
+    (None, START - 1, []),
+    (START + 200, START + 100, []),
+])
+def test_since_until(engine, since, until, expected):
+    assert buckets(engine.select_history("1m", since, until)) == [START + i * 60 for i in expected]
+
+
+@pytest.mark.parametrize("limit, expected", [
+    (0, []),
+    (1, [5]),                  # the live candle counts towards the limit
+    (3, [3, 4, 5]),
+    (6, [0, 1, 2, 3, 4, 5]),
+    (100, [0, 1, 2, 3, 4, 5]),
+])
+def test_limit(engine, limit, expected):
+    assert buckets(engine.select_history("1m", limit=limit)) == [START + i * 60 for i in expected]
+
+
+def test_limit_within_window(engine):
+    assert buckets(engine.select_history("1m", until=START + 180, limit=2)) == [START + 120, START + 180]
+    assert buckets(engine.select_history("1m", since=START + 240, limit=5)) == [START + 240, START + 300]
+
+
+def test_history_window_indexes(engine):
+    snapshot, lo, hi, live = engine.history_window("1m", START + 60, START + 180)
+    assert (lo, hi, live) == (1, 4, None)
+    assert snapshot.finalized_count == 5
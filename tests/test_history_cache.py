@@ -0,0 +1,93 @@
+# test_history_cache.py
+import gzip
+import json
+import zlib
+
+from conftest import add_trades
+from footprint_engine import FootprintEngine
+from history_cache import HistoryCache
+from persistence import summary_to_record
+
+URL = "/api/footprint/history/1m"
+
+
+def expected_rows(app_module, tf="1m", **window):
+    return [summary_to_record(summary) for summary in app_module.select_history(tf, **window)]
+
+
+def test_not_modified_until_the_version_changes(app_module):
+    add_trades(app_module.engine, 3)
+    client = app_module.app.test_client()
+    response = client.get(URL)
+    assert response.status_code == 200
+    assert response.json == expected_rows(app_module)
+    etag = response.headers["ETag"]
+    assert etag.startswith('W/"') and response.headers["Cache-Control"] == "no-cache"
+
+    not_modified = app_module.history_cache.not_modified
+    response = client.get(URL, headers={"If-None-Match": etag})
+    assert (response.status_code, response.data) == (304, b"")
+    assert response.headers["ETag"] == etag
+    assert app_module.history_cache.not_modified == not_modified + 1
+
+    version = app_module.engine.version
+    add_trades(app_module.engine, 1, per_minute=1)
+    assert app_module.engine.version > version
+    response = client.get(URL, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json == expected_rows(app_module)
+
+
+def test_etag_depends_on_format_fields_and_bin(app_module):
+    add_trades(app_module.engine, 1)
+    client = app_module.app.test_client()
+    etags = {client.get(URL + query).headers["ETag"]
+             for query in ("", "?format=json", "?bin=0.05", "?format=columns&bin=0.25")}
+    assert len(etags) == 4
+
+
+def test_compressed_bodies_match_plain_json(app_module):
+    add_trades(app_module.engine, 4)
+    client = app_module.app.test_client()
+    plain = client.get(URL + "?limit=50")
+    assert "Content-Encoding" not in plain.headers
+    for encoding, decompress in (("gzip", gzip.decompress), ("deflate", zlib.decompress)):
+        response = client.get(URL + "?limit=50", headers={"Accept-Encoding": encoding})
+        assert response.headers["Content-Encoding"] == encoding
+        assert "Accept-Encoding" in response.headers["Vary"]
+        assert json.loads(decompress(response.data)) == plain.json
+    columns = client.get(URL + "?format=columns", headers={"Accept-Encoding": "gzip"})
+    assert json.loads(gzip.decompress(columns.data)) == client.get(URL + "?format=columns").json
+
+
+def test_finalized_candles_extend_cached_bodies(app_module):
+    client = app_module.app.test_client()
+    headers = {"Accept-Encoding": "gzip"}
+    add_trades(app_module.engine, 2)
+    first = json.loads(gzip.decompress(client.get(URL, headers=headers).data))
+    hits = app_module.history_cache.hits
+    # Closes the live candle: the cached prefix must grow by the newly finalized rows.
+    add_trades(app_module.engine, 2)
+    second = json.loads(gzip.decompress(client.get(URL, headers=headers).data))
+    assert app_module.history_cache.hits == hits + 1
+    assert second == expected_rows(app_module)
+    assert len(second) == len(first) + 2
+    # The old live row is now finalized, unchanged, and the new live row follows.
+    assert second[:len(first)] == first
+    assert int(second[-1]["bucket"]) == app_module.engine.live_summary("1m")["bucket"]
+
+
+def test_history_replaced_is_not_served_from_cache():
+    engine = FootprintEngine(["1m"])
+    add_trades(engine, 5)
+    cache = HistoryCache(engine, records=2)
+    snapshot, lo, hi, live = engine.history_window("1m")
+    body = cache.body("1m", None, lo, hi, live, "gzip")
+    # Rows older than the cached text are encoded per request.
+    assert json.loads(gzip.decompress(body)) == [summary_to_record(s) for s in engine.select_history("1m")]
+    engine.finalized_data["1m"] = engine.finalized_data["1m"][:2]
+    engine.finalized_buckets["1m"] = engine.finalized_buckets["1m"][:2]
+    body = cache.body("1m", None, 0, 2, None, "gzip")
+    assert json.loads(gzip.decompress(body)) == [summary_to_record(s) for s in engine.finalized_data["1m"]]
+    assert cache.stats()["misses"] == 2
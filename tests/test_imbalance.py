@@ -0,0 +1,69 @@
+# test_imbalance.py
+import random
+
+import pytest
+
+from footprint_engine import FootprintEngine
+from imbalance import ImbalanceRules, ImbalanceTracker, find_imbalances, summary_imbalances
+from persistence import summary_to_record
+
+
+def brute_imbalances(levels, rules):
+    """(buy ticks, sell ticks) of {tick: (buy, sell)}, straight from the definition."""
+    buy_ticks = [tick for tick, (buy, _) in levels.items() if rules.holds(buy, levels.get(tick - 1, (0, 0))[1])]
+    sell_ticks = [tick for tick, (_, sell) in levels.items() if rules.holds(sell, levels.get(tick + 1, (0, 0))[0])]
+    return sorted(buy_ticks), sorted(sell_ticks)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_tracker_matches_find_imbalances(seed):
+    rng = random.Random(seed)
+    rules = ImbalanceRules(rng.choice((1.5, 2.0, 3.0)), rng.choice((0.0, 0.5, 2.0)), rng.choice((2, 3)))
+    engine = FootprintEngine(["1m", "5m"], imbalance_rules=rules)
+    timestamp = 1_700_000_000_000
+    for _ in range(400):
+        timestamp += rng.randint(0, 3000)
+        price = round(100 + rng.randint(-15, 15) * 0.01, 2)
+        engine.add_trade(timestamp, price, round(rng.random() * rng.choice((0.1, 1, 5)), 3), rng.random() < 0.5)
+        candle = engine.current_data["1m"]
+        tracker = candle.imbalance_tracker
+        levels = [(tick, buy, sell) for tick, buy, sell, _, _ in candle.ladder.levels()]
+        expected = find_imbalances(levels, rules)
+        assert (sorted(tracker.buy.ticks), sorted(tracker.sell.ticks)) == expected
+        assert expected == brute_imbalances({tick: (buy, sell) for tick, buy, sell in levels}, rules)
+        rebuilt = ImbalanceTracker.from_ladder(candle.ladder, rules)
+        assert (tracker.buy.starts, tracker.sell.starts) == (rebuilt.buy.starts, rebuilt.sell.starts)
+        assert (tracker.buy.ends, tracker.sell.ends) == (rebuilt.buy.ends, rebuilt.sell.ends)
+
+
+def test_stacked_runs_split_and_join():
+    rules = ImbalanceRules(3.0, 0.0, 3)
+    tracker = ImbalanceTracker(rules)
+    for tick in (1, 2, 4, 5):
+        tracker.buy.set(tick, True)
+    assert tracker.buy.stacked(3) == []
+    tracker.buy.set(3, True)
+    assert tracker.buy.stacked(3) == [(1, 5)]
+    tracker.buy.set(2, False)
+    assert tracker.buy.stacked(3) == [(3, 5)]
+    assert tracker.buy.starts == {1: 1, 3: 5}
+
+
+def test_summary_fields_from_stored_rows():
+    rng = random.Random(4)
+    engine = FootprintEngine(["1m"])
+    timestamp = 1_700_000_000_000
+    for _ in range(3000):
+        timestamp += rng.randint(0, 400)
+        engine.add_trade(timestamp, round(100 + rng.randint(-20, 20) * 0.01, 2),
+                         rng.choice((0.5, 1.0, 4.0)), rng.random() < 0.5)
+    checked = 0
+    for summary in engine.finalized_data["1m"]:
+        # Volumes with at most 2 decimals survive the rounding of stored rows unchanged.
+        stored = dict(summary_to_record(summary), price_levels=summary["price_levels"])
+        assert summary_imbalances(stored, engine.tick_size, engine.imbalance_rules) == {
+            "diagonal_imbalances": summary["diagonal_imbalances"],
+            "stacked_imbalances": summary["stacked_imbalances"],
+        }
+        checked += bool(summary["diagonal_imbalances"])
+    assert checked
@@ -0,0 +1,50 @@
+# test_ingest.py
+import json
+import time
+
+from footprint_engine import FootprintEngine
+from ingest import TradeIngest
+
+
+def frame(timestamp_ms, price, quantity, is_seller):
+    return json.dumps({"e": "trade", "T": timestamp_ms, "p": str(price), "q": str(quantity), "m": is_seller})
+
+
+class FailingEngine(FootprintEngine):
+    """Raises on the first batch only."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.failed = False
+
+    def add_trades(self, trades):
+        if not self.failed:
+            self.failed = True
+            raise RuntimeError("boom")
+        super().add_trades(trades)
+
+
+def test_process_decodes_and_counts_bad_frames():
+    engine = FootprintEngine(["1m"])
+    ingest = TradeIngest(engine)
+    ingest.process([frame(60_000, 100.0, 1.5, False), b"not json", json.dumps({"T": 1}),
+                    frame(60_500, 100.01, 0.5, True)])
+    assert ingest.processed == 2
+    assert ingest.decode_errors == 2
+    live = engine.live_summary("1m")
+    assert (live["buy_volume"], live["sell_volume"]) == (1.5, 0.5)
+
+
+def test_failing_batch_does_not_stop_processing():
+    engine = FailingEngine(["1m"])
+    ingest = TradeIngest(engine, maxsize=4, batch_size=1)
+    ingest.start()
+    for i in range(10):
+        ingest.on_message(None, frame(60_000 + i, 100.0, 1.0, False))
+    deadline = time.monotonic() + 5
+    while ingest.batches < 10 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert ingest.batches == 10
+    assert ingest.batch_errors == 1
+    assert ingest.stats()["batch_errors"] == 1
+    assert engine.live_summary("1m")["buy_volume"] == 9.0
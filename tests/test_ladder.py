@@ -0,0 +1,88 @@
+# test_ladder.py
+import random
+
+from footprint_engine import FootprintEngine
+from ladder import PriceLadder, price_decimals
+
+
+def brute_levels(trades):
+    levels = {}
+    for tick, volume, is_seller in trades:
+        buy, sell, buy_trades, sell_trades = levels.get(tick, (0, 0, 0, 0))
+        if is_seller:
+            levels[tick] = (buy, sell + volume, buy_trades, sell_trades + 1)
+        else:
+            levels[tick] = (buy + volume, sell, buy_trades + 1, sell_trades)
+    return [(tick, *levels[tick]) for tick in sorted(levels)]
+
+
+def test_growth_below_and_above_range():
+    ladder = PriceLadder()
+    ladder.add(21500, 5, False)
+    assert (ladder.base_tick, len(ladder)) == (21500, 1)
+    # Above the range: the arrays grow to the right, the base stays.
+    assert ladder.add(21503, 7, True) == 3
+    assert ladder.base_tick == 21500 and len(ladder) >= 4
+    # Below the range: the arrays grow to the left by at least 8 and the base moves down.
+    assert ladder.add(21498, 2, False) == 6
+    assert ladder.base_tick == 21492
+    # Ticks inside that headroom need no further growth.
+    size = len(ladder)
+    ladder.add(21492, 1, True)
+    assert (ladder.base_tick, len(ladder)) == (21492, size)
+    assert list(ladder.levels()) == [(21492, 0, 1, 0, 1), (21498, 2, 0, 1, 0),
+                                     (21500, 5, 0, 1, 0), (21503, 0, 7, 0, 1)]
+
+
+def test_random_walk_matches_dict_of_levels():
+    rng = random.Random(4)
+    ladder = PriceLadder()
+    trades = []
+    tick = 10000
+    for _ in range(5000):
+        tick += rng.choice((-40, -1, 0, 1, 35))
+        trade = (tick, rng.randint(1, 10 ** 8), rng.random() < 0.5)
+        trades.append(trade)
+        ladder.add(*trade)
+    assert list(ladder.levels()) == brute_levels(trades)
+    assert ladder.base_tick + ladder.first_traded() == min(trade[0] for trade in trades)
+    assert ladder.base_tick + ladder.last_traded() == max(trade[0] for trade in trades)
+
+
+def test_merge_ladders_with_different_ranges():
+    rng = random.Random(6)
+    left, right = PriceLadder(), PriceLadder()
+    trades = []
+    for ladder, center in ((left, 500), (right, 900)):
+        for _ in range(300):
+            trade = (center + rng.randint(-50, 50), rng.randint(1, 1000), rng.random() < 0.5)
+            trades.append(trade)
+            ladder.add(*trade)
+    merged = right.copy()
+    merged.merge(left)
+    assert list(merged.levels()) == brute_levels(trades)
+    # The merged ladders are left as they were.
+    assert list(right.levels()) == brute_levels(trades[300:])
+
+
+def test_state_round_trip():
+    ladder = PriceLadder()
+    for tick in (7, 3, 12, 3):
+        ladder.add(tick, tick * 10, tick % 2 == 0)
+    restored = PriceLadder.from_state(ladder.to_state())
+    assert list(restored.levels()) == list(ladder.levels())
+    assert restored.base_tick == ladder.base_tick
+
+
+def test_engine_snaps_prices_to_the_tick_grid():
+    engine = FootprintEngine(["1m"])
+    engine.add_trade(1744588800000, 215.0, 1.0, False)
+    engine.add_trade(1744588801000, 215.00000001, 2.0, True)
+    engine.add_trade(1744588802000, 214.99, 0.5, True)
+    levels = engine.live_summary("1m")["price_levels"]
+    assert list(levels) == [214.99, 215.0]
+    assert levels[215.0]["buy_volume"] == 1.0 and levels[215.0]["sell_volume"] == 2.0
+
+
+def test_price_decimals():
+    assert [price_decimals(tick) for tick in (0.01, 0.1, 0.5, 1.0, 0.0001)] == [2, 1, 1, 0, 4]
@@ -0,0 +1,67 @@
+# test_live.py
+from conftest import add_trades
+
+# (price, buy volume, sell volume): 100 in total, the POC at 215.02 with 30.
+PROFILE = [(215.00, 5, 5), (215.01, 15, 5), (215.02, 10, 20), (215.03, 20, 5), (215.04, 0, 15)]
+
+
+def live_candle(app_module, profile=PROFILE):
+    """Start a new live 1m candle trading `profile`; returns its bucket."""
+    engine = app_module.engine
+    add_trades(engine, 1)
+    bucket = engine.live_summary("1m")["bucket"] + 60
+    timestamp = bucket * 1000
+    for price, buy, sell in profile:
+        for volume, is_seller in ((buy, False), (sell, True)):
+            if volume:
+                timestamp += 1
+                engine.add_trade(timestamp, price, volume, is_seller)
+    return bucket
+
+
+def test_live_poc_value_area_and_delta_extremes(app_module):
+    bucket = live_candle(app_module)
+    client = app_module.app.test_client()
+    body = client.get("/api/footprint/live/1m").json
+    candle = body["candle"]
+    assert body["tf"] == "1m" and body["version"] == app_module.engine.version
+    assert candle["bucket"] == bucket
+    assert candle["total_volume"] == 100.0 and candle["delta"] == 0.0
+    assert candle["pocs"] == [{"price": 215.02, "total_volume": 30.0, "buy_volume": 10.0, "sell_volume": 20.0}]
+    # From the POC (30): 215.03 (25) beats 215.01 (20), then 215.01 beats 215.04 (15): 75%.
+    assert (candle["value_area_low"], candle["value_area_high"]) == (215.01, 215.03)
+    assert (candle["max_delta"], candle["min_delta"]) == (15.0, -15.0)
+    assert candle["price_levels"]["215.04"] == {"buy_volume": 0.0, "sell_volume": 15.0,
+                                                "buy_trades": 0, "sell_trades": 1}
+    # The live candle is what the history API returns for the same bucket.
+    history = client.get(f"/api/footprint/history/1m?format=json&since={bucket}").json
+    assert history == [{field: candle[field] for field in history[0]}]
+
+
+def test_live_candle_follows_trades(app_module):
+    live_candle(app_module)
+    client = app_module.app.test_client()
+    response = client.get("/api/footprint/live/1m")
+    etag = response.headers["ETag"]
+    assert client.get("/api/footprint/live/1m", headers={"If-None-Match": etag}).status_code == 304
+    # 20 more bought at 215.04 move the POC there and widen the value area upwards.
+    summary = app_module.engine.live_summary("1m")
+    app_module.engine.add_trade(summary["bucket"] * 1000 + 30000, 215.04, 20, False)
+    response = client.get("/api/footprint/live/1m", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["ETag"] != etag
+    candle = response.json["candle"]
+    assert [poc["price"] for poc in candle["pocs"]] == [215.04]
+    assert (candle["value_area_low"], candle["value_area_high"]) == (215.02, 215.04)
+    assert (candle["max_delta"], candle["min_delta"]) == (15.0, -10.0)
+
+
+def test_live_price_bins(app_module):
+    live_candle(app_module)
+    client = app_module.app.test_client()
+    candle = client.get("/api/footprint/live/1m?bin=0.05").json["candle"]
+    assert candle["price_levels"] == {"215.0": {"buy_volume": 50.0, "sell_volume": 50.0,
+                                                "buy_trades": 4, "sell_trades": 5}}
+    # The POC and value area stay on the tick grid.
+    assert candle["pocs"][0]["price"] == 215.02
+    assert client.get("/api/footprint/live/1m?bin=0.013").status_code == 400
+    assert client.get("/api/footprint/live/2m").status_code == 400
@@ -0,0 +1,79 @@
+# test_metrics.py
+import re
+
+from metrics import Histogram, Metrics
+
+
+def samples(text):
+    """{metric name with labels: value} of the sample lines of a Prometheus exposition."""
+    return dict(line.rsplit(" ", 1) for line in text.splitlines() if not line.startswith("#"))
+
+
+def test_histogram_buckets_are_cumulative():
+    metrics = Metrics(prefix="test")
+    histogram = metrics.histogram("stage_seconds", "Duration of processing stages.", (0.1, 1.0), stage="ingest")
+    for value in (0.05, 0.1, 0.5, 0.7, 3.0):
+        histogram.observe(value)
+    metrics.histogram("stage_seconds", "Duration of processing stages.", (0.1, 1.0), stage="persist").observe_all([2.0])
+    text = metrics.render()
+    lines = text.splitlines()
+    assert lines[:2] == ["# HELP test_stage_seconds Duration of processing stages.",
+                         "# TYPE test_stage_seconds histogram"]
+    assert lines.count("# TYPE test_stage_seconds histogram") == 1
+    values = samples(text)
+    assert values['test_stage_seconds_bucket{stage="ingest",le="0.1"}'] == "2"
+    assert values['test_stage_seconds_bucket{stage="ingest",le="1.0"}'] == "4"
+    assert values['test_stage_seconds_bucket{stage="ingest",le="+Inf"}'] == "5"
+    assert values['test_stage_seconds_count{stage="ingest"}'] == "5"
+    assert round(float(values['test_stage_seconds_sum{stage="ingest"}']), 9) == 4.35
+    assert values['test_stage_seconds_bucket{stage="persist",le="1.0"}'] == "0"
+    assert values['test_stage_seconds_bucket{stage="persist",le="+Inf"}'] == "1"
+    assert text.endswith("\n")
+
+
+def test_histogram_is_shared_per_labels():
+    metrics = Metrics()
+    first = metrics.histogram("h", "Help.", stage="a")
+    assert metrics.histogram("h", "Help.", stage="a") is first
+    assert metrics.histogram("h", "Help.", stage="b") is not first
+    histogram = Histogram((1.0,))
+    histogram.observe_all([0.5, 1.0, 2.0])
+    assert (histogram.counts, histogram.count, histogram.sum) == ([2, 1], 3, 3.5)
+
+
+def test_gauges_and_counters():
+    metrics = Metrics(prefix="test")
+    metrics.gauge("queue_depth", "Frames waiting.", lambda: 7)
+    metrics.gauge("collections_total", "Collections.", lambda: {(("generation", "0"),): 3}, kind="counter")
+    text = metrics.render()
+    assert "# TYPE test_queue_depth gauge\ntest_queue_depth 7\n" in text
+    assert '# TYPE test_collections_total counter\ntest_collections_total{generation="0"} 3\n' in text
+
+
+def test_timed_methods_and_disabled_metrics():
+    class Storage:
+        def sync(self):
+            return "synced"
+
+    storage = Storage()
+    metrics = Metrics(prefix="test")
+    metrics.instrument(storage, "sync", "persist")
+    assert storage.sync() == "synced"
+    assert samples(metrics.render())['test_stage_seconds_count{stage="persist"}'] == "1"
+
+    disabled, plain = Metrics(enabled=False), Storage()
+    disabled.instrument(plain, "sync", "persist")
+    assert "sync" not in vars(plain) and disabled.render() == "\n"
+
+
+def test_metrics_endpoint(app_module):
+    response = app_module.app.test_client().get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "text/plain; version=0.0.4; charset=utf-8"
+    text = response.get_data(as_text=True)
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            assert re.fullmatch(r"# TYPE footprint_\w+ (gauge|counter|histogram)", line)
+        elif not line.startswith("# HELP "):
+            assert re.fullmatch(r"footprint_\w+(\{[^}]*\})? \S+", line)
+    assert "# TYPE footprint_process_resident_memory_bytes gauge" in text
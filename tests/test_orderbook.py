@@ -0,0 +1,150 @@
+# test_orderbook.py
+import asyncio
+import random
+
+import pytest
+
+import orderbook
+from orderbook import QUANTITY_SCALE, BookSide, OrderBookManager
+
+
+def brute_depth(side, low, high):
+    lo, hi = side.to_tick(low), side.to_tick(high)
+    return sum(units for tick, units in side.levels.items() if lo <= tick <= hi) / QUANTITY_SCALE
+
+
+def test_new_level_counted_once():
+    side = BookSide(is_bid=True)
+    side.set(100.0, 1.0)
+    assert side.depth_between(0.0, 1000.0) == 1.0
+    side.set(101.0, 2.0)
+    assert side.depth_between(0.0, 1000.0) == 3.0
+
+
+def test_levels_outside_tree_range():
+    side = BookSide(is_bid=False)
+    side.set(100.0, 1.0)
+    # Far below and far above the covered range: both rebuild the tree.
+    side.set(50.0, 2.0)
+    side.set(500.0, 4.0)
+    assert side.depth_between(0.0, 1000.0) == 7.0
+    assert side.depth_between(50.0, 50.0) == 2.0
+    assert side.depth_between(100.0, 500.0) == 5.0
+    side.set(50.0, 0)
+    assert side.depth_between(0.0, 1000.0) == 5.0
+    assert side.best() == (100.0, 1.0)
+
+
+def test_random_updates_match_levels():
+    rng = random.Random(7)
+    side = BookSide(is_bid=True)
+    for _ in range(5000):
+        price = round(rng.choice((100.0, 20.0, 400.0)) + rng.randint(-300, 300) * 0.01, 2)
+        side.set(price, rng.choice((0, 0, 0.5, 1.25, 3.0)))
+    assert side.ticks == sorted(side.levels)
+    for low, high in ((0.0, 1000.0), (19.0, 21.0), (99.5, 100.5), (398.0, 399.99)):
+        assert side.depth_between(low, high) == pytest.approx(brute_depth(side, low, high))
+    assert side.best()[0] == side.to_price(max(side.levels))
+
+
+def test_top_levels_best_first():
+    bids, asks = BookSide(is_bid=True), BookSide(is_bid=False)
+    for side in (bids, asks):
+        side.load([["100.00", "1"], ["100.01", "2"], ["99.99", "0"], ["99.98", "3"]])
+    assert bids.top(2) == [(100.01, 2.0), (100.0, 1.0)]
+    assert asks.top(2) == [(99.98, 3.0), (100.0, 1.0)]
+    assert asks.depth_between(99.98, 100.01) == 6.0
+
+
+def test_sync_replays_buffer_on_snapshot():
+    book = OrderBookManager("BTCUSDT")
+    book.load_snapshot({"lastUpdateId": 10, "bids": [["100.00", "1"]], "asks": [["100.01", "1"]]})
+    # Older than the snapshot: dropped.
+    assert book.apply_event({"U": 1, "u": 5, "pu": 0, "b": [["100.00", "9"]], "a": []})
+    assert book.apply_event({"U": 8, "u": 12, "pu": 7, "b": [["100.00", "2"]], "a": []})
+    assert book.apply_event({"U": 13, "u": 14, "pu": 12, "b": [], "a": [["100.01", "0"]]})
+    # pu does not follow the previous u: a gap.
+    assert not book.apply_event({"U": 16, "u": 17, "pu": 15, "b": [], "a": []})
+    assert book.bids.best() == (100.0, 2.0)
+    assert book.asks.best() is None
+    assert book.events_dropped == 1
+
+
+class SnapshotServer:
+    """Stands in for get_snapshot: each fetch waits until release() hands out the next snapshot."""
+
+    def __init__(self, *snapshots):
+        self.snapshots = list(snapshots)
+        self.fetches = 0
+        self._released = asyncio.Semaphore(0)
+
+    async def get(self):
+        self.fetches += 1
+        await self._released.acquire()
+        return self.snapshots.pop(0)
+
+    def release(self):
+        self._released.release()
+
+
+def depth_event(first, last, previous, bids=()):
+    return {"U": first, "u": last, "pu": previous, "E": last, "b": [list(level) for level in bids], "a": []}
+
+
+async def settle(book):
+    """Let the resync task run until it waits for a snapshot or is done."""
+    for _ in range(5):
+        await asyncio.sleep(0)
+    if book._resync_task is not None and book._resync_task.done():
+        book._resync_task.result()
+
+
+def test_resync_with_events_before_during_and_after_snapshot(monkeypatch):
+    monkeypatch.setattr(orderbook, "RESYNC_RETRY_DELAY", 0)
+    server = SnapshotServer(
+        {"lastUpdateId": 8, "bids": [["100.00", "1"]], "asks": [["100.05", "1"]]},
+        # Older than the buffered events after the gap: replay fails and a newer one is fetched.
+        {"lastUpdateId": 15, "bids": [["100.00", "5"]], "asks": [["100.05", "1"]]},
+        {"lastUpdateId": 22, "bids": [["100.00", "6"]], "asks": [["100.05", "1"]]},
+    )
+    book = OrderBookManager("BTCUSDT")
+    book.get_snapshot = server.get
+    synced = []
+    book.on_synced = lambda manager: synced.append(manager.previous_final_update_id)
+
+    async def run():
+        # Before the snapshot: starts the resync, then dropped as older than it.
+        book.handle_event(depth_event(1, 5, 0, [("100.00", "9")]))
+        book.handle_event(depth_event(6, 10, 5, [("99.99", "2")]))
+        await settle(book)
+        assert server.fetches == 1 and not book.synced
+        # During the fetch: buffered too.
+        book.handle_event(depth_event(11, 12, 10, [("99.98", "3")]))
+        server.release()
+        await settle(book)
+        assert book.synced and not book.buffer
+        assert book.bids.top() == [(100.0, 1.0), (99.99, 2.0), (99.98, 3.0)]
+        # After the snapshot: applied directly.
+        book.handle_event(depth_event(13, 13, 12, [("100.00", "4")]))
+        assert book.bids.best() == (100.0, 4.0) and book.events_buffered == 3
+
+        # pu=18 does not follow u=13: a gap, so the book resyncs.
+        book.handle_event(depth_event(19, 21, 18, [("99.97", "1")]))
+        await settle(book)
+        assert not book.synced and server.fetches == 2
+        book.handle_event(depth_event(22, 23, 21, [("99.96", "1")]))
+        server.release()
+        await settle(book)
+        # Snapshot 15 is older than the first buffered event (U=19): fetch again.
+        assert not book.synced and server.fetches == 3 and len(book.buffer) == 2
+        book.handle_event(depth_event(24, 24, 23, [("99.99", "0")]))
+        server.release()
+        await settle(book)
+
+    asyncio.run(run())
+    assert book.synced and not book.buffer
+    assert book.previous_final_update_id == 24
+    # Snapshot 22 replaces the book; event 19-21 is older and dropped, 22-23 and 24 apply.
+    assert book.bids.top() == [(100.0, 6.0), (99.96, 1.0)]
+    assert (book.resyncs, book.events_dropped, book.events_applied) == (2, 2, 5)
+    assert synced == [12, 24]
@@ -0,0 +1,115 @@
+# test_persistence.py
+import os
+import random
+
+from footprint_engine import FootprintEngine
+from persistence import CSV_FIELDS, CandleFileWriter, encode_rows, load_candle_file, summary_to_row
+from retention import open_history
+
+TIMEFRAMES = ["1m", "5m"]
+
+
+def trades(count=3000, seed=3, timestamp=1744740000000):
+    rng = random.Random(seed)
+    price = 215.0
+    for _ in range(count):
+        timestamp += rng.randint(100, 2000)
+        price = round(price + rng.choice((-0.01, 0, 0.01)), 2)
+        yield timestamp, price, rng.choice((0.013, 0.5, 1.25)), rng.random() < 0.5
+
+
+def full_rewrite(engine, tf):
+    """The file as the old once-per-second rewrite produced it: header, finalized rows, live row."""
+    rows = [summary_to_row(summary) for summary in engine.finalized_data[tf]]
+    live = engine.live_summary(tf)
+    if live:
+        rows.append(summary_to_row(live))
+    return encode_rows([CSV_FIELDS] + rows)
+
+
+def read(filename):
+    with open(filename, "rb") as f:
+        return f.read()
+
+
+def test_writer_appends_finalized_rows_and_rewrites_only_the_tail(tmp_path):
+    filename = str(tmp_path / "footprint_1m.csv")
+    engine = FootprintEngine(TIMEFRAMES)
+    writer = CandleFileWriter(filename, fsync_interval=0)
+    writer.sync([], None)
+    written = read(filename)
+    assert written == encode_rows([CSV_FIELDS])
+    for i, trade in enumerate(trades()):
+        engine.add_trade(*trade)
+        if i % 50:
+            continue
+        finalized_end, bytes_written, rows_written = writer.finalized_end, writer.bytes_written, writer.rows_written
+        writer.sync(engine.finalized_data["1m"], engine.live_summary("1m"))
+        content = read(filename)
+        # Finalized rows are never rewritten; only new rows and the tail are written.
+        assert content[:finalized_end] == written[:finalized_end]
+        new_rows = engine.finalized_data["1m"][rows_written:]
+        expected = len(encode_rows([summary_to_row(summary) for summary in new_rows]))
+        tail = len(encode_rows([summary_to_row(engine.live_summary("1m"))]))
+        assert writer.bytes_written - bytes_written in (expected, expected + tail)
+        assert content == full_rewrite(engine, "1m")
+        written = content
+    writer.close()
+    assert len(engine.finalized_data["1m"]) > 10
+
+
+def test_unchanged_tail_is_not_rewritten(tmp_path):
+    filename = str(tmp_path / "footprint_1m.csv")
+    engine = FootprintEngine(TIMEFRAMES)
+    for trade in trades(200):
+        engine.add_trade(*trade)
+    writer = CandleFileWriter(filename, fsync_interval=0)
+    writer.sync(engine.finalized_data["1m"], engine.live_summary("1m"))
+    bytes_written = writer.bytes_written
+    writer.sync(engine.finalized_data["1m"], engine.live_summary("1m"))
+    assert writer.bytes_written == bytes_written
+    writer.close()
+
+
+def restart(directory, now, part):
+    engine = FootprintEngine(TIMEFRAMES)
+    writers = {tf: open_history(engine, tf, directory, now=now)[0] for tf in TIMEFRAMES}
+    for trade in part:
+        engine.add_trade(*trade)
+    for tf in TIMEFRAMES:
+        writers[tf].sync(engine.finalized_data[tf], engine.live_summary(tf))
+        writers[tf].close()
+    return engine
+
+
+def test_restart_without_checkpoint_rewrites_in_progress_row(tmp_path):
+    directory = str(tmp_path)
+    all_trades = list(trades())
+    first, second = all_trades[:1500], all_trades[1500:]
+    # The second process starts in the bucket of the first one's in-progress candle.
+    now = second[0][0] // 1000
+    restart(directory, now, first)
+    engine = restart(directory, now, second)
+    for tf in TIMEFRAMES:
+        rows = load_candle_file(os.path.join(directory, f"footprint_{tf}.csv"))
+        buckets = [int(row["bucket"]) for row in rows]
+        assert buckets == sorted(set(buckets))
+        # The old in-progress row was replaced by the new one, not kept as finalized.
+        assert rows[-1]["close"] == str(engine.live_summary(tf)["close"])
+        assert read(os.path.join(directory, f"footprint_{tf}.csv")).endswith(
+            encode_rows([summary_to_row(engine.live_summary(tf))]))
+
+
+def test_restart_after_bucket_end_keeps_last_row(tmp_path):
+    directory = str(tmp_path)
+    all_trades = list(trades())
+    restart(directory, None, all_trades[:1500])
+    before = load_candle_file(os.path.join(directory, "footprint_1m.csv"))
+    # Restarted hours later: the stored in-progress candle has closed and stays as it is.
+    later = [(timestamp + 3 * 3600 * 1000, price, quantity, is_seller)
+             for timestamp, price, quantity, is_seller in all_trades[1500:]]
+    restart(directory, later[0][0] // 1000, later)
+    after = load_candle_file(os.path.join(directory, "footprint_1m.csv"))
+    assert after[:len(before)] == before
+    buckets = [int(row["bucket"]) for row in after]
+    assert buckets == sorted(set(buckets))
@@ -0,0 +1,96 @@
+# test_recorder.py
+import bz2
+import csv
+import gzip
+import io
+import lzma
+import os
+
+import pytest
+
+from data import COMPRESSORS, CSV_HEADER, TickRecorder, zstd
+
+DAY_END_MS = 1744588800000 - 1000  # 2025-04-13 23:59:59 UTC
+DECOMPRESSORS = {"none": bytes, "gzip": gzip.decompress, "bz2": bz2.decompress, "xz": lzma.decompress}
+if zstd is not None:
+    DECOMPRESSORS["zstd"] = zstd.decompress
+
+
+def message(timestamp_ms, trade_id, price="215.01", quantity="0.5", is_seller=False):
+    return {"T": timestamp_ms, "p": price, "q": quantity, "m": is_seller, "s": "XMRUSDT", "t": trade_id}
+
+
+def read_rows(path, compress="none"):
+    with open(path, "rb") as f:
+        text = DECOMPRESSORS[compress](f.read()).decode()
+    return list(csv.reader(io.StringIO(text)))
+
+
+def test_daily_rotation_at_utc_midnight(tmp_path):
+    recorder = TickRecorder(directory=str(tmp_path), rotate="daily", stats_interval=0)
+    recorder.record(message(DAY_END_MS, 1))
+    recorder.record(message(DAY_END_MS + 999, 2, is_seller=True))
+    recorder.record(message(DAY_END_MS + 1000, 3))
+    assert recorder.flush() == 3
+    assert sorted(os.listdir(tmp_path)) == ["tick_data_XMRUSDT_2025-04-13.csv", "tick_data_XMRUSDT_2025-04-14.csv"]
+    first = read_rows(str(tmp_path / "tick_data_XMRUSDT_2025-04-13.csv"))
+    assert first == [CSV_HEADER,
+                     [str(DAY_END_MS), "215.01", "0.5", "buy", "XMRUSDT", "1"],
+                     [str(DAY_END_MS + 999), "215.01", "0.5", "sell", "XMRUSDT", "2"]]
+    # A later flush appends to the open file without repeating the header.
+    recorder.record(message(DAY_END_MS + 2000, 4))
+    recorder.flush()
+    second = read_rows(str(tmp_path / "tick_data_XMRUSDT_2025-04-14.csv"))
+    assert [row[-1] for row in second] == ["trade_id", "3", "4"]
+
+
+def test_hourly_rotation(tmp_path):
+    recorder = TickRecorder(directory=str(tmp_path), rotate="hourly", stats_interval=0)
+    hour_start = DAY_END_MS + 1000 + 3600 * 1000
+    for trade_id, timestamp in enumerate((hour_start - 1, hour_start, hour_start + 3599999), 1):
+        recorder.record(message(timestamp, trade_id))
+    recorder.flush()
+    assert sorted(os.listdir(tmp_path)) == ["tick_data_XMRUSDT_2025-04-14_00.csv",
+                                            "tick_data_XMRUSDT_2025-04-14_01.csv"]
+    rows = read_rows(str(tmp_path / "tick_data_XMRUSDT_2025-04-14_01.csv"))
+    assert [row[-1] for row in rows[1:]] == ["2", "3"]
+
+
+@pytest.mark.parametrize("compress", sorted(COMPRESSORS))
+def test_each_codec_round_trips_across_flushes(tmp_path, compress):
+    recorder = TickRecorder(directory=str(tmp_path), compress=compress, stats_interval=0)
+    messages = [message(DAY_END_MS + 1000 + i, i, price=f"{215 + i * 0.01:.2f}", is_seller=i % 2 == 0)
+                for i in range(1, 7)]
+    for m in messages[:3]:
+        recorder.record(m)
+    recorder.flush()
+    for m in messages[3:]:
+        recorder.record(m)
+    recorder.flush()
+    (name,) = os.listdir(tmp_path)
+    assert name == "tick_data_XMRUSDT_2025-04-14.csv" + COMPRESSORS[compress][0]
+    rows = read_rows(str(tmp_path / name), compress)
+    assert rows[0] == CSV_HEADER
+    assert rows[1:] == [[str(m["T"]), str(float(m["p"])), "0.5", "sell" if m["m"] else "buy", "XMRUSDT", str(m["t"])]
+                        for m in messages]
+
+
+def test_close_flushes_buffered_trades(tmp_path):
+    recorder = TickRecorder(directory=str(tmp_path), flush_rows=1000, flush_interval=60, stats_interval=0)
+    recorder.start()
+    for i in range(10):
+        recorder.record(message(DAY_END_MS + 1000 + i, i))
+    assert recorder.stats()["flushed"] == 0
+    recorder.close()
+    recorder.close()
+    stats = recorder.stats()
+    assert (stats["recorded"], stats["flushed"], stats["queued"], stats["dropped"]) == (10, 10, 0, 0)
+    rows = read_rows(str(tmp_path / "tick_data_XMRUSDT_2025-04-14.csv"))
+    assert len(rows) == 11
+
+
+def test_full_buffer_drops_and_counts(tmp_path):
+    recorder = TickRecorder(directory=str(tmp_path), max_buffer=2, stats_interval=0)
+    assert [recorder.record(message(DAY_END_MS + 1000 + i, i)) for i in range(3)] == [True, True, False]
+    assert recorder.stats()["dropped"] == 1
+    assert recorder.flush() == 2
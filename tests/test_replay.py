@@ -0,0 +1,85 @@
+# test_replay.py
+import csv
+import gzip
+import os
+import random
+
+from footprint_engine import FootprintEngine
+from persistence import CandleFileWriter
+from replay import DEFAULT_TIMEFRAMES, main, replay_files, write_outputs
+
+HEADER = ["timestamp_ms", "price", "quantity", "side", "symbol", "trade_id"]
+
+
+def messages(count=6000, seed=21):
+    """Binance @trade messages, as the live service receives them."""
+    rng = random.Random(seed)
+    timestamp, price = 1744588800000, 215.0
+    for trade_id in range(1, count + 1):
+        timestamp += rng.randint(10, 9000)
+        price = round(price + rng.choice((-0.02, -0.01, 0, 0.01, 0.02)), 2)
+        yield {"e": "trade", "s": "XMRUSDT", "t": trade_id, "T": timestamp, "p": f"{price:.2f}",
+               "q": rng.choice(("0.013", "0.500", "1.250", "2.345")), "m": rng.random() < 0.5}
+
+
+def write_ticks(path, trades):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "wt", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        for m in trades:
+            writer.writerow([m["T"], m["p"], m["q"], "sell" if m["m"] else "buy", m["s"], m["t"]])
+
+
+def live_files(trades, directory):
+    """The files the live service writes: engine.process_trade per message, incremental writers."""
+    engine = FootprintEngine(DEFAULT_TIMEFRAMES)
+    os.makedirs(directory)
+    writers = {tf: CandleFileWriter(os.path.join(directory, f"footprint_{tf}.csv")) for tf in DEFAULT_TIMEFRAMES}
+    for i, message in enumerate(trades):
+        engine.process_trade(message)
+        if i % 700 == 0:
+            for tf, writer in writers.items():
+                writer.sync(engine.finalized_data[tf], engine.live_summary(tf))
+    for tf, writer in writers.items():
+        writer.sync(engine.finalized_data[tf], engine.live_summary(tf))
+        writer.close()
+    return engine
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_replay_matches_live_engine(tmp_path):
+    trades = list(messages())
+    live = live_files(trades, str(tmp_path / "live"))
+    # Two recordings that overlap by 500 trades, one of them compressed.
+    first, second = str(tmp_path / "ticks_1.csv"), str(tmp_path / "ticks_2.csv.gz")
+    write_ticks(first, trades[:3500])
+    write_ticks(second, trades[3000:])
+
+    engine, stats = replay_files([first, second])
+    assert (stats["trades"], stats["skipped"]) == (len(trades), 500)
+    for tf in DEFAULT_TIMEFRAMES:
+        assert engine.finalized_data[tf] == live.finalized_data[tf]
+        assert engine.live_summary(tf) == live.live_summary(tf)
+        assert engine.cumulative_delta[tf] == live.cumulative_delta[tf]
+
+    write_outputs(engine, str(tmp_path / "replayed"))
+    for tf in DEFAULT_TIMEFRAMES:
+        assert read(str(tmp_path / "replayed" / f"footprint_{tf}.csv")) == \
+            read(str(tmp_path / "live" / f"footprint_{tf}.csv"))
+
+
+def test_replay_command_line(tmp_path, capsys):
+    trades = list(messages(2000))
+    path = str(tmp_path / "ticks.csv")
+    write_ticks(path, trades)
+    out = str(tmp_path / "out")
+    assert main(["--out", out, "--timeframes", "1m,5m", path]) == 0
+    assert "Replayed 2000 trades" in capsys.readouterr().out
+    assert sorted(os.listdir(out)) == ["footprint_1m.csv", "footprint_5m.csv"]
+    assert main(["--out", out, "--timeframes", "1m", "--backend", "binary", path]) == 0
+    assert os.path.getsize(os.path.join(out, "footprint_1m.fpc")) > 0
@@ -0,0 +1,60 @@
+# test_rollup.py
+import random
+
+import pytest
+
+from footprint_engine import FootprintEngine
+from persistence import summary_to_record
+
+TIMEFRAMES = ["1m", "3m", "5m", "15m", "1h", "4h"]
+START_MS = 1744588800000  # aligned on every timeframe
+
+
+def trades(hours=10, seed=8):
+    """Trades with quiet stretches, so some candles are skipped, crossing two 4h boundaries."""
+    rng = random.Random(seed)
+    timestamp, price = START_MS, 215.0
+    while timestamp < START_MS + hours * 3600 * 1000:
+        timestamp += rng.choice((200, 1500, 9000, 200000))
+        price = round(price + rng.choice((-0.02, -0.01, 0, 0.01, 0.02)), 2)
+        yield timestamp, price, rng.choice((0.013, 0.5, 1.25, 2.345)), rng.random() < 0.5
+
+
+def records(engine, tf):
+    return [summary_to_record(summary) for summary in engine.select_history(tf)]
+
+
+@pytest.mark.parametrize("tf", TIMEFRAMES[1:])
+def test_rollup_matches_direct_aggregation(tf):
+    all_trades = list(trades())
+    rolled = FootprintEngine(TIMEFRAMES)
+    direct = FootprintEngine([tf])
+    for trade in all_trades:
+        rolled.add_trade(*trade)
+        direct.add_trade(*trade)
+    assert rolled.base_tf == "1m" and direct.base_tf == tf
+    assert len(direct.finalized_data[tf]) > 1
+    assert records(rolled, tf) == records(direct, tf)
+    assert rolled.finalized_data[tf] == direct.finalized_data[tf]
+    assert rolled.live_summary(tf) == direct.live_summary(tf)
+    assert rolled.cumulative_delta[tf] == direct.cumulative_delta[tf]
+
+
+def test_rollup_across_bucket_boundary():
+    # Trades in the last base candle of a 4h bucket and in the first one of the next.
+    boundary = START_MS + 4 * 3600 * 1000
+    rolled = FootprintEngine(TIMEFRAMES)
+    direct = {tf: FootprintEngine([tf]) for tf in TIMEFRAMES[1:]}
+    for timestamp, price, is_seller in ((boundary - 61000, 215.0, False), (boundary - 30000, 215.02, True),
+                                        (boundary - 1, 214.99, False), (boundary, 215.01, True),
+                                        (boundary + 30000, 215.03, False)):
+        for engine in [rolled, *direct.values()]:
+            engine.add_trade(timestamp, price, 1.5, is_seller)
+        if timestamp == boundary - 1:
+            for tf in TIMEFRAMES[1:]:
+                assert rolled.live_summary(tf) == direct[tf].live_summary(tf)
+    for tf, engine in direct.items():
+        assert [summary["bucket"] for summary in rolled.finalized_data[tf]] == [boundary // 1000 - engine.seconds[tf]]
+        assert rolled.finalized_data[tf] == engine.finalized_data[tf]
+        assert rolled.live_summary(tf) == engine.live_summary(tf)
+        assert rolled.live_summary(tf)["bucket"] == boundary // 1000
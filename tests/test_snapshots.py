@@ -0,0 +1,81 @@
+# test_snapshots.py
+import copy
+import random
+import threading
+
+from footprint_engine import FootprintEngine
+
+START_MS = 1744588800000
+
+
+def test_snapshot_is_reused_until_the_version_changes():
+    engine = FootprintEngine(["1m", "5m"])
+    engine.add_trade(START_MS, 215.0, 1.0, False)
+    first = engine.snapshot("1m")
+    assert engine.snapshot("1m") is first
+    assert engine.live_summary("1m") is first.summary
+    assert (engine.snapshots_built, engine.snapshots_reused) == (1, 2)
+    # Timeframes are memoized separately.
+    assert engine.snapshot("5m") is not first
+    assert engine.snapshot("5m") is engine.snapshot("5m")
+
+    engine.add_trade(START_MS + 1000, 215.01, 2.0, True)
+    second = engine.snapshot("1m")
+    assert second is not first
+    assert second.version == engine.version == first.version + 1
+    assert engine.stats()["snapshots_built"] == 3
+
+
+def test_snapshot_does_not_change_with_later_trades():
+    engine = FootprintEngine(["1m", "5m"])
+    engine.add_trade(START_MS, 215.0, 1.0, False)
+    snapshot = engine.snapshot("5m")
+    summary = copy.deepcopy(snapshot.summary)
+    engine.add_trade(START_MS + 1000, 216.0, 3.0, True)
+    engine.add_trade(START_MS + 61000, 214.0, 3.0, True)  # closes the 1m candle
+    assert snapshot.summary == summary
+    assert snapshot.finalized_count == 0
+    assert engine.snapshot("1m").finalized_count == 1
+
+
+def test_snapshot_without_live_candle():
+    engine = FootprintEngine(["1m"])
+    snapshot = engine.snapshot("1m")
+    assert (snapshot.summary, snapshot.finalized_count) == (None, 0)
+
+
+def test_readers_see_consistent_snapshots_during_ingest():
+    engine = FootprintEngine(["1m", "5m"])
+    done = threading.Event()
+    errors = []
+
+    def read():
+        while not done.is_set():
+            for tf in ("1m", "5m"):
+                snapshot = engine.snapshot(tf)
+                summary = snapshot.summary
+                if summary is None:
+                    continue
+                # The live candle always follows the finalized candles the snapshot counts.
+                count = snapshot.finalized_count
+                if count and engine.finalized_buckets[tf][count - 1] >= summary["bucket"]:
+                    errors.append((tf, count, summary["bucket"]))
+                if round(summary["buy_volume"] + summary["sell_volume"], 8) != round(summary["total_volume"], 8):
+                    errors.append((tf, "volume"))
+
+    readers = [threading.Thread(target=read) for _ in range(3)]
+    for reader in readers:
+        reader.start()
+    rng = random.Random(1)
+    timestamp = START_MS
+    try:
+        for _ in range(20000):
+            timestamp += rng.randint(1, 100)
+            engine.add_trade(timestamp, round(215 + rng.randint(-20, 20) * 0.01, 2), rng.choice((0.5, 1.0)),
+                             rng.random() < 0.5)
+    finally:
+        done.set()
+        for reader in readers:
+            reader.join()
+    assert not errors
+    assert len(engine.finalized_data["1m"]) > 10
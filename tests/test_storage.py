@@ -0,0 +1,138 @@
+# test_storage.py
+import os
+import random
+
+import pytest
+
+from footprint_engine import FootprintEngine
+from persistence import summary_to_record
+from storage import CHECKPOINT_FILE, FootprintStorage
+
+TIMEFRAMES = ["1m", "5m", "1h"]
+RETENTION = {tf: {"candles": 20, "hours": 0} for tf in TIMEFRAMES}
+
+
+def trades(count=6000, seed=11):
+    rng = random.Random(seed)
+    timestamp, price = 1744740000000, 215.0
+    for _ in range(count):
+        timestamp += rng.randint(1000, 20000)
+        price = round(price + rng.choice((-0.02, -0.01, 0, 0.01, 0.02)), 2)
+        yield timestamp, price, rng.choice((0.013, 0.5, 1.25, 2.345)), rng.random() < 0.5
+
+
+def records(engine, tf):
+    return [summary_to_record(summary) for summary in engine.select_history(tf)]
+
+
+@pytest.mark.parametrize("backend", ["csv", "binary"])
+def test_restart_from_checkpoint_with_spilled_history(tmp_path, backend):
+    directory = str(tmp_path)
+    all_trades = list(trades())
+    half = len(all_trades) // 2
+    reference = FootprintEngine(TIMEFRAMES)
+    for trade in all_trades:
+        reference.add_trade(*trade)
+
+    engine = FootprintEngine(TIMEFRAMES)
+    storage = FootprintStorage(engine, directory, backend, RETENTION)
+    for i, trade in enumerate(all_trades[:half]):
+        engine.add_trade(*trade)
+        if i % 500 == 0:
+            storage.sync()
+    storage.close()
+    # Old candles left memory (into segments, or the binary store).
+    assert storage.histories["1m"].released > 0
+    assert os.path.exists(os.path.join(directory, CHECKPOINT_FILE))
+
+    engine = FootprintEngine(TIMEFRAMES)
+    storage = FootprintStorage(engine, directory, backend, RETENTION)
+    assert storage.restored
+    for trade in all_trades[half:]:
+        engine.add_trade(*trade)
+    storage.sync()
+    try:
+        for tf in TIMEFRAMES:
+            assert records(engine, tf) == records(reference, tf)
+            assert summary_to_record(engine.live_summary(tf)) == summary_to_record(reference.live_summary(tf))
+            assert engine.cumulative_delta[tf] == reference.cumulative_delta[tf]
+    finally:
+        storage.close()
+
+
+def test_csv_file_matches_reference_after_restart(tmp_path):
+    directory = str(tmp_path)
+    all_trades = list(trades(3000))
+    reference = FootprintEngine(TIMEFRAMES)
+    reference_storage = FootprintStorage(reference, str(tmp_path / "reference"), "csv")
+    for trade in all_trades:
+        reference.add_trade(*trade)
+    reference_storage.close()
+
+    for part in (all_trades[:1000], all_trades[1000:2200], all_trades[2200:]):
+        engine = FootprintEngine(TIMEFRAMES)
+        storage = FootprintStorage(engine, directory, "csv", RETENTION)
+        for trade in part:
+            engine.add_trade(*trade)
+        storage.close()
+    for tf in TIMEFRAMES:
+        with open(os.path.join(directory, f"footprint_{tf}.csv"), "rb") as f, \
+                open(str(tmp_path / "reference" / f"footprint_{tf}.csv"), "rb") as g:
+            assert f.read() == g.read()
+
+
+def test_restore_mid_bucket_continues_live_candles_and_cvd(tmp_path):
+    directory = str(tmp_path)
+    all_trades = list(trades(3000))
+    # Stop in the middle of a 1m, 5m and 1h candle.
+    cut = next(i for i, trade in enumerate(all_trades) if trade[0] // 1000 % 3600 > 1830)
+    reference = FootprintEngine(TIMEFRAMES)
+    for trade in all_trades[:cut]:
+        reference.add_trade(*trade)
+    live_before = {tf: reference.live_summary(tf) for tf in TIMEFRAMES}
+
+    engine = FootprintEngine(TIMEFRAMES)
+    storage = FootprintStorage(engine, directory, "csv", RETENTION)
+    for trade in all_trades[:cut]:
+        engine.add_trade(*trade)
+    storage.close()
+
+    engine = FootprintEngine(TIMEFRAMES)
+    storage = FootprintStorage(engine, directory, "csv", RETENTION)
+    assert storage.restored
+    for tf in TIMEFRAMES:
+        assert engine.live_summary(tf) == live_before[tf]
+        assert engine.cumulative_delta[tf] == reference.cumulative_delta[tf]
+    # The next trade lands in the restored candles and CVD carries on.
+    for trade in all_trades[cut:]:
+        engine.add_trade(*trade)
+        reference.add_trade(*trade)
+    try:
+        for tf in TIMEFRAMES:
+            assert records(engine, tf) == records(reference, tf)
+            assert engine.cumulative_delta[tf] == reference.cumulative_delta[tf]
+    finally:
+        storage.close()
+
+
+def test_without_checkpoint_cvd_continues_from_last_candle(tmp_path):
+    directory = str(tmp_path)
+    all_trades = list(trades(3000))
+    engine = FootprintEngine(TIMEFRAMES)
+    storage = FootprintStorage(engine, directory, "csv", RETENTION)
+    for trade in all_trades:
+        engine.add_trade(*trade)
+    storage.close()
+    os.remove(os.path.join(directory, CHECKPOINT_FILE))
+
+    restarted = FootprintEngine(TIMEFRAMES)
+    storage = FootprintStorage(restarted, directory, "csv", RETENTION)
+    try:
+        assert not storage.restored
+        for tf in TIMEFRAMES:
+            # The stored in-progress candle's bucket is long over, so it is the last finalized one.
+            last = engine.live_summary(tf)
+            assert restarted.cumulative_delta[tf] == round(float(last["CVD"]) * 1e8)
+            assert records(restarted, tf)[-1] == summary_to_record(last)
+    finally:
+        storage.close()
@@ -0,0 +1,105 @@
+# test_streaming.py
+import json
+
+from conftest import add_trades
+from streaming import CandleBroadcaster, encode_event
+
+
+def test_publish_fans_out_per_timeframe():
+    broadcaster = CandleBroadcaster()
+    one = broadcaster.subscribe(["1m"])
+    both = broadcaster.subscribe(["1m", "5m"])
+    broadcaster.publish("5m", "update", {"tf": "5m"})
+    broadcaster.publish("1m", "finalized", {"tf": "1m"})
+    broadcaster.publish("1h", "update", {"tf": "1h"})  # nobody follows 1h
+    assert one.get(timeout=0) == encode_event("finalized", {"tf": "1m"})
+    assert one.get(timeout=0) == ""
+    assert both.get(timeout=0) == encode_event("update", {"tf": "5m"})
+    assert both.get(timeout=0) == encode_event("finalized", {"tf": "1m"})
+    assert broadcaster.published == 2
+    assert broadcaster.subscriber_count() == 2
+
+
+def test_event_is_encoded_once_for_every_subscriber():
+    broadcaster = CandleBroadcaster()
+    subs = [broadcaster.subscribe(["1m"]) for _ in range(3)]
+    broadcaster.publish("1m", "update", {"candle": {"bucket": "1"}})
+    messages = [sub.get(timeout=0) for sub in subs]
+    assert all(message is messages[0] for message in messages)
+    assert messages[0] == 'event: update\ndata: {"candle": {"bucket": "1"}}\n\n'
+
+
+def test_overflow_marks_subscriber_lagged():
+    broadcaster = CandleBroadcaster(queue_size=2)
+    sub = broadcaster.subscribe(["1m", "5m"])
+    for i in range(3):
+        broadcaster.publish("1m", "update", {"i": i})
+    assert sub.dropped == 1
+    assert sub.lagged == {"1m", "5m"}
+    # The queued events are dropped; the consumer is woken up to send snapshots instead.
+    assert sub.get(timeout=0) is None
+    assert sub.get(timeout=0) == ""
+
+
+def test_get_times_out_with_keepalive():
+    sub = CandleBroadcaster().subscribe(["1m"])
+    assert sub.get(timeout=0.01) == ""
+
+
+def test_unsubscribe_removes_empty_timeframes():
+    broadcaster = CandleBroadcaster()
+    one = broadcaster.subscribe(["1m"])
+    both = broadcaster.subscribe(["1m", "5m"])
+    broadcaster.unsubscribe(both)
+    assert broadcaster.has_subscribers("1m")
+    assert not broadcaster.has_subscribers("5m")
+    broadcaster.unsubscribe(one)
+    assert not broadcaster.has_subscribers("1m")
+    assert broadcaster.subscriber_count() == 0
+    broadcaster.publish("1m", "update", {})
+    assert broadcaster.published == 0
+
+
+def parse_event(chunk):
+    lines = chunk.decode().split("\n")
+    assert chunk.endswith(b"\n\n")
+    assert lines[0].startswith("event: ") and lines[1].startswith("data: ")
+    return lines[0][len("event: "):], json.loads(lines[1][len("data: "):])
+
+
+def test_stream_endpoint(app_module, monkeypatch):
+    add_trades(app_module.engine, 4)
+    client = app_module.app.test_client()
+    response = client.get("/api/footprint/stream/1m,5m?limit=2", buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    assert response.headers["Cache-Control"] == "no-cache"
+    chunks = iter(response.response)
+    try:
+        event, data = parse_event(next(chunks))
+        assert (event, data["tf"]) == ("snapshot", "1m")
+        assert [candle["bucket"] for candle in data["candles"]] == \
+            [str(summary["bucket"]) for summary in app_module.select_history("1m", limit=2)]
+        event, data = parse_event(next(chunks))
+        assert (event, data["tf"]) == ("snapshot", "5m")
+        assert app_module.broadcaster.has_subscribers("5m")
+
+        app_module.broadcaster.publish("5m", "finalized", {"tf": "5m", "candle": {"bucket": "1"}})
+        assert parse_event(next(chunks)) == ("finalized", {"tf": "5m", "candle": {"bucket": "1"}})
+
+        monkeypatch.setattr(app_module, "STREAM_KEEPALIVE", 0.01)
+        assert next(chunks) == b": keepalive\n\n"
+
+        # A client that fell behind gets its snapshots again instead of the dropped events.
+        for _ in range(app_module.broadcaster.queue_size + 1):
+            app_module.broadcaster.publish("1m", "update", {"tf": "1m"})
+        assert [parse_event(next(chunks))[0:1] for _ in range(2)] == [("snapshot",), ("snapshot",)]
+    finally:
+        response.close()
+    assert app_module.broadcaster.subscriber_count() == 0
+
+
+def test_stream_rejects_unknown_timeframes(app_module):
+    client = app_module.app.test_client()
+    assert client.get("/api/footprint/stream/1m,2m").status_code == 400
+    assert client.get("/api/footprint/stream/1m?limit=x").status_code == 400
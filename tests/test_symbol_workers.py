@@ -0,0 +1,110 @@
+# test_symbol_workers.py
+import json
+import random
+
+import pytest
+
+from footprint_engine import FootprintEngine
+from history_cache import HistoryCache
+from imbalance import ImbalanceRules
+from imbalance import add_history_fields as add_imbalance_fields
+from symbol_workers import SymbolRouter, SymbolWorker, engine_config, parse_tick_sizes, resolve_tick_sizes
+
+# Settings that differ from every default.
+CONFIG = {"stream": "aggTrade", "imbalance_ratio": 1.5, "imbalance_min_volume": 0.02, "stacked_levels": 2,
+          "price_bins": [0.5], "retention": {"candles": 5, "hours": 0}, "ingest_batch": 7}
+
+
+def trade_frames(count=2000, seed=2):
+    rng = random.Random(seed)
+    timestamp = 1744740000000
+    frames = []
+    for _ in range(count):
+        timestamp += rng.randint(10, 300)
+        price = 60000 + rng.randint(-50, 50) * 0.1
+        frames.append(json.dumps({"stream": "btcusdt@trade", "data": {
+            "e": "trade", "s": "BTCUSDT", "T": timestamp, "p": f"{price:.1f}", "q": "0.010",
+            "m": rng.random() < 0.5}}))
+    return frames
+
+
+def test_tick_sizes():
+    assert parse_tick_sizes("btcusdt=0.1, ETHUSDT=0.01") == {"BTCUSDT": 0.1, "ETHUSDT": 0.01}
+    assert resolve_tick_sizes(["BTCUSDT", "SOLUSDT"], {"BTCUSDT": 0.1}, lookup=False) == {
+        "BTCUSDT": 0.1, "SOLUSDT": 0.01}
+
+
+def test_worker_aggregates_on_symbol_tick(tmp_path):
+    worker = SymbolWorker(None, ["BTCUSDT"], str(tmp_path), ["1m", "5m"], tick_sizes={"BTCUSDT": 0.1})
+    state = worker.states["BTCUSDT"]
+    assert state.engine.tick_size == 0.1
+    # 0.05 and 0.25 are not multiples of 0.1.
+    assert state.engine.price_bins == (10,)
+    state.ingest.process(trade_frames())
+    rows = json.loads(worker.history("BTCUSDT", "1m", None, None, None, ("bucket", "price_levels"), "json"))
+    assert len(rows) > 5
+    assert all(round(float(price) * 10) == float(price) * 10 for row in rows for price in row["price_levels"])
+    binned = json.loads(worker.history("BTCUSDT", "1m", None, None, None, ("price_levels",), "json", 10))
+    assert all(float(price) == int(float(price)) for row in binned for price in row["price_levels"])
+    assert worker.stats()["BTCUSDT"]["ingest"]["processed"] == 2000
+    for state in worker.states.values():
+        state.sync()
+        state.close()
+
+
+def test_router_passes_tick_sizes(tmp_path):
+    router = SymbolRouter(["BTCUSDT", "ETHUSDT"], str(tmp_path), ["1m"], workers=1, ingest=False,
+                          tick_sizes={"BTCUSDT": 0.1})
+    try:
+        router.start()
+        stats = router.stats()
+        assert stats["BTCUSDT"]["tick_size"] == 0.1
+        assert stats["ETHUSDT"]["tick_size"] == 0.01
+        assert json.loads(router.history("BTCUSDT", "1m")) == []
+    finally:
+        router.close()
+
+
+def test_worker_uses_engine_config(tmp_path):
+    worker = SymbolWorker(None, ["BTCUSDT"], str(tmp_path), ["1m", "5m"], tick_sizes={"BTCUSDT": 0.1},
+                          config=CONFIG)
+    state = worker.states["BTCUSDT"]
+    rules = state.engine.imbalance_rules
+    assert (rules.ratio, rules.min_volume, rules.stack) == (1.5, 0.02, 2)
+    assert state.engine.price_bins == (5,)
+    assert (state.stream, state.ingest.batch_size) == ("aggTrade", 7)
+    assert (state.storage.histories["1m"].keep_candles, state.storage.histories["1m"].keep_seconds) == (5, 0)
+
+    # The same fields as an engine of the Flask process with these settings.
+    reference = FootprintEngine(["1m", "5m"], 0.1, imbalance_rules=ImbalanceRules(1.5, 0.02, 2), price_bins=[0.5])
+    reference_cache = HistoryCache(reference)
+    add_imbalance_fields(reference_cache, reference)
+    frames = trade_frames()
+    state.ingest.process(frames)
+    for frame in frames:
+        reference.process_trade(json.loads(frame)["data"])
+    fields = ("bucket", "diagonal_imbalances", "stacked_imbalances")
+    for tf in ("1m", "5m"):
+        snapshot, lo, hi, live = reference.history_window(tf)
+        expected = reference_cache.body(tf, (None, None, None), lo, hi, live, None, fields, "json", 1)
+        assert worker.history("BTCUSDT", tf, None, None, None, fields, "json") == expected
+    assert any(row["stacked_imbalances"] for row in json.loads(expected))
+    for state in worker.states.values():
+        state.close()
+
+
+def test_engine_config_rejects_unknown_settings():
+    assert engine_config()["stream"] == "trade"
+    assert engine_config({"stacked_levels": 4})["stacked_levels"] == 4
+    with pytest.raises(ValueError):
+        engine_config({"imbalance": 3})
+
+
+def test_router_passes_engine_config(tmp_path):
+    router = SymbolRouter(["BTCUSDT"], str(tmp_path), ["1m"], workers=1, ingest=False,
+                          tick_sizes={"BTCUSDT": 0.1}, config=CONFIG)
+    try:
+        router.start()
+        assert router.stats()["BTCUSDT"]["stream"] == "aggTrade"
+    finally:
+        router.close()
@@ -0,0 +1,31 @@
+# test_volume_profile.py
+import random
+
+from footprint_engine import FootprintEngine
+from volume_profile import LevelStats, value_area
+
+
+def test_level_stats_match_rescan():
+    rng = random.Random(9)
+    engine = FootprintEngine(["1m"])
+    timestamp = 1_700_000_000_000
+    for _ in range(3000):
+        timestamp += rng.randint(0, 200)
+        engine.add_trade(timestamp, round(100 + rng.randint(-10, 10) * 0.01, 2),
+                         rng.choice((0.1, 0.5, 2.0)), rng.random() < 0.5)
+        candle = engine.current_data["1m"]
+        stats = candle.level_stats
+        levels = list(candle.ladder.levels())
+        volumes = [buy + sell for _, buy, sell, _, _ in levels]
+        deltas = [buy - sell for _, buy, sell, _, _ in levels]
+        assert stats.extremes(candle.ladder) == (max(volumes), max(deltas), min(deltas))
+        assert stats.poc_ticks == {tick for tick, buy, sell, _, _ in levels if buy + sell == max(volumes)}
+        rebuilt = LevelStats.from_ladder(candle.ladder)
+        assert rebuilt.extremes(candle.ladder) == stats.extremes(candle.ladder)
+
+
+def test_value_area():
+    # 70% of 100 starting at the POC (index 2): the larger neighbour is added first.
+    assert value_area([10, 20, 30, 25, 15], 2) == (1, 3)
+    assert value_area([5], 0) == (0, 0)
+    assert value_area([50, 0, 0, 50], 0, share=1.0) == (0, 3)
@@ -0,0 +1,84 @@
+# test_wire_formats.py
+import pytest
+
+from conftest import add_trades
+from persistence import CSV_FIELDS, INTEGER_FIELDS, JSON_FIELDS
+
+URL = "/api/footprint/history/1m"
+
+
+def buy_only_candle(engine):
+    """Start a live 1m candle without sells (infinite buy_sell_ratio); returns its bucket."""
+    add_trades(engine, 2)
+    bucket = engine.live_summary("1m")["bucket"] + 60
+    engine.add_trade(bucket * 1000 + 5, 215.0, 1.5, False)
+    engine.add_trade(bucket * 1000 + 6, 215.01, 0.5, False)
+    return bucket
+
+
+def check_types(record, live_bucket):
+    for field in INTEGER_FIELDS:
+        assert type(record[field]) is int
+    for field in ("open", "close", "total_volume", "delta"):
+        assert type(record[field]) is float
+    for field in JSON_FIELDS:
+        assert not isinstance(record[field], str)
+    if record["bucket"] == live_bucket:
+        assert record["buy_sell_ratio"] is None
+    else:
+        assert type(record["buy_sell_ratio"]) is float
+
+
+def test_json_format_is_typed(app_module):
+    bucket = buy_only_candle(app_module.engine)
+    client = app_module.app.test_client()
+    records = client.get(URL + f"?format=json&since={bucket - 60}").json
+    assert [record["bucket"] for record in records] == [bucket - 60, bucket]
+    for record in records:
+        assert sorted(record) == sorted(CSV_FIELDS)
+        check_types(record, bucket)
+    assert records[-1]["buy_contracts"] == 2 and records[-1]["sell_contracts"] == 0
+    rows = client.get(URL + f"?since={bucket - 60}").json
+    assert rows[-1]["buy_sell_ratio"] == "inf" and rows[-1]["bucket"] == str(bucket)
+
+
+def test_columns_and_msgpack_match_json(app_module):
+    bucket = buy_only_candle(app_module.engine)
+    client = app_module.app.test_client()
+    query = f"?since={bucket - 120}"
+    records = client.get(URL + query + "&format=json").json
+    columns = client.get(URL + query + "&format=columns").json
+    assert sorted(columns) == sorted(CSV_FIELDS)
+    assert [dict(zip(columns, values)) for values in zip(*columns.values())] == records
+    assert columns["buy_sell_ratio"][-1] is None
+
+    msgpack = pytest.importorskip("msgpack")
+    response = client.get(URL + query, headers={"Accept": "application/msgpack"})
+    assert response.mimetype == "application/msgpack"
+    assert msgpack.unpackb(response.data) == columns
+    assert msgpack.unpackb(client.get(URL + query + "&format=msgpack").data) == columns
+
+
+def test_field_projection(app_module):
+    bucket = buy_only_candle(app_module.engine)
+    client = app_module.app.test_client()
+    query = f"?since={bucket - 60}&fields=bucket,close,buy_sell_ratio,bucket"
+    records = client.get(URL + query + "&format=json").json
+    assert [sorted(record) for record in records] == [["bucket", "buy_sell_ratio", "close"]] * 2
+    assert records[-1] == {"bucket": bucket, "close": 215.01, "buy_sell_ratio": None}
+    columns = client.get(URL + query + "&format=columns").json
+    assert columns == {"bucket": [bucket - 60, bucket], "close": [records[0]["close"], 215.01],
+                       "buy_sell_ratio": [records[0]["buy_sell_ratio"], None]}
+    rows = client.get(URL + query).json
+    assert rows[-1] == {"bucket": str(bucket), "close": "215.01", "buy_sell_ratio": "inf"}
+
+
+@pytest.mark.parametrize("query, message", [
+    ("?format=xml", "format must be one of rows, json, columns, msgpack"),
+    ("?format=json&fields=bucket,colour", "unknown fields: colour"),
+    ("?fields=depth", "unknown fields: depth"),   # FOOTPRINT_DEPTH=0
+])
+def test_unknown_format_or_field(app_module, query, message):
+    response = app_module.app.test_client().get(URL + query)
+    assert response.status_code == 400
+    assert response.json == {"error": message}